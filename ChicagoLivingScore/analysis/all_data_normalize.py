@@ -3,11 +3,18 @@ warnings.simplefilter(action="ignore", category=FutureWarning)
 import pandas as pd
 import pathlib
 
+from analysis.datastore import read_table, write_table
+from analysis.normalize import normalize_columns, normalize_series
+
 
 # This profile aims at standardizing a function to deal with the raw datasets
 # by using Min-Max normalization
 # so as to deal with newly added raw datasets more efficiently
 
+# Columns of the economic data where a higher value is worse
+ECON_INVERTED = ["mean travel time to work (minutes)", "unemployed"]
+
+
 class DataNormalizer:
     def __init__(self):
         self.base_dir = pathlib.Path(__file__).parent.parent
@@ -16,39 +23,54 @@ class DataNormalizer:
         self.econ_file = self.base_dir / "data" / "cleaned_data" / "cleaned_data_economic_infrastructure.csv"
     
     def min_max_normalize(self, series, invert=False):
-        min_val = series.min()
-        max_val = series.max()
-        if max_val - min_val != 0:
-            normalized = (series - min_val) / (max_val - min_val)
-        else:
-            normalized = series * 0  
-        return 1 - normalized if invert else normalized
+        return normalize_series(series, invert=invert)
 
-    def process_environment(self):
+    # The normalize_* methods work in memory, the analysis stages call them
+    # before writing their output, so no file is normalized in place afterwards.
 
-        df_env = pd.read_csv(self.env_file)
+    def normalize_environment(self, df_env):
+        df_env = df_env.copy()
         df_env["environment_score"] = self.min_max_normalize(df_env["count"], invert=True)
-        output_path = self.base_dir / "data" / "cleaned_data" / "cleaned_data_environment.csv"
-        df_env.to_csv(output_path, index=False)
+        return df_env
+
+    def normalize_crime(self, df_crime):
+        df_crime = df_crime.copy()
+        df_crime["crime_score"] = self.min_max_normalize(df_crime["count"], invert=True)
+        return df_crime
+
+    def normalize_economic(self, df_econ, invert=ECON_INVERTED):
+        """All the indicator columns scaled to [0, 1] at once, the invert ones inverted, rounded to 2 decimals."""
+        columns = [column for column in df_econ.columns if column != "zipcode"]
+        df_econ, _ = normalize_columns(df_econ, columns, invert=invert)
+        # for better readability, the values are rounded off
+        df_econ[columns] = df_econ[columns].round(2)
+        return df_econ
+
+    # The process_* methods rebuild a cleaned file from its source columns, so
+    # running them again gives the same file.
+
+    def process_environment(self):
+
+        df_env = write_table(self.normalize_environment(read_table(self.env_file)), self.env_file)
         print(f"Environment data processed and saved")
         return df_env
 
     def process_crime(self):
 
-        df_crime = pd.read_csv(self.crime_file)
-        df_crime["crime_score"] = self.min_max_normalize(df_crime["count"], invert=True)
-        output_path = self.base_dir / "data" / "cleaned_data" / "cleaned_data_crime.csv"
-        df_crime.to_csv(output_path, index=False)
+        df_crime = write_table(self.normalize_crime(read_table(self.crime_file)), self.crime_file)
         print(f"Crime data processed and saved")
         return df_crime
 
     def process_econmic(self):
-
-        df_econ = pd.read_csv(self.econ_file)
-        df_econ["mean travel time to work (minutes)"] = self.min_max_normalize(df_econ["mean travel time to work (minutes)"], invert=True)
-        df_econ["unemployed"] = self.min_max_normalize(df_econ["unemployed"], invert=True)
-        output_path = self.base_dir / "data" / "cleaned_data" / "cleaned_data_economic_infrastructure.csv"
-        df_econ.to_csv(output_path, index=False)
+        from analysis.economic_infrastructure_analysis import normalize_data, RAW_FILE
+        if RAW_FILE.exists():
+            # The cleaned file is already scaled and inverted, it is rebuilt from the raw data
+            df_econ = normalize_data(RAW_FILE)
+        else:
+            # The raw census table is not in the repository: the cleaned file is
+            # scaled again as it is, without inverting its columns a second time
+            print(f"{RAW_FILE} not found, normalizing {self.econ_file.name} instead")
+            df_econ = write_table(self.normalize_economic(read_table(self.econ_file), invert=()), self.econ_file)
         print(f"Economics data processed and saved")
         return df_econ
 
@@ -1,60 +1,50 @@
-from shapely.geometry import Point
-from shapely import wkt
-from analysis.zips import load_shapefile_with_cache
-import pandas as pd
+from analysis.zips import load_chicago_zip_index
+from analysis.geocode import read_points, coerce_points, zip_points, count_by_zip, stream_count_by_zip
+from analysis.all_data_normalize import DataNormalizer
+from analysis.datastore import read_table, write_table
 import pathlib
-import geopandas as gpd
-import csv
+
+# Only crimes that led to an arrest and are not domestic are counted
+CRIME_FILTERS = {"Arrest": True, "Domestic": False}
+# Rows read at a time in streaming mode, this bounds the memory use
+CHUNKSIZE = 500_000
 
 def load_frs_csv(file_path):
     """
     Given a CSV containing crimes locations, return a list of points objects.
     """
-    crime_points = []
-    with file_path.open(mode="r") as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            lat=row["Latitude"].strip()
-            lon=row["Longitude"].strip()
-            if lat != "" and lon !="":
-                if row["Arrest"].lower()=="true":
-                    if row["Domestic"].lower()=="false":
-                        point=Point(lon,lat)
-                        crime_points.append(point)
-    return crime_points
+    gdf_points = read_points(file_path, "Latitude", "Longitude", filters=CRIME_FILTERS)
+    return gdf_points.geometry.tolist()
 
 def find_zip_codes(gdf_zip, points):
-    processed_points = []
-    for p in points:
-        if isinstance(p, str):
-            geom = wkt.loads(p)
-            processed_points.append((geom.y, geom.x))  # (lat, lon)
-        elif isinstance(p, (tuple, list)) and len(p) == 2:
-            processed_points.append(p)
-        elif isinstance(p, Point):
-            processed_points.append((p.y, p.x))
-    df_points = pd.DataFrame(processed_points, columns=['lat', 'lon'])
-    df_points['geometry'] = df_points.apply(lambda row: Point(row['lon'], row['lat']), axis=1)
-    gdf_points = gpd.GeoDataFrame(df_points, geometry='geometry', crs="EPSG:4326")
-    gdf_joined = gpd.sjoin(gdf_points, gdf_zip, how='left', predicate='within')
-    df_result=gdf_joined[['lat', 'lon', 'ZCTA5CE20']]
+    gdf_points = coerce_points(points)
+    df_result = zip_points(gdf_points, gdf_zip)
     df_result.to_csv("./data/raw_data/crimes_zip.csv", index=False)
-    return gdf_joined[['lat', 'lon', 'ZCTA5CE20']]
+    return df_result
 
-def info():
+def info(chunksize=CHUNKSIZE):
+    """
+    Count the crimes per Chicago zip code and their crime score into cleaned_data_crime.csv.
+    By default the raw CSV is streamed in chunks of 'chunksize' rows and only the
+    per-zip counts are kept. chunksize=None loads every point at once and also
+    writes the intermediate crimes_zip.csv.
+    """
     BASE_DIR = pathlib.Path(__file__).parent.parent
-    shp_file = BASE_DIR / "data" / "raw_data" /"Zips"/  "tl_2020_us_zcta520.shp"
     file_path = BASE_DIR / "data" / "raw_data" / "crimes.csv"
-    zips=load_shapefile_with_cache(shp_file)
-    find_zip_codes(zips,load_frs_csv(file_path))
-    df = pd.read_csv("./data/raw_data/crimes_zip.csv")
-    zip_codes_df = pd.read_csv("./data/cleaned_data/chicago_zip.csv")
-    zip_column = "ZCTA5CE20"
-    zip_codes_list = zip_codes_df["zip_code"].astype(str).tolist()
-    df_filtered = df[df[zip_column].astype(str).isin(zip_codes_list)]
+    # Chicago-only ZCTAs with a prebuilt spatial index, instead of the national shapefile
+    zips, zip_tree = load_chicago_zip_index()
+    zip_codes_df = read_table(BASE_DIR / "data" / "cleaned_data" / "chicago_zip.csv")
 
-    total_per_zip = df_filtered.groupby(zip_column).size().reset_index(name="count")
-    total_per_zip.to_csv("./data/cleaned_data/cleaned_data_crime.csv", index=False)
-    return 
+    if chunksize:
+        total_per_zip = stream_count_by_zip(file_path, zips, zip_codes_df["zipcode"], "Latitude", "Longitude",
+                                            filters=CRIME_FILTERS, chunksize=chunksize, sindex=zip_tree)
+    else:
+        gdf_points = read_points(file_path, "Latitude", "Longitude", filters=CRIME_FILTERS)
+        df = zip_points(gdf_points, zips, sindex=zip_tree)
+        df.to_csv(BASE_DIR / "data" / "raw_data" / "crimes_zip.csv", index=False)
+        total_per_zip = count_by_zip(df["ZCTA5CE20"], zip_codes_df["zipcode"])
+    # the crime score is added in memory, the file is written once
+    total_per_zip = DataNormalizer().normalize_crime(total_per_zip)
+    return write_table(total_per_zip, BASE_DIR / "data" / "cleaned_data" / "cleaned_data_crime.csv")
 if __name__ == '__main__':
-    info()
\ No newline at end of file
+    info()
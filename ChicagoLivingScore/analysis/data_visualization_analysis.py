@@ -4,6 +4,11 @@ import altair as alt
 
 
 # This file aims at analyzing the final results based on different zipcode scores, index scores, final scores
+# The chart functions take a DataFrame, which is inlined into the chart, or a data reference
+# such as alt.UrlData, so several charts can share one copy of the dataset (see chart_specs)
+
+# Columns of final_living_score.csv used by the charts
+CHART_COLUMNS = ['zipcode', 'final_score', 'avg_income_score', 'crime_score', 'education_score', 'avg_price_per_sqft']
 
 
 # provides us with a heatmap of all the zipcodes and their indicators
@@ -12,7 +17,7 @@ def create_heatmap(df):
         x=alt.X('zipcode:N', title='Zip Code'),
         y=alt.Y('final_score:N', title='Indicator', sort="-y"),
         color=alt.Color('final_score:Q', scale=alt.Scale(scheme='viridis')),  # Color based on score
-        tooltip=['zipcode', 'avg_income_score', 'crime_score', 'avg_price_per_sqft','final_score']
+        tooltip=['zipcode:N', 'avg_income_score:Q', 'crime_score:Q', 'avg_price_per_sqft:Q','final_score:Q']
     ).transform_fold(
         ['crime_score', 'education_score', 'avg_income_score', 'final_score']
     ).properties(
@@ -30,30 +35,33 @@ def combine_charts(chart_1, chart_2):
 
 def creat_bar_chats(df):
     
-    #top 5 best zipcodes
-    top_five = df.nlargest(5, "final_score")
-    best_places = top_five[['zipcode', 'final_score']]
-    
-    #worst 5 zopcodes
-    
-    top_five_worst = df.nsmallest(5, "final_score")
-    worst_places = top_five_worst[['zipcode', 'final_score']]
+    # top 5 best and worst zipcodes, ranked by the chart itself (a window transform
+    # instead of nlargest/nsmallest) so that it also works on a shared dataset
+    if isinstance(df, pd.DataFrame):
+        df = df[['zipcode', 'final_score']]
+    scored = alt.Chart(df).transform_filter('isValid(datum.final_score)')
+    best_places = scored.transform_window(
+        rank='row_number()', sort=[alt.SortField('final_score', order='descending')]
+    ).transform_filter('datum.rank <= 5')
+    worst_places = scored.transform_window(
+        rank='row_number()', sort=[alt.SortField('final_score', order='ascending')]
+    ).transform_filter('datum.rank <= 5')
     
     
-    chart_best = alt.Chart(best_places).mark_bar().encode(
+    chart_best = best_places.mark_bar().encode(
         x=alt.X('zipcode:N', sort='-y', title='Zipcode'),
         y=alt.Y('final_score:Q', title='best overall'),
-        tooltip=['zipcode', 'final_score']
+        tooltip=['zipcode:N', 'final_score:Q']
     ).properties(
         title='Top 5 Zipcodes',
         width=400,
         height=300
     )
     
-    chart_worst = alt.Chart(worst_places).mark_bar(color="salmon").encode(
+    chart_worst = worst_places.mark_bar(color="salmon").encode(
         x=alt.X('zipcode:N', sort='y', title='Zipcode'),
         y=alt.Y('final_score:Q', title='worst overall'),
-        tooltip=['zipcode', 'final_score']
+        tooltip=['zipcode:N', 'final_score:Q']
     ).properties(
         title='Worst 5 Zipcodes',
         width=400,
@@ -72,7 +80,21 @@ def create_bar_html(df):
     chart = creat_bar_chats(df)
     return chart.to_html()
 
-file_path = Path(__file__).parent.parent / "data" / "cleaned_data" / "final_living_score.csv"
-df = pd.read_csv(file_path)
-heatmap = create_heatmap(df)
-bar_charts = creat_bar_chats(df)
+# Specs for the website: every chart reads the dataset from data_url instead of carrying its rows
+def chart_dataset(df):
+    """JSON records of the chart columns, the one dataset behind chart_specs."""
+    return df[CHART_COLUMNS].to_json(orient='records')
+
+def chart_specs(data_url):
+    data = alt.UrlData(url=data_url, format=alt.DataFormat(type='json'))
+    return {
+        'top5': creat_bar_chats(data).to_dict(),
+        'relationship': create_heatmap(data).to_dict(),
+    }
+
+
+if __name__ == "__main__":
+    file_path = Path(__file__).parent.parent / "data" / "cleaned_data" / "final_living_score.csv"
+    df = pd.read_csv(file_path)
+    heatmap = create_heatmap(df)
+    bar_charts = creat_bar_chats(df)
@@ -0,0 +1,171 @@
+import argparse
+import os
+import pathlib
+import time
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # tables are then kept as pickles
+    pa = None
+    feather = None
+
+
+# This file is the data store the analysis stages and the website read and write through.
+# Every table keeps its CSV under data/cleaned_data/ for people to read, and a binary copy
+# in a .store directory next to it that programs read instead: an uncompressed Arrow IPC
+# file (memory mapped, so numeric columns are read without copying), or a pickle when
+# pyarrow is not installed. The mtime and size of the CSV the copy matches are kept next to
+# it, and the copy is rebuilt when the CSV changed (e.g. a checkout or a hand edit), so the
+# CSV text is parsed once per change.
+#
+# Zip codes are typed keys: the "zipcode" column is always a pandas "string" column of
+# digits, so no reader has to turn 60601.0 or "60601.0" back into "60601".
+#
+# Convert every cleaned CSV and compare read times (from the ChicagoLivingScore directory):
+#   python -m analysis.datastore
+
+
+BASE_DIR = pathlib.Path(__file__).parent.parent
+CLEANED_DIR = BASE_DIR / "data" / "cleaned_data"
+STORE_DIRNAME = ".store"
+ZIP_COLUMN = "zipcode"
+
+
+def zip_key(values):
+    """
+    Zip code strings ("string" dtype, <NA> for missing) from numbers or text, without
+    the decimal part: 60601, 60601.0 and "60601.0" become "60601". Numbers are not
+    zero-padded, 6060 becomes "6060".
+    """
+    series = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.astype("Int64").astype("string")
+    text = series.astype("string").str.strip()
+    return text.str.split(".", n=1).str[0].astype("string")
+
+
+class DataStore:
+    def __init__(self, use_arrow=None):
+        """use_arrow: None to use Arrow files when pyarrow is installed, False for pickles."""
+        self.use_arrow = pa is not None if use_arrow is None else use_arrow
+        if self.use_arrow and pa is None:
+            raise ImportError("pyarrow is needed for Arrow files")
+
+    def path(self, csv_path):
+        """Binary copy of a CSV table."""
+        csv_path = pathlib.Path(csv_path)
+        suffix = ".arrow" if self.use_arrow else ".pkl"
+        return csv_path.parent / STORE_DIRNAME / (csv_path.stem + suffix)
+
+    @staticmethod
+    def _source(csv_path):
+        # mtime and size of the CSV, "-" when there is none
+        try:
+            stat = os.stat(csv_path)
+        except FileNotFoundError:
+            return "-"
+        return f"{stat.st_mtime_ns} {stat.st_size}"
+
+    def _fresh(self, csv_path, path):
+        try:
+            source = path.with_name(path.name + ".source").read_text()
+        except FileNotFoundError:
+            return False
+        return source == self._source(csv_path) and path.exists()
+
+    def _save(self, df, path, csv_path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        if self.use_arrow:
+            feather.write_feather(df, temp, compression="uncompressed")
+        else:
+            df.to_pickle(temp)
+        # readers never see a half written file
+        os.replace(temp, path)
+        path.with_name(path.name + ".source").write_text(self._source(csv_path))
+
+    def _load(self, path, columns=None):
+        if self.use_arrow:
+            return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+        df = pd.read_pickle(path)
+        return df if columns is None else df[columns]
+
+    def write(self, df, csv_path, zip_col=ZIP_COLUMN, csv=True):
+        """
+        Write a table: zip codes typed, the CSV export (unless csv=False) and the binary copy.
+        Returns the DataFrame as stored.
+        """
+        csv_path = pathlib.Path(csv_path)
+        df = df.reset_index(drop=True)
+        if zip_col in df.columns:
+            df[zip_col] = zip_key(df[zip_col])
+        if csv:
+            df.to_csv(csv_path, index=False)
+        # without the CSV export, the binary copy is the newer one until the CSV changes
+        self._save(df, self.path(csv_path), csv_path)
+        return df
+
+    def _ensure(self, csv_path, zip_col=ZIP_COLUMN):
+        # Binary copy of the CSV, converted first when the CSV changed
+        csv_path = pathlib.Path(csv_path)
+        path = self.path(csv_path)
+        if not self._fresh(csv_path, path):
+            df = pd.read_csv(csv_path)
+            if zip_col in df.columns:
+                df[zip_col] = zip_key(df[zip_col])
+            self._save(df, path, csv_path)
+        return path
+
+    def read(self, csv_path, columns=None, zip_col=ZIP_COLUMN):
+        """Read a table from its binary copy, converting the CSV first when it changed."""
+        return self._load(self._ensure(csv_path, zip_col), columns)
+
+    def table(self, csv_path):
+        """
+        The table as a memory mapped pyarrow Table, for column access without copies
+        (table.column(name).to_numpy() on numeric columns without missing values).
+        """
+        if not self.use_arrow:
+            raise ImportError("pyarrow is needed for Arrow tables")
+        return feather.read_table(self._ensure(csv_path), memory_map=True)
+
+    def export_csv(self, csv_path, output_path=None):
+        """Write the stored table back to CSV, to csv_path unless output_path is given."""
+        df = self._load(self.path(csv_path))
+        df.to_csv(output_path or csv_path, index=False)
+        return df
+
+
+STORE = DataStore()
+
+
+def read_table(csv_path, columns=None, zip_col=ZIP_COLUMN):
+    return STORE.read(csv_path, columns, zip_col)
+
+
+def write_table(df, csv_path, zip_col=ZIP_COLUMN, csv=True):
+    return STORE.write(df, csv_path, zip_col, csv)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the cleaned CSV files to the data store")
+    parser.add_argument("--dir", type=pathlib.Path, default=CLEANED_DIR)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f"binary format: {'arrow' if STORE.use_arrow else 'pickle'}")
+    for csv_path in sorted(args.dir.glob("*.csv")):
+        read_table(csv_path)
+        timings = []
+        for read in (pd.read_csv, read_table):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                read(csv_path)
+            timings.append((time.perf_counter() - start) / args.repeat * 1e3)
+        print(f"{csv_path.name}: csv {timings[0]:.2f} ms, store {timings[1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
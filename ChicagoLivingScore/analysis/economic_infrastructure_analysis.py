@@ -1,8 +1,16 @@
 from pathlib import Path
 import pandas as pd
 
+from analysis.all_data_normalize import DataNormalizer
+from analysis.datastore import write_table
+from analysis.normalize import normalize_columns
+
 # This file aims at cleaning and analyzing useful econ and infra related variables
 
+BASE_DIR = Path(__file__).parent.parent
+RAW_FILE = BASE_DIR / "data" / "raw_data" / "raw_data_eco_infra.csv"
+OUTPUT_FILE = BASE_DIR / "data" / "cleaned_data" / "cleaned_data_economic_infrastructure.csv"
+
 
 def load_data_clean(file_path):
     """loads and cleans the data"""
@@ -20,12 +28,7 @@ def load_data_clean(file_path):
 
 def normalize(df):
     """uses the min - max formula to normalize the data """
-    for column in df.columns[1:]:  # skip zipcode column
-        min_value = df[column].min()
-        max_value = df[column].max()
-        # Avoid division by zero if min and max are the same
-        df[column] = (df[column] - min_value) / (max_value - min_value)
-
+    df, _ = normalize_columns(df, df.columns[1:])  # skip zipcode column
     return df
 
 
@@ -64,26 +67,23 @@ def normalize_data(file_path):
     for column in df.columns[1:]:  # skip zipcode column 
         df[column] = df[column].astype(str).str.replace(',', '').astype(float)  #convert values to floats also as there were commas in our values, we had to take them out
 
-    # normalize the data using our helper
-    df_normalized = normalize(df)
-
-    # for better readability, we have rounded off our values
-    df_normalized = df_normalized.round(2)
+    # normalize the data (scaled, inverted where higher is worse, rounded) in memory
+    df_normalized = DataNormalizer().normalize_economic(df)
     
-    # export csv
-    output_path = Path("./data/cleaned_data/cleaned_data_economic_infrastructure.csv")
-    df_normalized.to_csv(output_path, index=False)
+    # export csv and the binary copy
+    df_normalized = write_table(df_normalized, OUTPUT_FILE)
     
     print(("Processed data saved"))
+    return df_normalized
 
 def main(file_path):
     processed_data = normalize_data(file_path)
     return processed_data
 
 
-file_path = Path("../data/raw_data/raw_data_eco_infra.csv")
-zip_results = main(file_path)
-# Save Results
-print(f"Processing Complete. Results saved to {output_path}")
+if __name__ == "__main__":
+    zip_results = main(RAW_FILE)
+    # Save Results
+    print(f"Processing Complete. Results saved to {OUTPUT_FILE}")
 
 
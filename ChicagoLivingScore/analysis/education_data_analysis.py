@@ -3,12 +3,19 @@ import numpy as np
 from pathlib import Path
 import geopandas as gpd
 
-<<<<<<< HEAD
-=======
+from analysis.datastore import read_table, write_table
+from analysis.normalize import normalize_columns, normalize_series
+
 # This file aims at cleaning and analyzing useful education related variables
 
+BASE_DIR = Path(__file__).parent.parent
+RAW_FILE = BASE_DIR / "data" / "raw_data" / "Chicago_Public_Schools_2024.csv"
+ZIP_LIST_FILE = BASE_DIR / "data" / "cleaned_data" / "chicago_zip.csv"
+OUTPUT_FILE = BASE_DIR / "data" / "cleaned_data" / "cleaned_data_education.csv"
+SCHOOLS_FILE = BASE_DIR / "data" / "raw_data" / "education.csv"
+SCHOOL_LOCATIONS_FILE = BASE_DIR / "data" / "cleaned_data" / "cleaned_education.csv"
+
 
->>>>>>> 364e0ed21f46dc5724ef9df32e4ec3c3b2e15924
 def load_data(file_path):
     df = pd.read_csv(file_path)
     df.columns = df.columns.str.lower().str.strip() 
@@ -16,11 +23,8 @@ def load_data(file_path):
     return df
 
 def standardize_column(series):
-    min_val = series.min()
-    max_val = series.max()
-    if min_val == max_val:  # Avoid division by zero
-        return series.apply(lambda x: 1 if x == max_val else 0)
-    return (series - min_val) / (max_val - min_val)
+    # min-max scaling, a column with a single value scores 1
+    return normalize_series(series, constant=1.0)
 
 def map_categorical_values(df):
     mapping_creative = {
@@ -68,9 +72,8 @@ def compute_zip_level_metrics(df):
     other_scores = zip_group[categories].mean()
     student_attendance = zip_group[["student_attendance_year_1_pct", "student_attendance_year_2_pct"]].mean().mean(axis=1)
 
-    # Standardize all non-SAT variables
-    for col in other_scores.columns:
-        other_scores[col] = standardize_column(other_scores[col])
+    # Standardize all non-SAT variables at once
+    other_scores, _ = normalize_columns(other_scores, other_scores.columns, constant=1.0)
 
     student_attendance = standardize_column(student_attendance)
     student_attendance = pd.Series(student_attendance, index=zip_group.groups.keys(), name="student_attendance")
@@ -90,30 +93,35 @@ def compute_zip_level_metrics(df):
     return zip_results
 
 
-def find_nearest_values(zip_code):
-    step = 1
-    found_values = {col: None for col in info_zip_codes.columns if col != zip_col}
-
-    while step < len(all_zip_codes):
-        lower_zip = zip_code - step
-        upper_zip = zip_code + step
-
-        if lower_zip in zip_info_dict:
-            for col in found_values.keys():
-                if found_values[col] is None:
-                    found_values[col] = zip_info_dict[lower_zip][col]
-
-        if upper_zip in zip_info_dict:
-            for col in found_values.keys():
-                if found_values[col] is None:
-                    found_values[col] = zip_info_dict[upper_zip][col]
-
-        if all(value is not None for value in found_values.values()):
-            break
-
-        step += 1
-
-    return pd.Series(found_values)
+def backfill_nearest_zip(zip_results, zip_codes, zip_col="zip_code"):
+    """
+    Give every zip code in zip_codes a row: zip codes without schools get all the
+    values of the nearest zip code that has schools (the lower one on a tie).
+    The nearest one is found for all missing zip codes at once with searchsorted
+    on the sorted zip codes. Returns the rows sorted by zip code.
+    """
+    info = zip_results.copy()
+    info[zip_col] = info[zip_col].astype(int)
+    info = info.sort_values(by=zip_col).reset_index(drop=True)
+    keys = info[zip_col].to_numpy()
+
+    all_zips = np.unique(np.asarray(zip_codes).astype(int))
+    missing = all_zips[~np.isin(all_zips, keys)]
+    position = np.searchsorted(keys, missing)
+    lower = (position - 1).clip(0)
+    upper = position.clip(max=len(keys) - 1)
+    take_lower = (position > 0) & ((position == len(keys)) | (missing - keys[lower] <= keys[upper] - missing))
+
+    filled = info.iloc[np.where(take_lower, lower, upper)].copy()
+    filled[zip_col] = missing
+    final_data = pd.concat([info, filled], ignore_index=True)
+    return final_data.sort_values(by=zip_col).reset_index(drop=True)
+
+def save_school_locations(input_file, output_file):
+    # generate a education csv file that has locations of schools 
+    original_df = gpd.read_file(input_file)
+    gdf_edu = gpd.GeoDataFrame(original_df[['School_ID', 'Short_Name', 'Long_Name', 'School_Type','School_Latitude','School_Longitude','Website',"Creative_School_Certification"]]) # use variables we need
+    gdf_edu.to_csv(output_file, index=False, encoding="utf-8")
 
 # Main Execution
 def main(file_path):
@@ -122,34 +130,15 @@ def main(file_path):
     zip_results = compute_zip_level_metrics(df)
     return zip_results
 
-if __name__ == '__main__':
-    BASE_DIR = Path(__file__).parent.parent
-    file_path = BASE_DIR / "data" / "raw_data"/  "Chicago_Public_Schools_2024.csv"
-    zip_results = main(file_path)
-    zip_results.reset_index(inplace=True)
-    zip_results.rename(columns={"index": "zip_code"}, inplace=True)
-    zip_results.to_csv("./data/cleaned_data/cleaned_data_education.csv", index=False)
-    all_zip_codes = pd.read_csv("./data/cleaned_data/chicago_zip.csv")
-    info_zip_codes = pd.read_csv("./data/cleaned_data/cleaned_data_education.csv")
-    zip_col = "zip_code"
-    all_zip_codes[zip_col] = all_zip_codes[zip_col].astype(int)
-    info_zip_codes[zip_col] = info_zip_codes[zip_col].astype(int)
-
-    all_zip_codes = all_zip_codes.sort_values(by=zip_col).reset_index(drop=True)
-    zip_info_dict = info_zip_codes.set_index(zip_col).to_dict(orient="index")
-
-    missing_zips = all_zip_codes[~all_zip_codes[zip_col].isin(info_zip_codes[zip_col])]
-    missing_values_df = missing_zips[zip_col].apply(find_nearest_values)
-    missing_zips = pd.concat([missing_zips, missing_values_df], axis=1)
-    final_data = pd.concat([info_zip_codes, missing_zips], ignore_index=True)
-    final_data = final_data.sort_values(by=zip_col).reset_index(drop=True)
-
-    final_data.to_csv("./data/cleaned_data/cleaned_data_education.csv", index=False)
-    # generate a education csv file that has locations of schools 
-    BASE_DIR = Path(__file__).parent.parent
-    INPUT_FILE = BASE_DIR / "data" / "raw_data" / "education.csv"
-    OUTPUT_FILE = BASE_DIR / "data" / "cleaned_data"/"cleaned_education.csv"
+def build_education_file(raw_file=RAW_FILE, zip_list_file=ZIP_LIST_FILE, output_file=OUTPUT_FILE):
+    """Education scores of every Chicago zip code, saved with a 'zipcode' column."""
+    zip_results = main(raw_file)
+    zip_results = zip_results.rename_axis("zip_code").reset_index()
+    all_zip_codes = read_table(zip_list_file)["zipcode"].astype(int)
+    final_data = backfill_nearest_zip(zip_results, all_zip_codes)
+    final_data = final_data.rename(columns={"zip_code": "zipcode"})
+    return write_table(final_data, output_file)
 
-    original_df = gpd.read_file(INPUT_FILE)
-    gdf_edu = gpd.GeoDataFrame(original_df[['School_ID', 'Short_Name', 'Long_Name', 'School_Type','School_Latitude','School_Longitude','Website',"Creative_School_Certification"]]) # use variables we need
-    gdf_edu.to_csv(OUTPUT_FILE, index=False, encoding="utf-8")
+if __name__ == '__main__':
+    build_education_file()
+    save_school_locations(SCHOOLS_FILE, SCHOOL_LOCATIONS_FILE)
@@ -1,66 +1,39 @@
-from typing import NamedTuple
-from shapely.geometry import Point, shape
-from shapely import wkt
-from analysis.zips import load_shapefile_with_cache
-import pandas as pd
+from analysis.zips import load_chicago_zip_index
+from analysis.geocode import read_points, coerce_points, zip_points, count_by_zip
+from analysis.all_data_normalize import DataNormalizer
+from analysis.datastore import read_table, write_table
 import pathlib
-import geopandas as gpd
-import csv
-import json
 
 def load_frs_csv(file_path):
     """
     Given a CSV containing enviromental incidents
     locations , return a list of points objects.
     """
-    environmental_incidents = []
-    with file_path.open(mode="r") as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            lat=row["LATITUDE"].strip()
-            lon=row["LONGITUDE"].strip()
-            if lat != "" and lon !="":
-                        point=Point(lon,lat)
-                        environmental_incidents.append(point)
-    return environmental_incidents
+    gdf_points = read_points(file_path, "LATITUDE", "LONGITUDE")
+    return gdf_points.geometry.tolist()
 
 def find_zip_codes(gdf_zip, points):
-    processed_points = []
-    for p in points:
-        if isinstance(p, str):
-            geom = wkt.loads(p)
-            processed_points.append((geom.y, geom.x))
-        elif isinstance(p, (tuple, list)) and len(p) == 2:
-            processed_points.append(p)
-        elif isinstance(p, Point):
-            processed_points.append((p.y, p.x))
-        else:
-            print("Bad format")
-    df_points = pd.DataFrame(processed_points, columns=['lat', 'lon'])
-    df_points['geometry'] = df_points.apply(lambda row: Point(row['lon'], row['lat']), axis=1)
-    
-    gdf_points = gpd.GeoDataFrame(df_points, geometry='geometry', crs="EPSG:4326")
-    gdf_joined = gpd.sjoin(gdf_points, gdf_zip, how='left', predicate='within')
-    df_result=gdf_joined[['lat', 'lon', 'ZCTA5CE20']]
+    gdf_points = coerce_points(points)
+    df_result = zip_points(gdf_points, gdf_zip)
     BASE_DIR = pathlib.Path(__file__).parent.parent
-    file_path = BASE_DIR / "data" / "raw_data" / "environment.csv"
+    file_path = BASE_DIR / "data" / "raw_data" / "environment_zips.csv"
     df_result.to_csv(file_path, index=False)
-    return gdf_joined[['lat', 'lon', 'ZCTA5CE20']]
+    return df_result
 
 def info():
-    shp_file = pathlib.Path("../data/raw_data/Zips/tl_2020_us_zcta520.shp")
-    zips=load_shapefile_with_cache(shp_file)
     BASE_DIR = pathlib.Path(__file__).parent.parent
+    # Chicago-only ZCTAs with a prebuilt spatial index, instead of the national shapefile
+    zips, zip_tree = load_chicago_zip_index()
     file_path = BASE_DIR / "data" / "raw_data" / "environment.csv"
-    find_zip_codes(zips,load_frs_csv(file_path))
-    df = pd.read_csv("../data/raw_data/environment_zips.csv")
-    zip_codes_df = pd.read_csv("../data/cleaned_data/chicago_zip.csv")
-    zip_column = "ZCTA5CE20"
-    zip_codes_list = zip_codes_df["zip_code"].astype(float).tolist()
-    df_filtered = df[df[zip_column].astype(float).isin(zip_codes_list)]
+    gdf_points = read_points(file_path, "LATITUDE", "LONGITUDE")
+    df = zip_points(gdf_points, zips, sindex=zip_tree)
+    df.to_csv(BASE_DIR / "data" / "raw_data" / "environment_zips.csv", index=False)
+    zip_codes_df = read_table(BASE_DIR / "data" / "cleaned_data" / "chicago_zip.csv")
 
-    conteo_por_zip = df_filtered.groupby(zip_column).size().reset_index(name="count")
-    conteo_por_zip.to_csv("../data/cleaned_data/cleaned_data_environment.csv", index=False)
+    conteo_por_zip = count_by_zip(df["ZCTA5CE20"], zip_codes_df["zipcode"])
+    # the environment score is added in memory, the file is written once
+    conteo_por_zip = DataNormalizer().normalize_environment(conteo_por_zip)
+    write_table(conteo_por_zip, BASE_DIR / "data" / "cleaned_data" / "cleaned_data_environment.csv")
     return 
 if __name__ == '__main__':  
-    info()
\ No newline at end of file
+    info()
@@ -1,14 +1,95 @@
+import numpy as np
 import pandas as pd
 import pathlib
 
+from analysis.datastore import read_table, write_table
+from analysis.scoring import INDICATORS, ScoringEngine
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # nearest centroids are then found by brute force
+    cKDTree = None
+
 
 # This file aims at calculating the final living score based on various index weight
 # Return finalized different index score and final score as website visualization
 
 
+# Missing scores are the mean of this many nearest ZIP codes
+NEAREST_COUNT = 4
+
+
+def _nearest_by_zip(zips, order, valid, missing, k):
+    """
+    Rows of the k valid ZIP codes closest to each missing one, shape (missing, k), -1 when
+    there are fewer than k. The k nearest values of a sorted array are within k places on
+    either side of the searchsorted position, so only those 2k candidates are compared.
+    """
+    valid_rows = order[valid[order]]
+    valid_zips = zips[valid_rows]
+    targets = zips[missing]
+    position = np.searchsorted(valid_zips, targets)
+    candidates = position[:, None] + np.arange(-k, k)
+    inside = (candidates >= 0) & (candidates < len(valid_rows))
+    candidates = candidates.clip(0, len(valid_rows) - 1)
+    rows = valid_rows[candidates]
+    distance = np.where(inside, np.abs(valid_zips[candidates] - targets[:, None]), np.iinfo(np.int64).max)
+    # sort by distance, then row order
+    pick = _argsort_pairs(distance, rows)[:, :k]
+    chosen = np.take_along_axis(rows, pick, axis=1)
+    return np.where(np.take_along_axis(inside, pick, axis=1), chosen, -1)
+
+
+def _nearest_by_distance(points, valid, missing, k, max_cells=1 << 20):
+    """
+    Rows of the k valid points closest (Euclidean) to each missing point, -1 when fewer than k.
+    Uses a KD-tree when scipy is installed, else compares blocks of missing points with all valid points.
+    """
+    valid_rows = np.flatnonzero(valid)
+    targets = points[missing]
+    k_valid = min(k, len(valid_rows))
+    result = np.full((len(targets), k), -1, dtype=np.intp)
+    if cKDTree is not None:
+        _, nearest = cKDTree(points[valid_rows]).query(targets, k=k_valid)
+        result[:, :k_valid] = valid_rows[nearest.reshape(len(targets), k_valid)]
+        return result
+    # Distances are computed for a block of missing rows at a time to bound memory
+    step = max(1, max_cells // max(1, len(valid_rows)))
+    for start in range(0, len(targets), step):
+        block = targets[start:start + step]
+        distance = np.hypot(block[:, None, 0] - points[valid_rows, 0], block[:, None, 1] - points[valid_rows, 1])
+        # k smallest in linear time, then only those are sorted
+        nearest = np.argpartition(distance, k_valid - 1, axis=1)[:, :k_valid]
+        pick = _argsort_pairs(np.take_along_axis(distance, nearest, axis=1), nearest)
+        result[start:start + step, :k_valid] = valid_rows[np.take_along_axis(nearest, pick, axis=1)]
+    return result
+
+
+def _distance(zips, points, rows, others, by_point):
+    # Distance between rows and others, between centroids where by_point, else between ZIP codes
+    by_zip = np.abs(zips[rows] - zips[others]).astype(float)
+    if points is None:
+        return by_zip
+    by_point_distance = np.hypot(*(points[rows] - points[others]).T)
+    return np.where(by_point, by_point_distance, by_zip)
+
+
+def _argsort_pairs(primary, secondary):
+    # Row-wise argsort on (primary, secondary)
+    order = np.argsort(secondary, axis=1, kind="stable")
+    by_primary = np.argsort(np.take_along_axis(primary, order, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(order, by_primary, axis=1)
+
+
 class FinalScoreCalculator:
-    def __init__(self):
+    def __init__(self, centroids=None, weights=None):
+        """
+        centroids: optional ZIP code centroids, to impute by distance instead of ZIP code difference.
+        weights: indicator weights of the final score, see scoring.weight_vector.
+        """
         self.base_dir = pathlib.Path(__file__).parent.parent
+        self.centroids = centroids
+        self.weights = weights
         
         # Input file path
         self.zip_list_file = self.base_dir / "data" / "cleaned_data" / "chicago_zip.csv"
@@ -26,31 +107,83 @@ class FinalScoreCalculator:
         return str(zipcode).split('.')[0]
 
     def read_and_normalize(self, file_path, zip_col="zipcode"):
-        df = pd.read_csv(file_path)
-        df[zip_col] = df[zip_col].apply(self.normalize_zip)
-        return df
+        # The data store already keeps zip codes as strings of digits
+        return read_table(file_path, zip_col=zip_col)
     
     # Impute missing values by using the average of the values from the 4 nearest ZIP codes (based on absolute difference of ZIP code)
     # suggestion: OpenAI
     def impute_by_nearest(self, df, col):
+        return self.impute_all_by_nearest(df, [col])
+
+    def impute_all_by_nearest(self, df, cols, k=NEAREST_COUNT, centroids=None):
+        """
+        Fill the missing values of every column in cols with the mean of the k
+        nearest ZIP codes that have a value in that column. Rows are filled in
+        order, so values imputed on earlier rows count as values, as in the loop
+        this replaces.
+
+        Distance is the absolute difference of the ZIP codes as integers, or, with
+        centroids (DataFrame indexed by zipcode with 'x' and 'y', see
+        geocode.zip_centroids), the distance between ZIP code centroids.
+        Ties in ZIP code difference are broken by row order, like nsmallest.
+        """
         df = df.copy()
-        df['zip_int'] = df['zipcode'].astype(int)
-        
-        missing = df[df[col].isnull()].index
-        
-        for i in missing:
-            current_zip = df.loc[i, 'zip_int']
-            valid = df[df[col].notnull()]
-            if valid.empty:
-                continue  
-            valid = valid.assign(distance=(valid['zip_int'] - current_zip).abs())
-            nearest = valid.nsmallest(4, 'distance')
-
-            mean_val = nearest[col].mean()
-            df.loc[i, col] = mean_val
-        
-       
-        df.drop(columns=['zip_int'], inplace=True)
+        zips = df['zipcode'].astype(int).to_numpy()
+        # Sorted once for all columns, stable so equal ZIP codes keep their row order
+        order = np.argsort(zips, kind="stable")
+        sorted_zips = zips[order]
+        located = np.zeros(len(df), dtype=bool)
+        points = None
+        if centroids is not None:
+            points = centroids.reindex(df['zipcode'].astype(str))[['x', 'y']].to_numpy(dtype=float)
+            located = ~np.isnan(points).any(axis=1)
+            by_x = np.flatnonzero(located)
+            by_x = by_x[np.argsort(points[by_x, 0], kind="stable")]
+            sorted_x = points[by_x, 0]
+
+        for col in cols:
+            values = df[col].to_numpy(dtype=float)
+            missing = np.isnan(values)
+            if not missing.any() or missing.all():
+                continue
+            neighbors = np.empty((missing.sum(), k), dtype=np.intp)
+            # ZIP codes without a centroid fall back to the ZIP code difference
+            by_distance = missing & located if (located & ~missing).any() else np.zeros_like(missing)
+            by_zip = missing & ~by_distance
+            if by_distance.any():
+                neighbors[by_distance[missing]] = _nearest_by_distance(points, located & ~missing, by_distance, k)
+            if by_zip.any():
+                neighbors[by_zip[missing]] = _nearest_by_zip(zips, order, ~missing, by_zip, k)
+            neighbor_values = np.where(neighbors >= 0, values[neighbors], 0.0)
+            values[missing] = neighbor_values.sum(axis=1) / (neighbors >= 0).sum(axis=1)
+
+            # The observed neighbors are the answer unless another missing ZIP code is at least
+            # as close as the k-th of them: only those rows are filled again, one by one in row order
+            others = np.empty(missing.sum(), dtype=np.intp)
+            if by_distance.any():
+                others[by_distance[missing]] = _nearest_by_distance(points, by_distance, by_distance, 2)[:, 1]
+            if by_zip.any():
+                others[by_zip[missing]] = _nearest_by_zip(zips, order, missing, by_zip, 2)[:, 1]
+            rows = np.flatnonzero(missing)
+            kth = np.where(neighbors[:, -1] >= 0,
+                           _distance(zips, points, rows, neighbors[:, -1], by_distance[rows]), np.inf)
+            closer = (others >= 0) & (_distance(zips, points, rows, others, by_distance[rows]) <= kth)
+            # the new neighbors are no farther than the k-th observed one, so only ZIP codes within
+            # that distance (of the ZIP code, or of the centroid's x) are compared
+            for row, limit in zip(rows[closer], kth[closer]):
+                if by_distance[row]:
+                    low = np.searchsorted(sorted_x, points[row, 0] - limit, side="left")
+                    high = np.searchsorted(sorted_x, points[row, 0] + limit, side="right")
+                    candidates = np.sort(by_x[low:high])
+                else:
+                    low = np.searchsorted(sorted_zips, zips[row] - limit, side="left")
+                    high = np.searchsorted(sorted_zips, zips[row] + limit, side="right")
+                    candidates = np.sort(order[low:high])
+                donors = candidates[~missing[candidates] | (candidates < row)]
+                distance = _distance(zips, points, row, donors, by_distance[row])
+                nearest = donors[np.argsort(distance, kind="stable")[:k]]
+                values[row] = values[nearest].sum() / len(nearest)
+            df.loc[missing, col] = values[missing]
         return df
 
     # Merge all the index score based on "zipcode" then calculate the final score based on various weight
@@ -118,26 +251,18 @@ class FinalScoreCalculator:
                           'avg_income_score', 'private_insurance_score', 'education_score', 
                           'crime_score', 'environment_score']
         
-        for col in cols_to_impute:
-            df_merge = self.impute_by_nearest(df_merge, col)
-    
+        df_merge = self.impute_all_by_nearest(df_merge, cols_to_impute, centroids=self.centroids)
+
         
-        # Compute the final living score using the given weights:
-        df_merge["final_score"] = (0.17 * df_merge["unemployed_score"] +
-                                   0.17 * df_merge["commute_time_score"] +
-                                   0.19 * df_merge["avg_income_score"] +
-                                   0.03 * df_merge["private_insurance_score"] +
-                                   0.15 * df_merge["education_score"] +
-                                   0.17 * df_merge["crime_score"] +
-                                   0.12 * df_merge["environment_score"]).round(2)
+        # Compute the final living score using the given weights (scoring.WEIGHTS by default)
+        engine = ScoringEngine(df_merge["zipcode"], df_merge[INDICATORS])
+        df_merge["final_score"] = engine.scores(self.weights).round(2)
         
         return df_merge
 
     def save_final_score(self):
  
-        df_final = self.merge_data()
-        output_path = self.output_file
-        df_final.to_csv(output_path, index=False)
+        df_final = write_table(self.merge_data(), self.output_file)
         print(f"Final living score data saved")
         return df_final
 
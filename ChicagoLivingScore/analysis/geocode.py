@@ -0,0 +1,163 @@
+from collections import Counter
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shapely import wkt
+
+
+# This file holds the geocoding steps shared by the crime and environment analysis:
+# read point coordinates from a CSV, build the point geometry and find the zip code
+# (ZCTA) each point falls in. Everything works on whole columns, no per-row Python.
+
+ZIP_COLUMN = "ZCTA5CE20"
+
+
+def _is_value(column, value):
+    # CSV flags come as "True"/"true"/"TRUE", compare them as lower case strings.
+    # Only the few distinct values are compared, then matched with isin.
+    target = str(value).lower()
+    matches = [u for u in column.unique() if str(u).strip().lower() == target]
+    return column.isin(matches)
+
+
+def _to_float(column):
+    if pd.api.types.is_numeric_dtype(column):
+        return column.astype(float)
+    return pd.to_numeric(column.astype(str).str.strip(), errors="coerce")
+
+
+def points_frame(df, lat_col, lon_col):
+    """
+    Turn a DataFrame with coordinate columns into a GeoDataFrame with
+    'lat', 'lon' and point geometry. Rows without valid coordinates are dropped.
+    """
+    lat = _to_float(df[lat_col])
+    lon = _to_float(df[lon_col])
+    valid = lat.notna() & lon.notna()
+    lat = lat[valid].to_numpy()
+    lon = lon[valid].to_numpy()
+    return gpd.GeoDataFrame(
+        {"lat": lat, "lon": lon},
+        geometry=gpd.points_from_xy(lon, lat),
+        crs="EPSG:4326",
+    )
+
+
+def _filter_frame(df, filters):
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for col, value in filters.items():
+        mask &= _is_value(df[col], value).to_numpy()
+    return df[mask]
+
+
+def read_points(file_path, lat_col="Latitude", lon_col="Longitude", filters=None, chunksize=None):
+    """
+    Read the point locations of a CSV.
+    Only the coordinate and filter columns are parsed.
+
+    filters: {column: value} rows are kept when every column equals its value,
+             e.g. {"Arrest": True, "Domestic": False}
+    chunksize: if given, return an iterator of GeoDataFrames of at most that many rows
+    """
+    filters = filters or {}
+    usecols = [lat_col, lon_col] + [col for col in filters if col not in (lat_col, lon_col)]
+    # Coordinates are parsed as numbers by the C parser, flags are kept as text
+    dtypes = {col: str for col in filters}
+    reader = pd.read_csv(file_path, usecols=usecols, dtype=dtypes, chunksize=chunksize)
+    if chunksize is None:
+        return points_frame(_filter_frame(reader, filters), lat_col, lon_col)
+    return (points_frame(_filter_frame(chunk, filters), lat_col, lon_col) for chunk in reader)
+
+
+def coerce_points(points):
+    """
+    Build a points GeoDataFrame ('lat', 'lon', geometry) from a list of
+    shapely Points, WKT strings or (lat, lon) pairs.
+    """
+    geoms = []
+    for p in points:
+        if isinstance(p, str):
+            geoms.append(wkt.loads(p))
+        elif isinstance(p, (tuple, list)) and len(p) == 2:
+            geoms.append(shapely.Point(p[1], p[0]))  # (lat, lon)
+        elif isinstance(p, shapely.Point):
+            geoms.append(p)
+        else:
+            print("Bad format")
+    geoms = np.array(geoms, dtype=object)
+    lon = shapely.get_x(geoms) if len(geoms) else np.array([], dtype=float)
+    lat = shapely.get_y(geoms) if len(geoms) else np.array([], dtype=float)
+    return gpd.GeoDataFrame(
+        {"lat": lat, "lon": lon},
+        geometry=gpd.points_from_xy(lon, lat),
+        crs="EPSG:4326",
+    )
+
+
+def assign_zip_codes(gdf_points, gdf_zip, zip_col=ZIP_COLUMN, sindex=None):
+    """
+    Return the zip code of every point (NaN if it is in none), aligned with gdf_points.
+
+    sindex: spatial index of gdf_zip's geometry (gdf_zip.sindex or a shapely STRtree),
+            pass a prebuilt one to reuse it across calls.
+    """
+    if sindex is None:
+        sindex = gdf_zip.sindex
+    point_idx, zip_idx = sindex.query(gdf_points.geometry.values, predicate="within")
+    # A point on a shared border can match two zip codes, keep the first like sjoin's first row
+    point_idx, first = np.unique(point_idx, return_index=True)
+    zip_codes = np.full(len(gdf_points), np.nan, dtype=object)
+    zip_codes[point_idx] = gdf_zip[zip_col].to_numpy()[zip_idx[first]]
+    return pd.Series(zip_codes, index=gdf_points.index, name=zip_col)
+
+
+def zip_points(gdf_points, gdf_zip, zip_col=ZIP_COLUMN, sindex=None):
+    """'lat', 'lon' and zip code of every point."""
+    df = pd.DataFrame({"lat": gdf_points["lat"], "lon": gdf_points["lon"]})
+    df[zip_col] = assign_zip_codes(gdf_points, gdf_zip, zip_col, sindex)
+    return df
+
+
+def count_by_zip(zip_codes, zip_list):
+    """
+    Number of points per zip code, only for the zip codes in zip_list.
+    Returns a DataFrame with 'zipcode' and 'count', sorted by zip code.
+    """
+    zip_codes = pd.Series(zip_codes).dropna().astype(str)
+    zip_list = pd.Series(zip_list).astype(str).str.split(".").str[0]
+    zip_codes = zip_codes[zip_codes.isin(zip_list)]
+    counts = zip_codes.value_counts().sort_index()
+    return pd.DataFrame({"zipcode": counts.index, "count": counts.to_numpy()})
+
+
+def stream_count_by_zip(file_path, gdf_zip, zip_list, lat_col="Latitude", lon_col="Longitude",
+                        filters=None, chunksize=500_000, zip_col=ZIP_COLUMN, sindex=None):
+    """
+    Same result as count_by_zip over the whole file, but the CSV is read in
+    chunks and only the running count per zip code is kept. Memory is bounded by
+    the chunk size, whatever the size of the input.
+    """
+    if sindex is None:
+        sindex = gdf_zip.sindex
+    totals = Counter()
+    for gdf_points in read_points(file_path, lat_col, lon_col, filters, chunksize=chunksize):
+        zip_codes = assign_zip_codes(gdf_points, gdf_zip, zip_col, sindex)
+        counts = count_by_zip(zip_codes, zip_list)
+        totals.update(dict(zip(counts["zipcode"], counts["count"].tolist())))
+    zipcodes = sorted(totals)
+    return pd.DataFrame({"zipcode": zipcodes, "count": np.array([totals[z] for z in zipcodes], dtype="int64")})
+
+
+def zip_centroids(gdf_zip, zip_col=ZIP_COLUMN, crs="EPSG:5070"):
+    """
+    Centroid of every zip code as a DataFrame indexed by zip code with 'x' and 'y'
+    in meters (CONUS Albers by default), e.g. to find the nearest zip codes by distance.
+    """
+    centroids = gdf_zip.to_crs(crs).geometry.centroid
+    return pd.DataFrame(
+        {"x": centroids.x.to_numpy(), "y": centroids.y.to_numpy()},
+        index=pd.Index(gdf_zip[zip_col].astype(str).to_numpy(), name="zipcode"),
+    )
@@ -6,47 +6,241 @@ import pathlib
 import pandas as pd
 import numpy as np
 
+from analysis.datastore import write_table
+from analysis.normalize import normalize_series
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed to write and read Parquet
+    pa = pq = None
+
 # This file aims at cleaning housing data from Zillow
 # Transform raw datasets 
 # Normalize dataset by Min-Max normalization
 # Generate new metrics "average housing price per sqft group by zip code"
 
 
+# Columns kept from a Zillow search listing and their types.
+# Keys (zpid, zipcode) are text, measures are floats so missing values stay NaN.
+LISTING_COLUMNS = {
+    "zpid": "string",
+    "streetAddress": "string",
+    "city": "string",
+    "state": "string",
+    "zipcode": "string",
+    "latitude": "float64",
+    "longitude": "float64",
+    "price": "float64",
+    "bathrooms": "float64",
+    "bedrooms": "float64",
+    "livingArea": "float64",
+    "homeType": "string",
+}
+BATCH_SIZE = 10_000
+
+# Every zip code is oversampled to at least MIN_COUNT listings, with a fixed seed
+MIN_COUNT = 50
+SEED = 42
+
+
+def iter_json_array(file, chunk_size=1 << 16):
+    """
+    Yield the items of a JSON array one at a time, reading the file in chunks.
+    Only the current chunk and item are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    while not buffer:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        buffer = chunk.lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array")
+    pos = 1
+    while True:
+        # Skip the separators, reading more of the file when the buffer is used up
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos == len(buffer):
+            buffer = file.read(chunk_size)
+            pos = 0
+            if not buffer:
+                raise ValueError("Unterminated JSON array")
+            continue
+        if buffer[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            item, end = None, len(buffer)
+        # The item is complete when a separator follows it, otherwise it may
+        # continue in the next chunk (e.g. a cut number): read more and retry
+        if end == len(buffer) or buffer[end] not in " \t\r\n,]":
+            more = file.read(max(chunk_size, len(buffer)))
+            if not more:
+                raise ValueError("Invalid JSON array")
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+        yield item
+        pos = end
+
+
+def iter_listings(json_path):
+    """Listings of a search dump: a JSON array (.json) or one listing per line (.jsonl)."""
+    with open(json_path, 'r', encoding='utf-8') as file:
+        if pathlib.Path(json_path).suffix == ".jsonl":
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(file)
+
+
+def listing_record(home):
+    """Flatten one search listing into the LISTING_COLUMNS fields."""
+    home_info = home.get("hdpData", {}).get("homeInfo", {})
+    record = {column: home_info.get(column) for column in LISTING_COLUMNS}
+    record["zpid"] = home.get("zpid")
+    return record
+
+
+def listing_frame(records):
+    """DataFrame with the LISTING_COLUMNS types from a list of listing records."""
+    df = pd.DataFrame(records, columns=list(LISTING_COLUMNS))
+    for column, dtype in LISTING_COLUMNS.items():
+        if dtype == "float64":
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def read_listings(path):
+    """Read converted listings, Parquet or CSV, with the LISTING_COLUMNS types."""
+    if pathlib.Path(path).suffix == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_csv(path, dtype={column: dtype for column, dtype in LISTING_COLUMNS.items()
+                                    if dtype == "string"})
+
+
+def oversample_indices(keys, min_count=MIN_COUNT, seed=SEED):
+    """
+    Row positions of the oversampled data: rows grouped by key, largest groups
+    first (value_counts order), and every group with fewer than min_count rows
+    resampled with replacement to min_count rows. Rows with a missing key are dropped.
+    Returns (positions, group number of each position, group keys).
+
+    The rows are the ones df_group.sample(n=min_count, replace=True, random_state=seed)
+    picks for each group. That draw only depends on the size of the group, so it is
+    made once per distinct size (fewer than min_count draws) and applied to every
+    group with index arithmetic, without filtering the frame per group.
+    """
+    counts = pd.Series(keys).value_counts()
+    sizes = counts.to_numpy()
+    codes = pd.Categorical(keys, categories=counts.index).codes
+
+    # Row positions sorted by group, in their original order inside a group
+    positions = np.flatnonzero(codes >= 0)
+    positions = positions[np.argsort(codes[positions], kind="stable")]
+    starts = np.cumsum(sizes) - sizes
+
+    small = sizes < min_count
+    draws = np.zeros((min_count, min_count), dtype=np.intp)
+    for size in np.unique(sizes[small]):
+        draws[size] = np.random.RandomState(seed).choice(size, size=min_count, replace=True)
+
+    out_sizes = np.where(small, min_count, sizes)
+    groups = np.repeat(np.arange(len(sizes)), out_sizes)
+    within = np.arange(len(groups)) - np.repeat(np.cumsum(out_sizes) - out_sizes, out_sizes)
+    sampled = draws[sizes[groups].clip(max=min_count - 1), within.clip(max=min_count - 1)]
+    within = np.where(small[groups], sampled, within)
+    return positions[starts[groups] + within], groups, counts.index
+
+
+def average_by_zip(df, min_count=MIN_COUNT, seed=SEED, mode="sample"):
+    """
+    Average price per sqft of every zip code (value_counts order) after oversampling.
+
+    mode="sample": draw the oversampled rows (reproducible with the seed).
+    mode="expected": the expected value of that average. Resampling a group with
+    replacement does not change its expected mean, so this is the plain mean per
+    zip code and no duplicate rows are built.
+    """
+    price_per_sqft = (df['price'] / df['livingArea']).to_numpy()
+    if mode == "expected":
+        means = pd.Series(price_per_sqft).groupby(df['zipcode'].to_numpy()).mean()
+        zipcodes = df['zipcode'].value_counts().index
+        return pd.DataFrame({'zipcode': zipcodes, 'avg_price_per_sqft': means.reindex(zipcodes).to_numpy()})
+    if mode != "sample":
+        raise ValueError(f"Unknown oversampling mode: {mode}")
+    positions, groups, zipcodes = oversample_indices(df['zipcode'], min_count, seed)
+    means = pd.Series(price_per_sqft[positions]).groupby(groups).mean()
+    return pd.DataFrame({'zipcode': zipcodes, 'avg_price_per_sqft': means.to_numpy()})
+
+
 class HousingDataProcessor:
     def __init__(self):
         pass
     
     # Convert raw JSON data to a CSV file
     def convert_json_to_csv(self, json_path, csv_path):
-        with open(json_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-
-        properties = []
-        for home in data:
-            home_info = home.get("hdpData", {}).get("homeInfo", {})
-            property_data = {
-                "zpid": home.get("zpid"),
-                "streetAddress": home_info.get("streetAddress"),
-                "city": home_info.get("city"),
-                "state": home_info.get("state"),
-                "zipcode": home_info.get("zipcode"),
-                "latitude": home_info.get("latitude"),
-                "longitude": home_info.get("longitude"),
-                "price": home_info.get("price"),
-                "bathrooms": home_info.get("bathrooms"),
-                "bedrooms": home_info.get("bedrooms"),
-                "livingArea": home_info.get("livingArea"),
-                "homeType": home_info.get("homeType")
-            }
-            properties.append(property_data)
-
-        df = pd.DataFrame(properties)
+        df = listing_frame([listing_record(home) for home in iter_listings(json_path)])
         df.to_csv(csv_path, index=False, encoding='utf-8')
         print(f"CSV file has been converted：{csv_path}")
         return df
 
-    def process_housing_data(self, input_csv, output_csv):
+    def convert_json_to_columnar(self, json_path, output_path, batch_size=BATCH_SIZE):
+        """
+        Stream the listings of a search dump (JSON array or JSONL) into a typed
+        Parquet file, batch_size listings at a time, so memory does not grow with
+        the number of scraped pages. Without pyarrow, or for a .csv output_path,
+        the batches are appended to a CSV file instead.
+        Returns the number of listings written.
         """
+        output_path = pathlib.Path(output_path)
+        parquet = output_path.suffix == ".parquet"
+        if parquet and pq is None:
+            raise ImportError("Writing Parquet needs pyarrow, use a .csv output_path instead")
+
+        writer = None
+        rows = 0
+        batch = []
+
+        def flush():
+            nonlocal writer, rows
+            df = listing_frame(batch)
+            if parquet:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table)
+            else:
+                first = rows == 0
+                df.to_csv(output_path, mode="w" if first else "a", header=first, index=False, encoding='utf-8')
+            rows += len(batch)
+            batch.clear()
+
+        try:
+            for home in iter_listings(json_path):
+                batch.append(listing_record(home))
+                if len(batch) == batch_size:
+                    flush()
+            # the last partial batch, or an empty file with just the columns
+            if batch or writer is None and rows == 0:
+                flush()
+        finally:
+            if writer is not None:
+                writer.close()
+        print(f"{rows} listings converted：{output_path}")
+        return rows
+
+    def process_housing_data(self, input_csv, output_csv, oversample="sample"):
+        """
+        input_csv: listings from convert_json_to_columnar, Parquet or CSV.
+        oversample: "sample" or "expected", see average_by_zip.
         1. Process missing values in livingArea: fill missing with 0,
            then replace 0 with the global median.
         2. In order to deal with the imbalanced dataset, oversample the data so that each zipcode has at least min_count samples.
@@ -55,7 +249,7 @@ class HousingDataProcessor:
            normalize using min-max scaling (inverted so that higher cost gets a lower score).
         5. Save the final DataFrame to a CSV file.
         """
-        df = pd.read_csv(input_csv)
+        df = read_listings(input_csv)
 
         # Process livingArea: convert to numeric, fill missing with 0,
         # and replace 0 with the global median (of non-zero values)
@@ -64,44 +258,15 @@ class HousingDataProcessor:
         median = df.loc[df['livingArea'] != 0, 'livingArea'].median()
         df['livingArea'] = df['livingArea'].replace(0, median)
 
-        # Oversample: ensure each zipcode has at least min_count samples
-        min_count = 50  # Set up the threshold
-        oversampled_data = []
-        zip_counts = df['zipcode'].value_counts()
-
-
-        for zc, count in zip_counts.items():
-            df_zc = df[df['zipcode'] == zc]
-            if count < min_count:
-                # Sample with replacement if there are too few samples
-                df_zc_oversampled = df_zc.sample(n=min_count, replace=True, random_state=42)
-                oversampled_data.append(df_zc_oversampled)
-            else:
-                oversampled_data.append(df_zc)
-
-        df_oversampled = pd.concat(oversampled_data, ignore_index=True)
-
-        # Calculate price per sqft for each record
-        # Compute average price per sqft per zipcode
-        df_oversampled['price_per_sqft'] = df_oversampled['price'] / df_oversampled['livingArea']
-        df_oversampled['avg_price_per_sqft'] = df_oversampled.groupby('zipcode')['price_per_sqft'].transform('mean')
-
-        # Keep only zipcode and average price per sqft
-        df_final = df_oversampled[['zipcode', 'avg_price_per_sqft']].drop_duplicates().reset_index(drop=True)
+        # Oversample: ensure each zipcode has at least min_count samples,
+        # then compute average price per sqft per zipcode
+        df_final = average_by_zip(df, MIN_COUNT, SEED, mode=oversample)
         df_final['avg_price_per_sqft'] = df_final['avg_price_per_sqft'].round(2)
 
         # Min-Max normalization (inverted) for avg_price_per_sqft
-        min_val = df_final['avg_price_per_sqft'].min()
-        max_val = df_final['avg_price_per_sqft'].max()
-
-        if max_val - min_val != 0:
-            df_final['norm_avg_price_per_sqft'] = 1 - ((df_final['avg_price_per_sqft'] - min_val) / (max_val - min_val))
-        else:
-            df_final['norm_avg_price_per_sqft'] = 1
-
-        df_final['norm_avg_price_per_sqft'] = df_final['norm_avg_price_per_sqft'].round(2)
+        df_final['norm_avg_price_per_sqft'] = normalize_series(df_final['avg_price_per_sqft'], invert=True).round(2)
         
-        df_final.to_csv(output_csv, index=False)
+        df_final = write_table(df_final, output_csv)
         print(f"Processed data saved to: {output_csv}")
         return df_final
 
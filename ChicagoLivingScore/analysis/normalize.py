@@ -0,0 +1,103 @@
+from typing import NamedTuple
+import warnings
+import numpy as np
+import pandas as pd
+
+
+# This file holds the normalization used by every analysis stage.
+# Columns are scaled together as one (rows x columns) array, and the scaling
+# statistics are returned so the same scale can be applied to new data.
+#
+# methods:
+#   "minmax": (x - min) / (max - min), in [0, 1]
+#   "robust": like minmax between two percentiles, clipped to [0, 1], so a few outliers do not squash the rest
+#   "zscore": (x - mean) / std
+# Inverted columns get 1 - x (minmax, robust) or -x (zscore): a higher raw value gives a lower score.
+# Missing values stay missing and are ignored by the statistics.
+
+METHODS = ("minmax", "robust", "zscore")
+
+
+class ScaleStats(NamedTuple):
+    method: str
+    low: np.ndarray  # min, low percentile or mean of every column
+    high: np.ndarray  # max, high percentile or std of every column
+    invert: np.ndarray  # bool per column
+    constant: float  # value given to a column without spread, before inversion
+
+
+def fit(values, method="minmax", invert=False, percentiles=(5, 95), constant=0.0):
+    """Scaling statistics of every column of a 2-D array."""
+    if method not in METHODS:
+        raise ValueError(f"Unknown normalization method: {method}")
+    values = np.asarray(values, dtype=float)
+    n_cols = values.shape[1]
+    with warnings.catch_warnings():
+        # an all-missing column gives NaN statistics, and NaN scores
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if method == "minmax":
+            low, high = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+        elif method == "robust":
+            low, high = np.nanpercentile(values, percentiles, axis=0)
+        else:
+            low, high = np.nanmean(values, axis=0), np.nanstd(values, axis=0)
+    invert = np.broadcast_to(np.asarray(invert, dtype=bool), (n_cols,)).copy()
+    return ScaleStats(method, low, high, invert, constant)
+
+
+def transform(values, stats):
+    """Scale a 2-D array with statistics from fit."""
+    values = np.asarray(values, dtype=float)
+    if stats.method == "zscore":
+        center, spread = stats.low, stats.high
+    else:
+        center, spread = stats.low, stats.high - stats.low
+    flat = spread == 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scaled = (values - center) / np.where(flat, 1.0, spread)
+    scaled = np.where(flat & ~np.isnan(values), stats.constant, scaled)
+    if stats.method == "robust":
+        scaled = np.clip(scaled, 0.0, 1.0)
+    if stats.method == "zscore":
+        return np.where(stats.invert, -scaled, scaled)
+    return np.where(stats.invert, 1 - scaled, scaled)
+
+
+def scale(values, method="minmax", invert=False, percentiles=(5, 95), constant=0.0):
+    """
+    Normalize every column of a 2-D array at once.
+    invert: bool for all columns or one bool per column
+    constant: score of a column whose values are all equal (before inversion)
+    Returns (scaled array, ScaleStats).
+    """
+    stats = fit(values, method, invert, percentiles, constant)
+    return transform(values, stats), stats
+
+
+def normalize_columns(df, columns, method="minmax", invert=(), percentiles=(5, 95), constant=0.0):
+    """
+    Normalize the given columns of a DataFrame in memory.
+    invert: names of the columns to invert, or True for all of them
+    Returns (new DataFrame, ScaleStats in the order of columns).
+    """
+    columns = list(columns)
+    if isinstance(invert, bool):
+        flags = [invert] * len(columns)
+    else:
+        flags = [column in set(invert) for column in columns]
+    scaled, stats = scale(df[columns].to_numpy(dtype=float), method, flags, percentiles, constant)
+    df = df.copy()
+    df[columns] = scaled
+    return df, stats
+
+
+def normalize_series(series, method="minmax", invert=False, constant=0.0):
+    """Normalize one Series, keeping its index and name."""
+    scaled, _ = scale(series.to_numpy(dtype=float)[:, None], method, invert, constant=constant)
+    return pd.Series(scaled[:, 0], index=series.index, name=series.name)
+
+
+def stats_frame(stats, columns):
+    """The statistics as a DataFrame indexed by column, e.g. to save them with the data."""
+    return pd.DataFrame({"method": stats.method, "low": stats.low, "high": stats.high,
+                         "invert": stats.invert}, index=pd.Index(list(columns), name="column"))
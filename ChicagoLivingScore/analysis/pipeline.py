@@ -0,0 +1,269 @@
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, NamedTuple
+
+
+# This file runs the analysis stages as one pipeline.
+# Every stage declares the files it reads and writes, which gives a DAG:
+# a stage depends on the stages that write one of its inputs.
+# Inputs are fingerprinted by sha256 and a stage only runs again when one of
+# its input fingerprints changed, an output is missing or it is forced.
+# Stages in the same wave of the DAG are independent and run in parallel processes.
+#
+# Usage (from the ChicagoLivingScore directory):
+#   python -m analysis.pipeline                 # run what changed
+#   python -m analysis.pipeline --dry-run       # show what would run first
+#   python -m analysis.pipeline final --force   # force a stage and its upstream stages
+
+
+BASE_DIR = pathlib.Path(__file__).parent.parent
+RAW_DIR = BASE_DIR / "data" / "raw_data"
+CLEANED_DIR = BASE_DIR / "data" / "cleaned_data"
+STATE_FILE = BASE_DIR / "data" / "cache" / "pipeline_state.json"
+
+ZIP_LIST_FILE = CLEANED_DIR / "chicago_zip.csv"
+SHAPE_FILE = RAW_DIR / "Zips" / "tl_2020_us_zcta520.shp"
+CRIME_FILE = CLEANED_DIR / "cleaned_data_crime.csv"
+ENV_FILE = CLEANED_DIR / "cleaned_data_environment.csv"
+ECON_FILE = CLEANED_DIR / "cleaned_data_economic_infrastructure.csv"
+EDUCATION_FILE = CLEANED_DIR / "cleaned_data_education.csv"
+HOUSING_FILE = CLEANED_DIR / "cleaned_data_housing.csv"
+FINAL_FILE = CLEANED_DIR / "final_living_score.csv"
+
+
+class Stage(NamedTuple):
+    name: str
+    run: Callable  # module level function (or functools.partial of one), so it can be sent to a worker process
+    inputs: tuple
+    outputs: tuple
+
+
+# Stage functions import their module lazily: a worker only loads what it runs,
+# and modules that do work at import time are not triggered by importing the pipeline.
+
+def run_crime():
+    from analysis.crime_data_analysis import info
+    info()
+
+def run_environment():
+    from analysis.environment_data_analysis import info
+    info()
+
+def run_economic():
+    from analysis.economic_infrastructure_analysis import main, RAW_FILE
+    main(RAW_FILE)
+
+def run_education():
+    from analysis.education_data_analysis import (
+        build_education_file, save_school_locations, SCHOOLS_FILE, SCHOOL_LOCATIONS_FILE,
+    )
+    build_education_file()
+    save_school_locations(SCHOOLS_FILE, SCHOOL_LOCATIONS_FILE)
+
+def run_housing():
+    from analysis.housing_data_analysis import HousingDataProcessor
+    HousingDataProcessor().process_housing_data(RAW_DIR / "raw_data_housing.csv", HOUSING_FILE)
+
+def run_final():
+    from analysis.final_score_analysis import FinalScoreCalculator
+    FinalScoreCalculator().save_final_score()
+
+
+STAGES = [
+    Stage("crime", run_crime, (RAW_DIR / "crimes.csv", SHAPE_FILE, ZIP_LIST_FILE), (CRIME_FILE,)),
+    Stage("environment", run_environment, (RAW_DIR / "environment.csv", SHAPE_FILE, ZIP_LIST_FILE), (ENV_FILE,)),
+    Stage("economic", run_economic, (RAW_DIR / "raw_data_eco_infra.csv",), (ECON_FILE,)),
+    Stage("education", run_education,
+          (RAW_DIR / "Chicago_Public_Schools_2024.csv", RAW_DIR / "education.csv", ZIP_LIST_FILE),
+          (EDUCATION_FILE, CLEANED_DIR / "cleaned_education.csv")),
+    Stage("housing", run_housing, (RAW_DIR / "raw_data_housing.csv",), (HOUSING_FILE,)),
+    Stage("final", run_final, (ZIP_LIST_FILE, HOUSING_FILE, ECON_FILE, EDUCATION_FILE, CRIME_FILE, ENV_FILE),
+          (FINAL_FILE,)),
+]
+
+
+def _run_stage(stage, base_dir):
+    # Some stages use paths relative to the project directory
+    cwd = os.getcwd()
+    os.chdir(base_dir)
+    try:
+        stage.run()
+    finally:
+        os.chdir(cwd)
+    return stage.name
+
+
+class Pipeline:
+    def __init__(self, stages=STAGES, state_file=STATE_FILE, base_dir=BASE_DIR):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_file = pathlib.Path(state_file)
+        self.base_dir = pathlib.Path(base_dir)
+        self.state = self._load_state()
+
+    def _load_state(self):
+        try:
+            state = json.loads(self.state_file.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            state = {}
+        state.setdefault("digests", {})
+        state.setdefault("stages", {})
+        return state
+
+    def _save_state(self):
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.state_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(self.state, indent=2, sort_keys=True))
+        tmp_file.replace(self.state_file)
+
+    def _key(self, path):
+        path = pathlib.Path(path)
+        try:
+            return str(path.relative_to(self.base_dir))
+        except ValueError:
+            return str(path)
+
+    def fingerprint(self, path):
+        """
+        sha256 of a file, or None if it does not exist.
+        Digests are remembered with the file's mtime and size, so large raw files
+        are only hashed again after they change.
+        """
+        path = pathlib.Path(path)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        key = self._key(path)
+        known = self.state["digests"].get(key)
+        if known and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+        sha = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        self.state["digests"][key] = [stat.st_mtime_ns, stat.st_size, digest]
+        return digest
+
+    def dependencies(self):
+        """{stage name: names of the stages that write one of its inputs}"""
+        deps = {}
+        for stage in self.stages.values():
+            inputs = set(stage.inputs)
+            deps[stage.name] = {
+                other.name for other in self.stages.values()
+                if other.name != stage.name and inputs & set(other.outputs)
+            }
+        return deps
+
+    def waves(self, targets=None):
+        """
+        Group stages into waves: every stage only depends on stages of earlier waves.
+        With targets, only those stages and their upstream stages are included.
+        """
+        deps = self.dependencies()
+        selected = set(self.stages)
+        if targets:
+            unknown = set(targets) - selected
+            if unknown:
+                raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+            selected = set()
+            todo = list(targets)
+            while todo:
+                name = todo.pop()
+                if name not in selected:
+                    selected.add(name)
+                    todo.extend(deps[name])
+
+        waves = []
+        done = set()
+        while len(done) < len(selected):
+            wave = [name for name in self.stages
+                    if name in selected and name not in done and deps[name] & selected <= done]
+            if not wave:
+                raise ValueError("The pipeline stages have a dependency cycle")
+            waves.append(wave)
+            done.update(wave)
+        return waves
+
+    def status(self, stage, force=False):
+        """
+        Return (should_run, reason) for a stage.
+        A stage whose inputs are not all available is skipped when its outputs
+        already exist (e.g. raw files that are not part of the repository).
+        """
+        inputs = {self._key(path): self.fingerprint(path) for path in stage.inputs}
+        outputs_exist = all(pathlib.Path(path).exists() for path in stage.outputs)
+        missing = sorted(key for key, digest in inputs.items() if digest is None)
+        if missing:
+            if outputs_exist:
+                return False, f"skipped, missing {missing[0]}"
+            raise FileNotFoundError(f"Stage {stage.name} cannot run, missing {missing[0]}")
+        if force:
+            return True, "forced"
+        if not outputs_exist:
+            return True, "missing output"
+        if self.state["stages"].get(stage.name) != inputs:
+            return True, "inputs changed"
+        return False, "up to date"
+
+    def _record(self, stage):
+        # Inputs are fingerprinted after the run, so a stage that rewrites its
+        # own inputs is not seen as changed on the next run
+        inputs = {self._key(path): self.fingerprint(path) for path in stage.inputs}
+        self.state["stages"][stage.name] = inputs
+
+    def run(self, targets=None, force=False, jobs=None, dry_run=False):
+        """
+        Run the stages that are out of date, wave by wave.
+        Returns the names of the stages that ran (or would run, with dry_run).
+        """
+        ran = []
+        for wave in self.waves(targets):
+            todo = []
+            for name in wave:
+                stage = self.stages[name]
+                should_run, reason = self.status(stage, force)
+                print(f"[pipeline] {name}: {reason}")
+                if should_run:
+                    todo.append(stage)
+            if dry_run:
+                ran.extend(stage.name for stage in todo)
+                # later waves depend on outputs that were not rebuilt yet
+                break
+
+            if jobs == 1 or len(todo) <= 1:
+                for stage in todo:
+                    _run_stage(stage, self.base_dir)
+            else:
+                with ProcessPoolExecutor(max_workers=jobs) as executor:
+                    futures = [executor.submit(_run_stage, stage, self.base_dir) for stage in todo]
+                    for future in futures:
+                        future.result()
+            for stage in todo:
+                self._record(stage)
+                ran.append(stage.name)
+            self._save_state()
+        return ran
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Chicago Living Score analysis pipeline")
+    parser.add_argument("targets", nargs="*", help="stages to build, with their upstream stages (default: all)")
+    parser.add_argument("--force", action="store_true", help="run the stages even if their inputs did not change")
+    parser.add_argument("--jobs", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--dry-run", action="store_true", help="only show which stages of the first wave would run")
+    args = parser.parse_args(argv)
+
+    pipeline = Pipeline()
+    ran = pipeline.run(targets=args.targets or None, force=args.force, jobs=args.jobs, dry_run=args.dry_run)
+    print(f"[pipeline] {'would run' if args.dry_run else 'ran'}: {', '.join(ran) or 'nothing'}")
+    return ran
+
+
+if __name__ == "__main__":
+    main()
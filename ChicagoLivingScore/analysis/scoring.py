@@ -0,0 +1,239 @@
+import argparse
+import itertools
+import pathlib
+import time
+import numpy as np
+import pandas as pd
+
+from analysis.datastore import read_table, zip_key
+
+
+# This file computes the final living score from the indicator scores.
+# The scores of all zip codes are kept as one (zip codes x indicators) array,
+# so the final score of every zip code for any weighting is one matrix-vector product,
+# and the scores of many weightings (what-if scenarios) one matrix product.
+#
+# Rank stability over random weightings (from the ChicagoLivingScore directory):
+#   python -m analysis.scoring --scenarios 100000
+
+
+# Indicator column -> weight in the final living score
+WEIGHTS = {
+    "unemployed_score": 0.17,
+    "commute_time_score": 0.17,
+    "avg_income_score": 0.19,
+    "private_insurance_score": 0.03,
+    "education_score": 0.15,
+    "crime_score": 0.17,
+    "environment_score": 0.12,
+}
+INDICATORS = list(WEIGHTS)
+DEFAULT_WEIGHTS = np.array(list(WEIGHTS.values()))
+
+
+def weight_vector(weights=None):
+    """
+    Turn weights into a vector in the INDICATORS order, scaled to sum to 1.
+    weights: None for the default weights, a sequence of len(INDICATORS) numbers,
+             or {indicator column: weight} (indicators left out weigh 0).
+    Raises ValueError for unknown indicators or weights that are negative, not
+    finite or all zero.
+    """
+    if weights is None:
+        return DEFAULT_WEIGHTS.copy()
+    if isinstance(weights, dict):
+        unknown = set(weights) - set(INDICATORS)
+        if unknown:
+            raise ValueError(f"Unknown indicators: {', '.join(sorted(unknown))}")
+        weights = [weights.get(indicator, 0.0) for indicator in INDICATORS]
+    vector = np.asarray(weights, dtype=float)
+    if vector.shape != (len(INDICATORS),):
+        raise ValueError(f"Expected {len(INDICATORS)} weights, got {vector.size}")
+    if not np.isfinite(vector).all() or (vector < 0).any():
+        raise ValueError("Weights must be finite and not negative")
+    total = vector.sum()
+    if total == 0:
+        raise ValueError("At least one weight must be positive")
+    return vector / total
+
+
+def weight_matrix(weights):
+    """
+    Validate a (scenarios x INDICATORS) weight array and scale every row to sum to 1.
+    Same rules as weight_vector for every row.
+    """
+    matrix = np.asarray(weights, dtype=float)
+    if matrix.ndim != 2 or matrix.shape[1] != len(INDICATORS):
+        raise ValueError(f"Expected a (scenarios x {len(INDICATORS)}) weight array, got shape {matrix.shape}")
+    if not np.isfinite(matrix).all() or (matrix < 0).any():
+        raise ValueError("Weights must be finite and not negative")
+    totals = matrix.sum(axis=1, keepdims=True)
+    if (totals == 0).any():
+        raise ValueError("Every scenario needs at least one positive weight")
+    return matrix / totals
+
+
+def dirichlet_weights(n, concentration=None, seed=42):
+    """
+    n random weightings drawn around the default weights.
+    concentration: how close the draws stay to the defaults (Dirichlet alpha = concentration * defaults);
+                   None draws uniformly over all weightings.
+    """
+    rng = np.random.default_rng(seed)
+    alpha = np.ones(len(INDICATORS)) if concentration is None else concentration * DEFAULT_WEIGHTS
+    return rng.dirichlet(alpha, size=n)
+
+
+def perturbed_weights(delta=0.05, base=None):
+    """
+    One-at-a-time perturbations: every indicator weight moved by -delta and +delta
+    (clipped at 0), the other weights unchanged before scaling. 2 * len(INDICATORS) rows.
+    """
+    base = weight_vector(base)
+    rows = []
+    for i in range(len(INDICATORS)):
+        for sign in (-1, 1):
+            row = base.copy()
+            row[i] = max(0.0, row[i] + sign * delta)
+            rows.append(row)
+    return weight_matrix(rows)
+
+
+def grid_weights(steps=10):
+    """Every weighting with weights in multiples of 1/steps summing to 1 (a grid over the simplex)."""
+    # choose the len(INDICATORS) - 1 cut points among steps + len(INDICATORS) - 1 slots (stars and bars)
+    k = len(INDICATORS)
+    cuts = np.array(list(itertools.combinations(range(steps + k - 1), k - 1)))
+    bounds = np.hstack([np.full((len(cuts), 1), -1), cuts, np.full((len(cuts), 1), steps + k - 1)])
+    return (np.diff(bounds, axis=1) - 1) / steps
+
+
+def parse_weights(text):
+    """
+    Weights from a query string: "0.2,0.1,..." in the INDICATORS order, or
+    "crime_score:2,education_score:1" by indicator column.
+    """
+    parts = [part.strip() for part in text.split(",") if part.strip()]
+    if parts and all(":" in part for part in parts):
+        pairs = (part.split(":", 1) for part in parts)
+        return weight_vector({name.strip(): float(value) for name, value in pairs})
+    return weight_vector([float(part) for part in parts])
+
+
+class ScoringEngine:
+    def __init__(self, zipcodes, matrix):
+        """
+        zipcodes: the zip code of every row
+        matrix: (zip codes x INDICATORS) normalized indicator scores
+        """
+        self.zipcodes = np.asarray(zipcodes, dtype=str)
+        self.matrix = np.ascontiguousarray(matrix, dtype=float)
+
+    @classmethod
+    def from_frame(cls, df_metrics):
+        zipcodes = zip_key(df_metrics["zipcode"])
+        # chicago_zip.csv lists a zip code twice, keep one row per zip code
+        first = ~zipcodes.duplicated().to_numpy()
+        return cls(zipcodes[first], df_metrics.loc[first, INDICATORS].to_numpy(dtype=float))
+
+    def scores(self, weights=None):
+        """Final score of every zip code for the weights (see weight_vector)."""
+        return self.matrix @ weight_vector(weights)
+
+    def ranking(self, weights=None):
+        """
+        Return (scores, ranks): rank 1 is the best zip code. Equal scores share
+        the best of their ranks, missing scores are ranked last.
+        """
+        scores = self.scores(weights)
+        ranks = rank_descending(scores[None, :])[0]
+        return scores, ranks
+
+
+    def scenario_scores(self, weights):
+        """(scenarios x zip codes) final scores for a (scenarios x INDICATORS) weight array."""
+        return weight_matrix(weights) @ self.matrix.T
+
+    def rank_stability(self, weights, top=5, chunk_size=10_000):
+        """
+        How the rank of every zip code moves across weight scenarios.
+        weights: (scenarios x INDICATORS) array, e.g. dirichlet_weights, grid_weights, perturbed_weights
+        top: rank counted for p_top
+        chunk_size: scenarios scored at a time, memory stays at chunk_size x zip codes
+
+        Returns a DataFrame per zip code with mean_rank, rank_var, min_rank,
+        max_rank and p_top (share of scenarios where it ranks in the top), best mean rank first.
+        """
+        weights = weight_matrix(weights)
+        n_zips = len(self.zipcodes)
+        rank_sum = np.zeros(n_zips)
+        rank_sq_sum = np.zeros(n_zips)
+        top_count = np.zeros(n_zips, dtype=np.int64)
+        min_rank = np.full(n_zips, n_zips, dtype=np.int64)
+        max_rank = np.zeros(n_zips, dtype=np.int64)
+        for start in range(0, len(weights), chunk_size):
+            ranks = rank_descending(weights[start:start + chunk_size] @ self.matrix.T)
+            rank_sum += ranks.sum(axis=0)
+            rank_sq_sum += (ranks.astype(float) ** 2).sum(axis=0)
+            top_count += (ranks <= top).sum(axis=0)
+            min_rank = np.minimum(min_rank, ranks.min(axis=0))
+            max_rank = np.maximum(max_rank, ranks.max(axis=0))
+
+        n = len(weights)
+        mean_rank = rank_sum / n
+        df = pd.DataFrame({
+            "zipcode": self.zipcodes,
+            "mean_rank": mean_rank,
+            "rank_var": np.maximum(rank_sq_sum / n - mean_rank ** 2, 0.0),
+            "min_rank": min_rank,
+            "max_rank": max_rank,
+            "p_top": top_count / n,
+        })
+        return df.sort_values(["mean_rank", "zipcode"]).reset_index(drop=True)
+
+
+def rank_descending(scores):
+    """
+    Ranks (1 = highest) of every row of a (scenarios x zip codes) array.
+    Ties share the best rank, NaN is ranked last.
+    """
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    sorted_scores = np.take_along_axis(scores, order, axis=1)
+    # position of the first score of every run of equal scores
+    new_run = np.ones(sorted_scores.shape, dtype=bool)
+    new_run[:, 1:] = sorted_scores[:, 1:] != sorted_scores[:, :-1]
+    positions = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    run_start = np.maximum.accumulate(np.where(new_run, positions, 0), axis=1)
+    ranks = np.empty(scores.shape, dtype=np.int64)
+    np.put_along_axis(ranks, order, run_start + 1, axis=1)
+    return ranks
+
+
+def score_frame(engine, weights=None):
+    """zipcode, final_score and rank of every zip code, best first."""
+    scores, ranks = engine.ranking(weights)
+    df = pd.DataFrame({"zipcode": engine.zipcodes, "final_score": scores, "rank": ranks})
+    return df.sort_values(["rank", "zipcode"]).reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank stability of the zip codes over random weightings")
+    parser.add_argument("--scenarios", type=int, default=100_000, help="number of Dirichlet weightings")
+    parser.add_argument("--concentration", type=float, default=None,
+                        help="keep the weightings around the defaults (default: uniform over all weightings)")
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    data_file = pathlib.Path(__file__).parent.parent / "data" / "cleaned_data" / "final_living_score.csv"
+    engine = ScoringEngine.from_frame(read_table(data_file))
+    weights = dirichlet_weights(args.scenarios, args.concentration)
+    start = time.perf_counter()
+    report = engine.rank_stability(weights, top=args.top)
+    print(report.head(15).to_string(index=False))
+    print(f"{args.scenarios} scenarios x {len(engine.zipcodes)} zip codes in {time.perf_counter() - start:.2f} s")
+    return report
+
+
+if __name__ == "__main__":
+    main()
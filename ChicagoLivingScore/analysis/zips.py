@@ -1,17 +1,116 @@
+import hashlib
+import json
+import os
 import pathlib
 import geopandas as gpd
 import joblib
+import pandas as pd
+import shapely
 
-def load_shapefile_with_cache(shp_path: pathlib.Path, cache_path: pathlib.Path = pathlib.Path("cached_shapefile.pkl")) -> gpd.GeoDataFrame:
+from analysis.datastore import read_table
 
+BASE_DIR = pathlib.Path(__file__).parent.parent
+CACHE_DIR = BASE_DIR / "data" / "cache" / "zcta"
+SHAPE_FILE = BASE_DIR / "data" / "raw_data" / "Zips" / "tl_2020_us_zcta520.shp"
+ZIP_LIST_FILE = BASE_DIR / "data" / "cleaned_data" / "chicago_zip.csv"
+
+# (west, south, east, north) around the city, the national ZCTAs outside it are never read
+CHICAGO_BBOX = (-87.95, 41.62, -87.50, 42.03)
+# Bump when the layout of the cached index changes
+INDEX_VERSION = 1
+
+def _write_atomic(path: pathlib.Path, write) -> None:
+    """
+    write(temp_path) to a file of this process, then move it into place: stages running
+    in parallel may build the same cache, readers never see a half written file.
+    """
+    temp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    write(temp)
+    os.replace(temp, path)
+
+def _load_cache(cache_path):
+    """The cached object, None when the file is missing or cannot be read (rebuilt by the caller)."""
     try:
-        gdf = joblib.load(cache_path)
+        return joblib.load(cache_path)
     except FileNotFoundError:
+        return None
+    except Exception as error:
+        print(f"Ignoring unreadable cache {cache_path}: {error!r}")
+        return None
+
+def load_shapefile_with_cache(shp_path: pathlib.Path, cache_path: pathlib.Path = CACHE_DIR / "cached_shapefile.pkl") -> gpd.GeoDataFrame:
+
+    gdf = _load_cache(cache_path)
+    if gdf is None:
         gdf = gpd.read_file(shp_path)
         if gdf.crs is None:
             gdf = gdf.set_crs("EPSG:4326", allow_override=True)
-        joblib.dump(gdf, cache_path)
+        cache_path = pathlib.Path(cache_path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(cache_path, lambda temp: joblib.dump(gdf, temp))
     return gdf
+
+def _digest(paths, cache_dir):
+    """
+    sha256 over the given files. The digest of each file is remembered with its
+    mtime and size in cache_dir, so the national shapefile is only hashed once.
+    """
+    memo_file = cache_dir / "digests.json"
+    try:
+        memo = json.loads(memo_file.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        memo = {}
+    sha = hashlib.sha256()
+    for path in paths:
+        stat = path.stat()
+        known = memo.get(str(path))
+        if not (known and known[0] == stat.st_mtime_ns and known[1] == stat.st_size):
+            file_sha = hashlib.sha256()
+            with open(path, "rb") as file:
+                for block in iter(lambda: file.read(1 << 20), b""):
+                    file_sha.update(block)
+            known = memo[str(path)] = [stat.st_mtime_ns, stat.st_size, file_sha.hexdigest()]
+        sha.update(known[2].encode())
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    _write_atomic(memo_file, lambda temp: temp.write_text(json.dumps(memo)))
+    return sha.hexdigest()
+
+def build_chicago_zip_index(shp_path=SHAPE_FILE, zip_list_file=ZIP_LIST_FILE, bbox=CHICAGO_BBOX):
+    """
+    Read only the ZCTAs intersecting the Chicago bounding box, keep the ones in
+    chicago_zip.csv and build an STRtree over their polygons.
+    Returns (GeoDataFrame, STRtree), the tree indexes the rows of the frame.
+    """
+    gdf = gpd.read_file(shp_path, bbox=bbox)
+    if gdf.crs is None:
+        gdf = gdf.set_crs("EPSG:4326", allow_override=True)
+    zip_list = read_table(zip_list_file)["zipcode"]
+    gdf = gdf[gdf["ZCTA5CE20"].isin(set(zip_list))].reset_index(drop=True)
+    tree = shapely.STRtree(gdf.geometry.values)
+    return gdf, tree
+
+def load_chicago_zip_index(shp_path=SHAPE_FILE, zip_list_file=ZIP_LIST_FILE, cache_dir=CACHE_DIR):
+    """
+    Chicago ZCTAs and their STRtree, cached in cache_dir under a name keyed by
+    the hash of the shapefile and the zip list. A new shapefile or zip list
+    builds a new cache file, older ones are removed.
+    """
+    shp_path = pathlib.Path(shp_path)
+    cache_dir = pathlib.Path(cache_dir)
+    parts = [shp_path.with_suffix(suffix) for suffix in (".shp", ".dbf")]
+    digest = _digest(parts + [pathlib.Path(zip_list_file)], cache_dir)
+    cache_path = cache_dir / f"chicago_zcta-v{INDEX_VERSION}-{digest[:16]}.pkl"
+    index = _load_cache(cache_path)
+    if index is not None:
+        return index
+    index = build_chicago_zip_index(shp_path, zip_list_file)
+    _write_atomic(cache_path, lambda temp: joblib.dump(index, temp))
+    for old_file in cache_dir.glob("chicago_zcta-*.pkl"):
+        if old_file != cache_path:
+            # another stage may be removing it too
+            old_file.unlink(missing_ok=True)
+    return index
+
 if __name__ == "__main__":
-    shp_file = pathlib.Path("../data/raw_data/Zips/tl_2020_us_zcta520.shp")
-    gdf_shapefile = load_shapefile_with_cache(shp_file)
+    gdf_zip, tree = load_chicago_zip_index()
+    print(f"{len(gdf_zip)} Chicago ZCTAs cached in {CACHE_DIR}")
@@ -8,19 +8,37 @@ import lxml.html
 import pathlib
 from shapely.geometry import Point
 import json
+import hashlib
+import threading
+import time
+
+from map.topology import Topology, level_for_zoom, dumps, OBJECT_NAME
 
 
 BASE_DIR = pathlib.Path(__file__).parent
 
+ZIP_GEO_URL = "https://data.cityofchicago.org/api/views/unjd-c2ca/rows.xml?accessType=DOWNLOAD"
+# Local copy of the ZIP boundaries, so a cold start works without the data portal
+ZIP_GEO_CACHE_DIR = BASE_DIR.parent / "data" / "cache" / "zip_geo"
+ZIP_GEO_TTL = 7 * 24 * 60 * 60  # seconds before the local copy is fetched again
+# Zoom the folium maps open at, it picks the simplification level of their geometry
+MAP_ZOOM = 11
+# Object of the ZIP codes in the TopoJSON payloads
+TOPOJSON_PATH = f"objects.{OBJECT_NAME}"
+
+# Process-wide cache: {cache_dir: {"gdf", "geojson", "digest", "loaded_at"}}
+_zip_geo_cache = {}
+_zip_geo_lock = threading.Lock()
+
 def cssscraper(root, key):
     rows = root.cssselect(key)
     return [row.text for row in rows]
 
-def get_chicago_zip_geo():
-    # Download Chicago zipcode data as XML
-    url = "https://data.cityofchicago.org/api/views/unjd-c2ca/rows.xml?accessType=DOWNLOAD"
-    resp = httpx.get(url)
-    html_text = resp.text
+def parse_chicago_zip_xml(html_text):
+    """
+    Parse the City of Chicago ZIP boundary XML into a GeoDataFrame
+    with 'geometry', 'zip' and 'objectid' columns.
+    """
     root = lxml.html.fromstring(html_text) # to get the root from the html
     
     polygon_lst = cssscraper(root, "the_geom")
@@ -45,13 +63,166 @@ def get_chicago_zip_geo():
     gdf = gpd.GeoDataFrame(df, geometry='geometry')
     return gdf
 
+def _read_zip_geo_copy(cache_dir):
+    """Return (manifest, geojson text) of the local copy, or None if there is none."""
+    manifest_file = cache_dir / "manifest.json"
+    try:
+        manifest = json.loads(manifest_file.read_text())
+        geojson = (cache_dir / manifest["file"]).read_text()
+    except (FileNotFoundError, KeyError, json.JSONDecodeError):
+        return None
+    return manifest, geojson
+
+def _write_zip_geo_copy(cache_dir, digest, geojson):
+    """
+    Store the GeoJSON under a name derived from the hash of the downloaded XML
+    and point the manifest at it. Copies of older downloads are removed.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    file_name = f"zip_geo-{digest[:16]}.geojson"
+    (cache_dir / file_name).write_text(geojson)
+    manifest = {"digest": digest, "file": file_name, "fetched_at": time.time()}
+    tmp_file = cache_dir / "manifest.json.tmp"
+    tmp_file.write_text(json.dumps(manifest))
+    tmp_file.replace(cache_dir / "manifest.json")
+    for old_file in cache_dir.glob("zip_geo-*.geojson"):
+        if old_file.name != file_name:
+            old_file.unlink()
+    return manifest
+
+def _touch_zip_geo_copy(cache_dir, manifest):
+    # The portal returned the same content again, only restart the TTL
+    manifest = dict(manifest, fetched_at=time.time())
+    (cache_dir / "manifest.json").write_text(json.dumps(manifest))
+    return manifest
+
+def load_chicago_zip_geo(refresh=False, ttl=ZIP_GEO_TTL, cache_dir=ZIP_GEO_CACHE_DIR):
+    """
+    Load the Chicago ZIP boundaries once per process.
+
+    The order is: in-memory copy -> local copy on disk (if younger than 'ttl')
+    -> download from the data portal. If the download fails, a stale local copy
+    is used instead, so the app can start offline. 'refresh=True' skips the
+    memory and disk copies and downloads again.
+
+    Returns a dict with the GeoDataFrame ('gdf'), its GeoJSON text ('geojson'),
+    the hash of the downloaded XML ('digest') and 'loaded_at'.
+    """
+    cache_dir = pathlib.Path(cache_dir)
+    with _zip_geo_lock:
+        entry = _zip_geo_cache.get(cache_dir)
+        if entry and not refresh and time.time() - entry["loaded_at"] < ttl:
+            return entry
+
+        local = _read_zip_geo_copy(cache_dir)
+        manifest, geojson = local if local else (None, None)
+        fresh = manifest is not None and time.time() - manifest["fetched_at"] < ttl
+
+        if refresh or not fresh:
+            try:
+                resp = httpx.get(ZIP_GEO_URL)
+                resp.raise_for_status()
+            except httpx.HTTPError:
+                if local is None:
+                    raise
+                print("Could not download ZIP boundaries, using the local copy")
+            else:
+                digest = hashlib.sha256(resp.content).hexdigest()
+                if manifest is not None and manifest["digest"] == digest:
+                    manifest = _touch_zip_geo_copy(cache_dir, manifest)
+                else:
+                    geojson = parse_chicago_zip_xml(resp.text).to_json()
+                    manifest = _write_zip_geo_copy(cache_dir, digest, geojson)
+
+        # Reading the GeoJSON back avoids running wkt.loads on every polygon
+        gdf = gpd.GeoDataFrame.from_features(json.loads(geojson)["features"])
+        entry = {
+            "gdf": gdf,
+            "geojson": geojson,
+            "digest": manifest["digest"],
+            "loaded_at": time.time(),
+        }
+        _zip_geo_cache[cache_dir] = entry
+        return entry
+
+def refresh_chicago_zip_geo(cache_dir=ZIP_GEO_CACHE_DIR):
+    """Download the ZIP boundaries again and replace the cached copies."""
+    return load_chicago_zip_geo(refresh=True, cache_dir=cache_dir)
+
+def get_chicago_zip_geo(refresh=False):
+    # Return a copy so callers can add columns without touching the shared frame
+    return load_chicago_zip_geo(refresh=refresh)["gdf"].copy()
+
+def get_chicago_zip_geojson(refresh=False):
+    # GeoJSON text of the ZIP boundaries, serialized once per download
+    return load_chicago_zip_geo(refresh=refresh)["geojson"]
+
+
+def get_zip_topology():
+    """
+    Quantized arcs of the ZIP boundaries with their simplification levels
+    (see map/topology.py), built once per download.
+    """
+    entry = load_chicago_zip_geo()
+    if "topology" not in entry:
+        entry["topology"] = Topology.from_frame(entry["gdf"])
+    return entry["topology"]
+
+def get_zip_geojson_level(level):
+    # GeoJSON text of a simplification level, serialized once per download
+    entry = load_chicago_zip_geo()
+    key = ("geojson", level)
+    if key not in entry:
+        entry[key] = dumps(get_zip_topology().to_geojson(level))
+    return entry[key]
 
-def create_map(selected_zip=None):
+def get_zip_topojson(level):
+    # TopoJSON text of a simplification level, every shared border is written once
+    entry = load_chicago_zip_geo()
+    key = ("topojson", level)
+    if key not in entry:
+        entry[key] = dumps(get_zip_topology().to_topojson(level))
+    return entry[key]
+
+def zip_topojson_layer(zoom=MAP_ZOOM):
+    """
+    TopoJSON dict for folium.Choropleth(geo_data=..., topojson=TOPOJSON_PATH).
+    A new dict on every call, folium writes the styles into it.
+    """
+    return json.loads(get_zip_topojson(level_for_zoom(zoom)))
+
+def create_map(selected_zip=None, single_layer=True):
     """
     Generate a Folium map centered on Chicago. If 'selected_zip' is provided,
     that region will be highlighted with a darker color.
+
+    By default all ZIP codes go into one GeoJson layer, the highlight comes from
+    a style function on the 'zip' property and the popup from a GeoJsonPopup.
+    'single_layer=False' keeps the old layout of one GeoJson layer per ZIP code.
     """
     m = folium.Map(location=[41.8781, -87.6298], zoom_start=11, tiles='cartodbpositron')
+
+    if single_layer:
+        def style_function(feature):
+            # If this zipcode is selected, use dark color fill; otherwise use light blue fill.
+            if selected_zip and feature["properties"]["zip"] == selected_zip:
+                fill_color = "#2196F3"
+            else:
+                fill_color = "#BBDEFB"
+            return {
+                'fillColor': fill_color,
+                'color': "#0D47A1",
+                'weight': 2,
+                'fillOpacity': 0.6,
+            }
+
+        folium.GeoJson(
+            data=get_zip_geojson_level(level_for_zoom(MAP_ZOOM)),
+            style_function=style_function,
+            popup=folium.GeoJsonPopup(fields=["zip"], labels=False), # to add the mark that has zip number
+        ).add_to(m)
+        return m
+
     gdf = get_chicago_zip_geo()
     
     for _, row in gdf.iterrows():
@@ -80,10 +251,9 @@ def map_show_avg_price(m,df_metrics): # df_metrics is the final_score_analysis t
     
     df_use = df_metrics[["zipcode","avg_price_per_sqft"]]
     df_use["zipcode"] = df_use["zipcode"].astype(str)
-    gdf_json = get_chicago_zip_geo().to_json()
-
     folium.Choropleth(
-        geo_data=gdf_json,
+        geo_data=zip_topojson_layer(),
+        topojson=TOPOJSON_PATH,
         data=df_use,
         columns=["zipcode","avg_price_per_sqft"],
         key_on="feature.properties.zip",
@@ -101,10 +271,9 @@ def show_unemployed_score(m,df_metrics): # df_metrics is the final_score_analysi
     
     df_use = df_metrics[["zipcode","unemployed_score"]]
     df_use["zipcode"] = df_use["zipcode"].astype(str)
-    gdf_json = get_chicago_zip_geo().to_json()
-
     folium.Choropleth(
-        geo_data=gdf_json,
+        geo_data=zip_topojson_layer(),
+        topojson=TOPOJSON_PATH,
         data=df_use,
         columns=["zipcode","unemployed_score"],
         key_on="feature.properties.zip",
@@ -123,10 +292,9 @@ def show_trafic_score(m,df_metrics): # df_metrics is the final_score_analysis th
     
     df_use = df_metrics[["zipcode","commute_time_score"]]
     df_use["zipcode"] = df_use["zipcode"].astype(str)
-    gdf_json = get_chicago_zip_geo().to_json()
-
     folium.Choropleth(
-        geo_data=gdf_json,
+        geo_data=zip_topojson_layer(),
+        topojson=TOPOJSON_PATH,
         data=df_use,
         columns=["zipcode","commute_time_score"],
         key_on="feature.properties.zip",
@@ -145,10 +313,9 @@ def show_education_score(m,df_metrics): # df_metrics is the final_score_analysis
     
     df_use = df_metrics[["zipcode","education_score"]]
     df_use["zipcode"] = df_use["zipcode"].astype(str)
-    gdf_json = get_chicago_zip_geo().to_json()
-
     folium.Choropleth(
-        geo_data=gdf_json,
+        geo_data=zip_topojson_layer(),
+        topojson=TOPOJSON_PATH,
         data=df_use,
         columns=["zipcode","education_score"],
         key_on="feature.properties.zip",
@@ -168,10 +335,9 @@ def show_crime_score(m,df_metrics): # df_metrics is the final_score_analysis tha
     df_use = df_metrics[["zipcode","crime_score"]]
     df_use[["crime_score_norm"]] = 1 - df_use[["crime_score"]]
     df_use["zipcode"] = df_use["zipcode"].astype(str)
-    gdf_json = get_chicago_zip_geo().to_json()
-
     folium.Choropleth(
-        geo_data=gdf_json,
+        geo_data=zip_topojson_layer(),
+        topojson=TOPOJSON_PATH,
         data=df_use,
         columns=["zipcode","crime_score_norm"],
         key_on="feature.properties.zip",
@@ -190,10 +356,9 @@ def show_environment_score(m,df_metrics): # df_metrics is the final_score_analys
     
     df_use = df_metrics[["zipcode","environment_score"]]
     df_use["zipcode"] = df_use["zipcode"].astype(str)
-    gdf_json = get_chicago_zip_geo().to_json()
-
     folium.Choropleth(
-        geo_data=gdf_json,
+        geo_data=zip_topojson_layer(),
+        topojson=TOPOJSON_PATH,
         data=df_use,
         columns=["zipcode","environment_score"],
         key_on="feature.properties.zip",
@@ -212,10 +377,9 @@ def show_final_score(m,df_metrics): # df_metrics is the final_score_analysis tha
     
     df_use = df_metrics[["zipcode","final_score"]]
     df_use["zipcode"] = df_use["zipcode"].astype(str)
-    gdf_json = get_chicago_zip_geo().to_json()
-
     folium.Choropleth(
-        geo_data=gdf_json,
+        geo_data=zip_topojson_layer(),
+        topojson=TOPOJSON_PATH,
         data=df_use,
         columns=["zipcode","final_score"],
         key_on="feature.properties.zip",
@@ -227,14 +391,11 @@ def show_final_score(m,df_metrics): # df_metrics is the final_score_analysis tha
         
     ).add_to(m)
 
-    for feature in json.loads(gdf_json)["features"]:
-        zip_code = feature["properties"]["zip"]  # to get the zip number
-
-        popup = folium.Popup(zip_code) 
-        folium.GeoJson(
-            feature,
-            popup=popup, # place the zip into the map
-            style_function=lambda x: {"fillOpacity": 0, "color": "black", "weight": 1} 
-        ).add_to(m)
+    # One outline layer for all ZIP codes, the popup reads the zip from the feature properties
+    folium.GeoJson(
+        get_zip_geojson_level(level_for_zoom(MAP_ZOOM)),
+        popup=folium.GeoJsonPopup(fields=["zip"], labels=False), # place the zip into the map
+        style_function=lambda x: {"fillOpacity": 0, "color": "black", "weight": 1} 
+    ).add_to(m)
 
     return m
\ No newline at end of file
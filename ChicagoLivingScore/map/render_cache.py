@@ -0,0 +1,151 @@
+import hashlib
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+# This file keeps rendered map HTML in memory so that the website does not
+# rebuild the same folium map on every request.
+# Renders are keyed by (indicator, selected zip, data version), where the data
+# version is the hash of final_living_score.csv. A new version drops all renders.
+# Renders run outside the lock, requests for a map that is being rendered wait for
+# that render, other requests go on.
+# The metrics themselves are loaded through the data store, not parsed from the CSV.
+# Nothing heavy is imported here: the website creates its cache at import time.
+
+
+def read_metrics(data_file):
+    # pandas comes in with the data store, on the first load rather than at import
+    from analysis.datastore import read_table
+    return read_table(data_file)
+
+
+def file_digest(file_path):
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class MapRenderCache:
+    def __init__(self, data_file, render, max_entries=256, load=read_metrics):
+        """
+        data_file: CSV with the metrics (final_living_score.csv)
+        render: function(df, indicator, selected_zip) -> map html
+        max_entries: bound on the number of renders kept, least recently used go first
+        load: function(data_file) -> DataFrame
+        """
+        self.data_file = pathlib.Path(data_file)
+        self.render = render
+        self.load = load
+        self.version = None
+        self._stat = None
+        self._df = None
+        self.max_entries = max_entries
+        self._renders = OrderedDict()
+        self._derived = {}
+        self._pending = {}  # key -> Future of a render or build in progress
+        self._lock = threading.RLock()
+
+    def _check_version(self):
+        # A stat call is cheap, only hash the file when its mtime or size moved
+        stat = os.stat(self.data_file)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        if stat_key == self._stat:
+            return
+        digest = file_digest(self.data_file)
+        self._stat = stat_key
+        if digest != self.version:
+            self._df = self.load(self.data_file)
+            self._renders = OrderedDict()
+            self._derived = {}
+            self.version = digest
+
+    def data(self):
+        """Return the metrics DataFrame of the current data version."""
+        with self._lock:
+            self._check_version()
+            return self._df
+
+    def _claim(self, pending_key):
+        # With the lock held: (future of the work for this key, whether this thread has to do it)
+        future = self._pending.get(pending_key)
+        if future is not None:
+            return future, False
+        future = self._pending[pending_key] = Future()
+        return future, True
+
+    def _fulfil(self, pending_key, future, build, store):
+        # Run build() without the lock, so slow renders do not hold up other requests,
+        # then store(result) under the lock and hand the result to the waiting threads
+        try:
+            result = build()
+        except BaseException as error:
+            with self._lock:
+                del self._pending[pending_key]
+            future.set_exception(error)
+            raise
+        with self._lock:
+            del self._pending[pending_key]
+            store(result)
+        future.set_result(result)
+        return result
+
+    def derive(self, name, build, key=None):
+        """
+        Return build(df) for the current data version, built once per version.
+        Used for other structures that depend on the same CSV, e.g. per-zip records.
+        key: another input of the structure (e.g. the boundaries digest), a new key
+             replaces the entry of the old one
+        """
+        with self._lock:
+            self._check_version()
+            entry = self._derived.get(name)
+            if entry is not None and entry[0] == key:
+                return entry[1]
+            version, df = self.version, self._df
+            pending_key = ("derived", name, key, version)
+            future, owner = self._claim(pending_key)
+        if not owner:
+            return future.result()
+
+        def store(value):
+            # a reload while building leaves the entry to the new version
+            if self.version == version:
+                self._derived[name] = (key, value)
+
+        return self._fulfil(pending_key, future, lambda: build(df), store)
+
+    def get(self, indicator=None, selected_zip=None):
+        """Return the map html for an indicator / selected zip, rendering it on a miss."""
+        with self._lock:
+            self._check_version()
+            key = (indicator, selected_zip, self.version)
+            html = self._renders.get(key)
+            if html is not None:
+                self._renders.move_to_end(key)
+                return html
+            df = self._df
+            future, owner = self._claim(key)
+        if not owner:
+            # the same map is being rendered by another thread
+            return future.result()
+
+        def store(html):
+            if key[2] == self.version:
+                self._renders[key] = html
+                if len(self._renders) > self.max_entries:
+                    self._renders.popitem(last=False)
+
+        return self._fulfil(key, future, lambda: self.render(df, indicator, selected_zip), store)
+
+    def warm(self, keys):
+        """Render every (indicator, selected_zip) pair in keys ahead of the first request."""
+        for indicator, selected_zip in keys:
+            self.get(indicator, selected_zip)
+
+    def __len__(self):
+        return len(self._renders)
@@ -0,0 +1,380 @@
+import math
+import os
+import pathlib
+import shutil
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import shapely
+
+from analysis.datastore import zip_key
+from map.topology import level_for_zoom
+
+
+# This file serves the ZIP boundaries as Mapbox Vector Tiles (MVT 2.1), with the
+# scores of final_living_score.csv as feature attributes, so a browser only loads
+# the tiles it shows instead of the GeoJSON of the whole city.
+#
+# The geometry of a tile comes from the simplification level of its zoom (see
+# map/topology.py): projected to Web Mercator once per level, then per tile scaled
+# to the tile grid, clipped and snapped to integers. Tiles are kept in memory and
+# on disk per (z, x, y, version), where the version covers both the scores and the
+# boundaries, so tile URLs that carry the version can be cached by browsers for good.
+# Folders of old versions are removed by remove_old_versions, never while serving.
+#
+# The protobuf encoding is written out here (the format is small), no extra dependency.
+
+
+BASE_DIR = pathlib.Path(__file__).parent
+TILE_CACHE_DIR = BASE_DIR.parent / "data" / "cache" / "tiles"
+LAYER_NAME = "zips"
+EXTENT = 4096  # tile grid size
+BUFFER = 64  # grid units drawn outside the tile, so borders meet across tiles
+MAX_ZOOM = 18
+
+
+# --- protobuf encoding -------------------------------------------------------
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def _field(number, wire_type, payload):
+    # wire_type 0: varint (payload is an int), 1: 64-bit, 2: length-delimited
+    key = _varint((number << 3) | wire_type)
+    if wire_type == 0:
+        return key + _varint(payload)
+    if wire_type == 2:
+        return key + _varint(len(payload)) + payload
+    return key + payload
+
+def _packed(number, values):
+    return _field(number, 2, b"".join(_varint(int(value)) for value in values))
+
+def _value(value):
+    # Tile.Value: string (1), double (3), sint (6) or bool (7)
+    if isinstance(value, (bool, np.bool_)):
+        return _field(7, 0, int(value))
+    if isinstance(value, (int, np.integer)):
+        return _field(6, 0, _zigzag(int(value)))
+    if isinstance(value, (float, np.floating)):
+        return _field(3, 1, struct.pack("<d", float(value)))
+    return _field(1, 2, str(value).encode())
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+def _command(command_id, count):
+    # MoveTo 1, LineTo 2, ClosePath 7
+    return (command_id & 7) | (count << 3)
+
+
+def _ring_commands(ring, cursor):
+    """
+    MoveTo, LineTo and ClosePath commands of one closed ring of integer points,
+    starting from the cursor. Returns (commands, new cursor), no commands for a ring
+    that is left with less than 3 points.
+    """
+    points = ring[:-1]
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = (points[1:] != points[:-1]).any(axis=1)
+    points = points[keep]
+    if len(points) > 1 and (points[0] == points[-1]).all():
+        points = points[:-1]
+    if len(points) < 3:
+        return [], cursor
+    deltas = np.diff(np.vstack([cursor, points]), axis=0)
+    zigzag = ((deltas << 1) ^ (deltas >> 63)).ravel().tolist()
+    commands = [_command(1, 1), *zigzag[:2], _command(2, len(points) - 1), *zigzag[2:], _command(7, 1)]
+    return commands, points[-1]
+
+def _signed_area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return float(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1])) / 2
+
+def polygon_commands(polygons):
+    """
+    Geometry commands of a list of polygons, each a list of closed integer rings
+    (exterior first). Exterior rings get a positive area in tile coordinates and
+    holes a negative one, as the MVT spec asks.
+    """
+    commands = []
+    cursor = np.zeros(2, dtype=np.int64)
+    for rings in polygons:
+        for i, ring in enumerate(rings):
+            area = _signed_area(ring)
+            if area == 0:
+                if i == 0:
+                    break  # a collapsed exterior drops its holes too
+                continue
+            if (area > 0) != (i == 0):
+                ring = ring[::-1]
+            ring_commands, cursor = _ring_commands(ring, cursor)
+            commands.extend(ring_commands)
+    return commands
+
+def encode_layer(name, features, extent=EXTENT):
+    """
+    One Tile.Layer. features: list of (id, properties dict, polygon commands).
+    Keys and values are shared by all the features of the layer.
+    """
+    keys, values = {}, {}
+    body = [_field(15, 0, 2), _field(1, 2, name.encode())]
+    for feature_id, properties, commands in features:
+        if not commands:
+            continue
+        tags = []
+        for key, value in properties.items():
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value).__name__, value), len(values)))
+        feature = _field(1, 0, feature_id) + _packed(2, tags) + _field(3, 0, 3) + _packed(4, commands)
+        body.append(_field(2, 2, feature))
+    body.extend(_field(3, 2, key.encode()) for key in keys)
+    body.extend(_field(4, 2, _value(value)) for _, value in values)
+    body.append(_field(5, 0, extent))
+    return _field(3, 2, b"".join(body))
+
+
+# --- decoding, for tests and debugging ---------------------------------------
+
+def _read_varint(data, position):
+    result = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return result, position
+
+def _read_fields(data):
+    position = 0
+    while position < len(data):
+        key, position = _read_varint(data, position)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, position = _read_varint(data, position)
+        elif wire_type == 1:
+            value, position = data[position:position + 8], position + 8
+        elif wire_type == 2:
+            length, position = _read_varint(data, position)
+            value, position = data[position:position + length], position + length
+        else:
+            value, position = data[position:position + 4], position + 4
+        yield number, value
+
+def _unpacked(data):
+    values, position = [], 0
+    while position < len(data):
+        value, position = _read_varint(data, position)
+        values.append(value)
+    return values
+
+def decode_tile(data):
+    """{layer name: [{"id", "properties", "rings"}]}, rings in tile coordinates."""
+    layers = {}
+    for number, layer_data in _read_fields(data):
+        if number != 3:
+            continue
+        name, keys, values, raw_features = None, [], [], []
+        for field, value in _read_fields(layer_data):
+            if field == 1:
+                name = value.decode()
+            elif field == 2:
+                raw_features.append(value)
+            elif field == 3:
+                keys.append(value.decode())
+            elif field == 4:
+                (kind, raw), = _read_fields(value)
+                if kind == 1:
+                    values.append(raw.decode())
+                elif kind == 3:
+                    values.append(struct.unpack("<d", raw)[0])
+                elif kind == 6:
+                    values.append((raw >> 1) ^ -(raw & 1))
+                else:
+                    values.append(bool(raw) if kind == 7 else raw)
+        features = []
+        for raw_feature in raw_features:
+            feature = {"id": None, "properties": {}, "rings": []}
+            for field, value in _read_fields(raw_feature):
+                if field == 1:
+                    feature["id"] = value
+                elif field == 2:
+                    tags = _unpacked(value)
+                    feature["properties"] = {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])}
+                elif field == 4:
+                    feature["rings"] = _decode_rings(_unpacked(value))
+            features.append(feature)
+        layers[name] = features
+    return layers
+
+def _decode_rings(commands):
+    rings, x, y, i = [], 0, 0, 0
+    while i < len(commands):
+        command, count = commands[i] & 7, commands[i] >> 3
+        i += 1
+        if command == 7:
+            rings[-1].append(rings[-1][0])
+            continue
+        for _ in range(count):
+            dx, dy = commands[i], commands[i + 1]
+            x += (dx >> 1) ^ -(dx & 1)
+            y += (dy >> 1) ^ -(dy & 1)
+            i += 2
+            if command == 1:
+                rings.append([])
+            rings[-1].append((x, y))
+    return rings
+
+
+# --- tiles of the ZIP codes --------------------------------------------------
+
+def mercator(coords):
+    """lon/lat (n, 2) -> Web Mercator in [0, 1] x [0, 1], y down like the tile grid."""
+    lat = np.radians(np.clip(coords[:, 1], -85.05112878, 85.05112878))
+    return np.column_stack([(coords[:, 0] + 180.0) / 360.0, (1.0 - np.arcsinh(np.tan(lat)) / math.pi) / 2.0])
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+def remove_old_versions(cache_dir, keep):
+    """
+    Delete the tile folders of every version but keep. Only when no process may still
+    serve an older version: at startup, or once the workers of the last generation are gone.
+    """
+    cache_dir = pathlib.Path(cache_dir)
+    if cache_dir.exists():
+        for old_dir in cache_dir.iterdir():
+            if old_dir.is_dir() and old_dir.name != keep:
+                shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class ZipTiles:
+    def __init__(self, topology, df_metrics, version, cache_dir=TILE_CACHE_DIR, max_entries=2048,
+                 extent=EXTENT, buffer=BUFFER):
+        """
+        topology: map.topology.Topology of the ZIP boundaries
+        df_metrics: final_living_score.csv, its columns become feature attributes
+        version: data version of the tiles, part of every cache key and the disk folder
+        cache_dir: tiles on disk, None to keep them in memory only
+        """
+        self.topology = topology
+        self.version = version
+        self.extent = extent
+        self.buffer = buffer
+        self.max_entries = max_entries
+        self.cache_dir = pathlib.Path(cache_dir) / version if cache_dir is not None else None
+        zipcodes = zip_key(df_metrics["zipcode"]).tolist()
+        columns = [column for column in df_metrics.columns if column != "zipcode"]
+        rows = zip(zipcodes, *(df_metrics[column].tolist() for column in columns))
+        scores = {zipcode: dict(zip(columns, row)) for zipcode, *row in rows}
+        self.properties = []
+        for properties in topology.properties:
+            zipcode = str(properties["zip"])
+            self.properties.append(dict(scores.get(zipcode, {}), zip=zipcode))
+        self._projected = {}
+        self._tiles = OrderedDict()
+        self._pending = {}  # key -> Future of a tile being read or built
+        self._lock = threading.RLock()
+
+    def _level(self, level):
+        # (polygons in Web Mercator, STRtree over them) of a simplification level
+        # tiles are built concurrently: two threads may project a level, the first one is kept
+        if level not in self._projected:
+            shapes = np.array(self.topology.shapes(level), dtype=object)
+            projected = shapely.transform(shapes, mercator)
+            self._projected.setdefault(level, (projected, shapely.STRtree(projected)))
+        return self._projected[level]
+
+    def build(self, z, x, y):
+        """MVT bytes of a tile, empty bytes when no ZIP code reaches it."""
+        projected, tree = self._level(level_for_zoom(z))
+        n = 2 ** z
+        margin = self.buffer / self.extent / n
+        box = shapely.box(x / n - margin, y / n - margin, (x + 1) / n + margin, (y + 1) / n + margin)
+        rows = np.sort(tree.query(box, predicate="intersects"))
+        if len(rows) == 0:
+            return b""
+        offset = np.array([x, y], dtype=float)
+        to_grid = lambda coords: (coords * n - offset) * self.extent
+        local = shapely.transform(projected[rows], to_grid)
+        low, high = -self.buffer, self.extent + self.buffer
+        clipped = shapely.clip_by_rect(local, low, low, high, high)
+        snapped = shapely.set_precision(clipped, 1.0)
+        features = []
+        for row, shape in zip(rows, snapped):
+            polygons = [part for part in shapely.get_parts(shape)
+                        if part.geom_type == "Polygon" and not part.is_empty]
+            rings = [[np.asarray(polygon.exterior.coords, dtype=np.int64)] +
+                     [np.asarray(hole.coords, dtype=np.int64) for hole in polygon.interiors]
+                     for polygon in polygons]
+            features.append((int(row) + 1, self.properties[row], polygon_commands(rings)))
+        return encode_layer(LAYER_NAME, features, self.extent)
+
+    def _path(self, z, x, y):
+        return self.cache_dir / str(z) / str(x) / f"{y}.mvt"
+
+    def _load(self, z, x, y):
+        # tile bytes from disk, or built and written to disk
+        path = self._path(z, x, y) if self.cache_dir is not None else None
+        if path is not None and path.exists():
+            return path.read_bytes()
+        data = self.build(z, x, y)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # other threads of this process may write the same tile, so the name has both ids
+            temp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+            temp.write_bytes(data)
+            os.replace(temp, path)
+        return data
+
+    def _claim(self, key):
+        # With the lock held: (future of the tile, whether this thread has to load it)
+        future = self._pending.get(key)
+        if future is not None:
+            return future, False
+        future = self._pending[key] = Future()
+        return future, True
+
+    def _fulfil(self, key, future):
+        # Load the tile without the lock, so a slow build does not hold up other tiles,
+        # then keep it in memory under the lock and hand it to the waiting threads
+        try:
+            data = self._load(*key)
+        except BaseException as error:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(error)
+            raise
+        with self._lock:
+            del self._pending[key]
+            self._tiles[key] = data
+            if len(self._tiles) > self.max_entries:
+                self._tiles.popitem(last=False)
+        future.set_result(data)
+        return data
+
+    def tile(self, z, x, y):
+        """Tile bytes from memory, then disk, then built."""
+        key = (z, x, y)
+        with self._lock:
+            data = self._tiles.get(key)
+            if data is not None:
+                self._tiles.move_to_end(key)
+                return data
+            future, owner = self._claim(key)
+        if not owner:
+            return future.result()
+        return self._fulfil(key, future)
+
+    def __len__(self):
+        return len(self._tiles)
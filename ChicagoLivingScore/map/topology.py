@@ -0,0 +1,241 @@
+import json
+import time
+import numpy as np
+import shapely
+
+
+# This file prepares the ZIP boundaries for the map payloads, TopoJSON style:
+# coordinates are quantized to an integer grid, the rings are cut into arcs at
+# the points where the neighbouring ZIP codes change, and every arc is stored
+# once, so a border shared by two ZIP codes is written once and drawn twice.
+#
+# Simplification levels simplify the arcs, not the polygons. Both sides of a
+# border use the same simplified arc, so there are no gaps or overlaps (seams)
+# between ZIP codes at any level. The map picks the level whose tolerance is
+# below half a pixel at its zoom, see level_for_zoom.
+#
+# Payload sizes of the cached ZIP boundaries (from the ChicagoLivingScore directory):
+#   python -m map.topology
+
+
+# Level -> Douglas-Peucker tolerance in degrees, 0 keeps every quantized point
+LEVELS = {"low": 0.001, "medium": 0.0003, "high": 0.0001, "full": 0.0}
+QUANTIZATION = 100_000  # grid steps along each axis of the bounding box
+PRECISION = 6  # decimals of the GeoJSON coordinates
+OBJECT_NAME = "zips"
+
+
+def pixel_size(zoom, tile_size=256):
+    """Width of a screen pixel in degrees of longitude at a web map zoom."""
+    return 360.0 / (tile_size * 2 ** zoom)
+
+
+def level_for_zoom(zoom, levels=LEVELS):
+    """The coarsest level whose tolerance is at most half a pixel at this zoom."""
+    fitting = [(tolerance, name) for name, tolerance in levels.items() if tolerance <= pixel_size(zoom) / 2]
+    if not fitting:
+        return min(levels, key=levels.get)
+    return max(fitting)[1]
+
+
+def _polygon_rings(geometry):
+    # [[exterior, *interiors] of every polygon], as (n, 2) coordinate arrays
+    polygons = geometry.geoms if geometry.geom_type == "MultiPolygon" else [geometry]
+    return [[np.asarray(polygon.exterior.coords)[:, :2]] + [np.asarray(ring.coords)[:, :2] for ring in polygon.interiors]
+            for polygon in polygons if not polygon.is_empty]
+
+
+def _open_ring(points):
+    # Quantized ring without repeated points and without the closing point
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = (points[1:] != points[:-1]).any(axis=1)
+    points = points[keep]
+    if len(points) > 1 and (points[0] == points[-1]).all():
+        points = points[:-1]
+    return points
+
+
+def _junctions(rings, quantization):
+    """
+    Keys (x * quantization + y) of the points where rings meet or part: a point
+    is a junction when it is seen with more than one pair of neighbours.
+    """
+    keys, low, high = [], [], []
+    for ring in rings:
+        key = ring[:, 0] * quantization + ring[:, 1]
+        before, after = np.roll(key, 1), np.roll(key, -1)
+        keys.append(key)
+        low.append(np.minimum(before, after))
+        high.append(np.maximum(before, after))
+    if not keys:
+        return np.empty(0, dtype=np.int64)
+    visits = np.unique(np.column_stack([np.concatenate(keys), np.concatenate(low), np.concatenate(high)]), axis=0)
+    points, counts = np.unique(visits[:, 0], return_counts=True)
+    return points[counts > 1]
+
+
+class Topology:
+    def __init__(self, arcs, geometries, properties, translate, scale):
+        """
+        arcs: list of (n, 2) int arrays, quantized coordinates
+        geometries: per feature, a list of polygons, each a list of rings, each a list of
+                    arc references (i for arcs[i], ~i for arcs[i] reversed)
+        properties: per feature, a dict
+        translate, scale: coordinate = translate + quantized * scale
+        """
+        self.arcs = arcs
+        self.geometries = geometries
+        self.properties = properties
+        self.translate = np.asarray(translate, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self._levels = {}
+
+    @classmethod
+    def from_frame(cls, gdf, properties=("zip",), quantization=QUANTIZATION):
+        """Build the topology of the polygons of a GeoDataFrame, keeping the given columns."""
+        x0, y0, x1, y1 = gdf.total_bounds
+        scale = np.array([max(x1 - x0, 1e-12), max(y1 - y0, 1e-12)]) / (quantization - 1)
+        translate = np.array([x0, y0])
+
+        shapes = []
+        for geometry in gdf.geometry:
+            polygons = [] if geometry is None or geometry.is_empty else _polygon_rings(geometry)
+            shapes.append([[_open_ring(np.rint((ring - translate) / scale).astype(np.int64)) for ring in polygon]
+                           for polygon in polygons])
+        all_rings = [ring for polygons in shapes for polygon in polygons for ring in polygon if len(ring) >= 3]
+        junctions = _junctions(all_rings, quantization)
+
+        arcs, index = [], {}
+
+        def reference(points):
+            # Index of the arc, ~index when it is stored the other way round
+            forward = tuple((points[:, 0] * quantization + points[:, 1]).tolist())
+            backward = forward[::-1]
+            canonical = min(forward, backward)
+            if canonical not in index:
+                index[canonical] = len(arcs)
+                arcs.append(points if canonical == forward else points[::-1])
+            return index[canonical] if canonical == forward else ~index[canonical]
+
+        geometries = []
+        for polygons in shapes:
+            geometry = []
+            for polygon in polygons:
+                rings = []
+                for ring in polygon:
+                    if len(ring) < 3:
+                        continue
+                    key = ring[:, 0] * quantization + ring[:, 1]
+                    cuts = np.flatnonzero(np.isin(key, junctions))
+                    if len(cuts) == 0:
+                        # a ring that touches no other ring: one closed arc starting at its
+                        # smallest point, so the same ring in two features is stored once
+                        start = int(np.argmin(key))
+                        ring = np.roll(ring, -start, axis=0)
+                        rings.append([reference(np.vstack([ring, ring[:1]]))])
+                        continue
+                    ring = np.roll(ring, -cuts[0], axis=0)
+                    cuts = np.append(cuts - cuts[0], len(ring))
+                    closed = np.vstack([ring, ring[:1]])
+                    rings.append([reference(closed[start:end + 1]) for start, end in zip(cuts[:-1], cuts[1:])])
+                if rings:
+                    geometry.append(rings)
+            geometries.append(geometry)
+
+        props = [{column: gdf[column].iloc[i] for column in properties} for i in range(len(gdf))]
+        return cls(arcs, geometries, props, translate, scale)
+
+    def level_arcs(self, level, levels=LEVELS):
+        """Arcs simplified for a level, computed once per level."""
+        if level not in self._levels:
+            tolerance = levels[level]
+            if tolerance == 0:
+                self._levels[level] = self.arcs
+            else:
+                self._levels[level] = self._simplify(tolerance / self.scale.min())
+        return self._levels[level]
+
+    def _simplify(self, tolerance):
+        # Douglas-Peucker on every arc at once, the end points of an arc stay in place
+        lines = np.array([shapely.LineString(arc) for arc in self.arcs], dtype=object)
+        simplified = shapely.simplify(lines, tolerance, preserve_topology=False)
+        arcs = [np.rint(shapely.get_coordinates(line)).astype(np.int64) for line in simplified]
+        # a ring that falls below 3 distinct points keeps its arcs unsimplified
+        collapsed = True
+        while collapsed:
+            collapsed = False
+            for polygons in self.geometries:
+                for rings in polygons:
+                    for refs in rings:
+                        if sum(len(arcs[ref if ref >= 0 else ~ref]) - 1 for ref in refs) < 3:
+                            for ref in refs:
+                                i = ref if ref >= 0 else ~ref
+                                if len(arcs[i]) != len(self.arcs[i]):
+                                    arcs[i] = self.arcs[i]
+                                    collapsed = True
+        return arcs
+
+    def _ring(self, arcs, refs):
+        # Quantized closed ring from its arc references
+        parts = []
+        for ref in refs:
+            arc = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+            parts.append(arc if not parts else arc[1:])
+        return np.vstack(parts)
+
+    def to_topojson(self, level="full", object_name=OBJECT_NAME):
+        """TopoJSON dict of a level: delta-encoded quantized arcs, referenced by every ZIP code."""
+        arcs = self.level_arcs(level)
+        encoded = [np.vstack([arc[:1], np.diff(arc, axis=0)]).tolist() for arc in arcs]
+        geometries = []
+        for polygons, properties in zip(self.geometries, self.properties):
+            if len(polygons) == 1:
+                geometry = {"type": "Polygon", "arcs": polygons[0]}
+            else:
+                geometry = {"type": "MultiPolygon", "arcs": polygons}
+            geometries.append(dict(geometry, properties=properties))
+        return {
+            "type": "Topology",
+            "transform": {"scale": self.scale.tolist(), "translate": self.translate.tolist()},
+            "objects": {object_name: {"type": "GeometryCollection", "geometries": geometries}},
+            "arcs": encoded,
+        }
+
+    def to_geojson(self, level="full", precision=PRECISION):
+        """GeoJSON FeatureCollection dict of a level, coordinates rounded to precision decimals."""
+        arcs = self.level_arcs(level)
+        features = []
+        for polygons, properties in zip(self.geometries, self.properties):
+            coordinates = [[np.round(self.translate + self._ring(arcs, refs) * self.scale, precision).tolist()
+                            for refs in rings] for rings in polygons]
+            if len(coordinates) == 1:
+                geometry = {"type": "Polygon", "coordinates": coordinates[0]}
+            else:
+                geometry = {"type": "MultiPolygon", "coordinates": coordinates}
+            features.append({"type": "Feature", "properties": properties, "geometry": geometry})
+        return {"type": "FeatureCollection", "features": features}
+
+    def shapes(self, level="full"):
+        """Shapely polygons of a level, in feature order (for checks and tests)."""
+        geojson = self.to_geojson(level, precision=12)
+        return [shapely.geometry.shape(feature["geometry"]) for feature in geojson["features"]]
+
+
+def dumps(payload):
+    return json.dumps(payload, separators=(",", ":"))
+
+
+if __name__ == "__main__":
+    from map.mapbuild import load_chicago_zip_geo
+
+    entry = load_chicago_zip_geo()
+    start = time.perf_counter()
+    topology = Topology.from_frame(entry["gdf"])
+    print(f"{len(entry['gdf'])} ZIP codes, {len(topology.arcs)} arcs in {time.perf_counter() - start:.2f} s")
+    print(f"full precision GeoJSON: {len(entry['geojson']) / 1e3:.1f} kB")
+    for level in LEVELS:
+        points = sum(len(arc) for arc in topology.level_arcs(level))
+        print(f"{level}: {points} points, TopoJSON {len(dumps(topology.to_topojson(level))) / 1e3:.1f} kB, "
+              f"GeoJSON {len(dumps(topology.to_geojson(level))) / 1e3:.1f} kB")
+    for zoom in range(9, 17):
+        print(f"zoom {zoom}: {level_for_zoom(zoom)}")
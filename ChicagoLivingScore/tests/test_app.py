@@ -0,0 +1,129 @@
+import gzip
+import re
+import subprocess
+import sys
+
+import pytest
+from website.app import app
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+def test_api_zip(client):
+    resp = client.get("/api/zip/60601")
+    assert resp.status_code == 200
+    assert resp.json["zipcode"] == "60601"
+    assert "final_score" in resp.json
+    assert resp.headers["ETag"]
+    assert "max-age" in resp.headers["Cache-Control"]
+    assert client.get("/api/zip/99999").status_code == 404
+    # leading zeros are ignored, as int(zipcode) did
+    assert client.get("/api/zip/060601").json["zipcode"] == "60601"
+
+def test_api_indicator_not_modified(client):
+    resp = client.get("/api/indicator/crime")
+    assert resp.status_code == 200
+    assert resp.json["column"] == "crime_score"
+    assert "60601" in resp.json["values"]
+
+    etag = resp.headers["ETag"]
+    resp = client.get("/api/indicator/crime", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.data == b""
+
+def test_api_geometry(client):
+    resp = client.get("/api/geometry")
+    assert resp.status_code == 200
+    assert resp.json["type"] == "FeatureCollection"
+    assert all("zip" in feature["properties"] for feature in resp.json["features"])
+
+    # one cached payload per simplification level
+    low = client.get("/api/geometry?zoom=8")
+    assert low.headers["ETag"] != resp.headers["ETag"]
+    assert client.get("/api/geometry?level=low").headers["ETag"] == low.headers["ETag"]
+    assert len(low.json["features"]) == len(resp.json["features"])
+    assert client.get("/api/geometry?level=tiny").status_code == 400
+
+def test_api_topology(client):
+    resp = client.get("/api/topology?zoom=13")
+    assert resp.status_code == 200
+    assert resp.json["type"] == "Topology"
+    geometries = resp.json["objects"]["zips"]["geometries"]
+    assert len(geometries) == len(client.get("/api/geometry").json["features"])
+
+def test_api_score(client):
+    default = client.get("/api/score")
+    assert default.status_code == 200
+    assert default.json["scores"]["60601"] == pytest.approx(
+        client.get("/api/zip/60601").json["final_score"], abs=0.005)
+    assert len(default.json["ranking"]) == len(default.json["scores"])
+
+    # only crime counts: the ranking follows the crime score
+    resp = client.get("/api/score?weights=crime_score:1")
+    crime = client.get("/api/indicator/crime").json["values"]
+    assert resp.json["weights"]["crime_score"] == 1.0
+    assert resp.json["scores"] == pytest.approx(crime)
+    scores = [crime[z] for z in resp.json["ranking"]]
+    assert scores == sorted(scores, reverse=True)
+
+    same = client.get("/api/score?weights=0,0,0,0,0,2,0", headers={"If-None-Match": resp.headers["ETag"]})
+    assert same.status_code == 304
+    # weights equal to 6 digits are still other weights
+    half = client.get("/api/score?weights=crime_score:1,education_score:1")
+    close = client.get("/api/score?weights=crime_score:1.0000001,education_score:1",
+                       headers={"If-None-Match": half.headers["ETag"]})
+    assert close.status_code == 200
+    assert close.json["weights"]["crime_score"] > half.json["weights"]["crime_score"]
+
+    for bad in ["1,2", "crime_score:-1", "rent:1", "a,b,c,d,e,f,g", "0,0,0,0,0,0,0"]:
+        assert client.get(f"/api/score?weights={bad}").status_code == 400
+
+def test_vector_tiles(client):
+    tilejson = client.get("/tiles/zips.json")
+    assert tilejson.status_code == 200
+    template = tilejson.json["tiles"][0]
+    path = template.split("://", 1)[1].split("/", 1)[1]
+    # the tile around the Loop at zoom 11
+    url = "/" + path.format(z=11, x=525, y=761)
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/vnd.mapbox-vector-tile"
+    assert "immutable" in resp.headers["Cache-Control"]
+    assert client.get(url, headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+
+    old = client.get("/tiles/old/11/525/761.mvt")
+    assert old.status_code == 302
+    assert old.headers["Location"].endswith(url)
+    assert client.get("/" + path.format(z=11, x=5000, y=761)).status_code == 404
+
+def test_explore_sources(client):
+    assert b"VectorGrid" not in client.get("/explore").data
+    assert b"VectorGrid" in client.get("/explore?source=tiles").data
+
+
+def test_import_is_light():
+    # the heavy libraries and the data are loaded by warm_up() or the first request, not at import
+    code = ("import sys, website.app; "
+            "print(' '.join(m for m in ('folium', 'geopandas', 'shapely', 'altair', 'pandas') if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+
+def test_analysis_charts(client):
+    page = client.post("/analysis", data={"query": "Top 5"}, headers={"Accept-Encoding": "gzip"})
+    assert page.status_code == 200 and page.headers["Content-Encoding"] == "gzip"
+    html = gzip.decompress(page.data).decode()
+    chart_url = re.search(r'vegaEmbed\("#chart", "([^"]+)"\)', html).group(1)
+
+    spec = client.get(chart_url).get_json()
+    # the rows are not inlined, the spec points at the shared dataset
+    assert "datasets" not in spec and spec["data"]["url"].startswith("/analysis/data.json")
+    rows = client.get(spec["data"]["url"]).get_json()
+    assert rows and {"zipcode", "final_score"} <= set(rows[0])
+
+    again = client.get(chart_url, headers={"If-None-Match": client.get(chart_url).headers["ETag"]})
+    assert again.status_code == 304
+    assert client.get("/analysis/chart/nope.json").status_code == 404
+    assert b"not implemented" in client.post("/analysis", data={"query": "school"}).data
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.datastore import DataStore, zip_key
+
+
+def test_zip_key():
+    assert zip_key([60601.0, np.nan]).tolist() == ["60601", pd.NA]
+    assert zip_key(["60601.0", " 60602", "60603"]).tolist() == ["60601", "60602", "60603"]
+    assert zip_key(pd.Series([60601, 60602])).dtype == "string"
+
+
+@pytest.fixture(params=[True, False], ids=["arrow", "pickle"])
+def store(request):
+    if request.param:
+        pytest.importorskip("pyarrow")
+    return DataStore(use_arrow=request.param)
+
+
+def test_write_and_read(store, tmp_path):
+    csv_path = tmp_path / "scores.csv"
+    df = pd.DataFrame({"zipcode": [60601.0, 60602.0], "score": [0.5, np.nan]})
+    store.write(df, csv_path)
+
+    read = store.read(csv_path)
+    assert read["zipcode"].dtype == "string"
+    assert read["zipcode"].tolist() == ["60601", "60602"]
+    assert pd.read_csv(csv_path)["zipcode"].tolist() == [60601, 60602]
+    assert store.read(csv_path, columns=["score"]).columns.tolist() == ["score"]
+
+
+def test_changed_csv_is_read_again(store, tmp_path):
+    csv_path = tmp_path / "scores.csv"
+    store.write(pd.DataFrame({"zipcode": [60601], "score": [0.5]}), csv_path)
+
+    # an edit that moves the mtime back, like a checkout of an older file
+    pd.DataFrame({"zipcode": ["60601.0"], "score": [0.25]}).to_csv(csv_path, index=False)
+    os.utime(csv_path, ns=(0, 0))
+    read = store.read(csv_path)
+    assert read["score"].tolist() == [0.25]
+    assert read["zipcode"].tolist() == ["60601"]
+
+
+def test_write_without_csv(store, tmp_path):
+    csv_path = tmp_path / "scores.csv"
+    store.write(pd.DataFrame({"zipcode": [60601], "score": [0.5]}), csv_path)
+    store.write(pd.DataFrame({"zipcode": [60601], "score": [0.75]}), csv_path, csv=False)
+    assert store.read(csv_path)["score"].tolist() == [0.75]
+
+    store.export_csv(csv_path)
+    assert pd.read_csv(csv_path)["score"].tolist() == [0.75]
+    assert store.read(csv_path)["score"].tolist() == [0.75]
+
+
+def test_arrow_table_columns(tmp_path):
+    pytest.importorskip("pyarrow")
+    csv_path = tmp_path / "scores.csv"
+    pd.DataFrame({"zipcode": [60601, 60602], "score": [0.5, 0.25]}).to_csv(csv_path, index=False)
+    table = DataStore(use_arrow=True).table(csv_path)
+    assert table.column("zipcode").to_pylist() == ["60601", "60602"]
+    np.testing.assert_array_equal(table.column("score").to_numpy(), [0.5, 0.25])
@@ -2,7 +2,7 @@ import pytest
 import pandas as pd
 from pathlib import Path
 import numpy as np
-from analysis.education_data_analysis import load_data, standardize_column 
+from analysis.education_data_analysis import load_data, standardize_column, backfill_nearest_zip
 
 def test_load_data(tmp_path):
     """Test that load_data correctly loads and cleans a CSV file."""
@@ -33,5 +33,14 @@ def test_standardize_column():
     standardized_single = standardize_column(single_value_series)
     assert all(standardized_single == 1), "Standardization failed when all values are equal"
 
+def test_backfill_nearest_zip():
+    zip_results = pd.DataFrame({"zip_code": ["60610", "60601", "60620"], "score": [1.0, 0.0, 2.0]})
+    all_zips = [60601, 60603, 60605, 60610, 60615, 60618, 60620, 60640]
+    filled = backfill_nearest_zip(zip_results, all_zips)
+
+    assert filled["zip_code"].tolist() == all_zips
+    # 60605 is 4 away from 60601 and 5 from 60610, 60615 ties between 60610 and 60620 and takes the lower
+    assert filled["score"].tolist() == [0.0, 0.0, 0.0, 1.0, 1.0, 2.0, 2.0, 2.0]
+
 if __name__ == "__main__":
     pytest.main()
\ No newline at end of file
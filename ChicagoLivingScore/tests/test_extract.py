@@ -0,0 +1,33 @@
+import json
+import pathlib
+
+from zillow_scraper import extract
+
+SAVED_PROPERTY = pathlib.Path(__file__).parent.parent / "zillow_scraper" / "results_hamza" / "property.json"
+
+
+def test_property_data_matches_beautifulsoup():
+    html = extract.page_from_property(json.loads(SAVED_PROPERTY.read_text()), filler=50)
+    assert extract.property_data(html) == extract.soup_property_data(html)
+
+
+def test_next_data_text_variants():
+    data = {"props": {"pageProps": {"searchPageState": {"queryState": {"usersSearchTerm": "Chicago IL"}}}}}
+    for tag in ['<script id="__NEXT_DATA__" type="application/json">',
+                "<script type='application/json' id='__NEXT_DATA__'>",
+                "<SCRIPT id=__NEXT_DATA__>"]:
+        # the marker also appears earlier in the page outside the script
+        html = f"<html><p>__NEXT_DATA__</p><script>var a = 1;</script>{tag}{json.dumps(data)}</script></html>"
+        assert extract.search_query_state(html) == {"usersSearchTerm": "Chicago IL"}
+
+
+def test_missing_next_data():
+    assert extract.next_data("<html><script>var a = 1;</script></html>") is None
+    assert extract.property_data('<html><script id="__NEXT_DATA__">{"a": 1}') is None
+
+
+def test_data_id_is_not_the_id():
+    data = {"props": {"pageProps": {"searchPageState": {"queryState": {"usersSearchTerm": "Chicago IL"}}}}}
+    decoy = '<script data-id="__NEXT_DATA__" type="application/json">{"decoy": true}</script>'
+    html = f'<html>{decoy}<script id="__NEXT_DATA__" type="application/json">{json.dumps(data)}</script></html>'
+    assert extract.search_query_state(html) == {"usersSearchTerm": "Chicago IL"}
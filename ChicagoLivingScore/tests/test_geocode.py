@@ -0,0 +1,63 @@
+import pytest
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shapely.geometry import Point, box
+from analysis.geocode import read_points, coerce_points, assign_zip_codes, zip_points, count_by_zip, stream_count_by_zip
+
+
+@pytest.fixture
+def gdf_zip():
+    # two small zip areas around the Loop
+    return gpd.GeoDataFrame(
+        {"ZCTA5CE20": ["60601", "60602"]},
+        geometry=[box(-87.64, 41.87, -87.625, 41.885), box(-87.625, 41.87, -87.61, 41.885)],
+        crs="EPSG:4326",
+    )
+
+def test_read_points_filters(tmp_path):
+    csv_path = tmp_path / "crimes.csv"
+    csv_path.write_text(
+        "ID,Latitude,Longitude,Arrest,Domestic\n"
+        "1,41.8781,-87.6298,True,False\n"
+        "2,41.881832,-87.623177,true,FALSE\n"
+        "3,,,True,False\n"
+        "4,41.9000,-87.7000,False,False\n"
+        "5,41.9000,-87.7000,True,True\n"
+    )
+    gdf = read_points(csv_path, filters={"Arrest": True, "Domestic": False})
+    assert gdf["lat"].tolist() == [41.8781, 41.881832]
+    assert gdf.geometry.iloc[0] == Point(-87.6298, 41.8781)
+
+    chunks = list(read_points(csv_path, filters={"Arrest": True, "Domestic": False}, chunksize=2))
+    assert sum(len(chunk) for chunk in chunks) == 2
+
+def test_assign_zip_codes(gdf_zip):
+    gdf_points = coerce_points([Point(-87.6298, 41.8781), (41.881832, -87.623177), "POINT (-87.7 41.9)"])
+    zip_codes = assign_zip_codes(gdf_points, gdf_zip)
+    assert zip_codes.iloc[:2].tolist() == ["60601", "60602"]
+    assert pd.isnull(zip_codes.iloc[2])
+
+    # a prebuilt index gives the same answer as sjoin
+    tree = shapely.STRtree(gdf_zip.geometry.values)
+    joined = gpd.sjoin(gdf_points, gdf_zip, how="left", predicate="within")
+    assert assign_zip_codes(gdf_points, gdf_zip, sindex=tree).tolist()[:2] == joined["ZCTA5CE20"].tolist()[:2]
+
+def test_count_by_zip(gdf_zip):
+    gdf_points = coerce_points([(41.878, -87.63), (41.879, -87.63), (41.88, -87.62), (41.9, -87.7)])
+    df = zip_points(gdf_points, gdf_zip)
+    counts = count_by_zip(df["ZCTA5CE20"], [60601.0, 60602.0])
+    assert counts.to_dict("list") == {"zipcode": ["60601", "60602"], "count": [2, 1]}
+
+def test_stream_count_by_zip_matches_in_memory(tmp_path, gdf_zip):
+    csv_path = tmp_path / "crimes.csv"
+    rows = ["Latitude,Longitude,Arrest,Domestic"]
+    for i in range(50):
+        rows.append(f"{41.871 + (i % 13) * 0.001},{-87.639 + (i % 7) * 0.004},{i % 3 != 0},{i % 5 == 0}")
+    csv_path.write_text("\n".join(rows))
+    filters = {"Arrest": True, "Domestic": False}
+
+    gdf_points = read_points(csv_path, filters=filters)
+    expected = count_by_zip(assign_zip_codes(gdf_points, gdf_zip), ["60601", "60602"])
+    streamed = stream_count_by_zip(csv_path, gdf_zip, ["60601", "60602"], filters=filters, chunksize=7)
+    assert streamed.to_csv(index=False) == expected.to_csv(index=False)
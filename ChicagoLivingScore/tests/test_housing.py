@@ -0,0 +1,101 @@
+import io
+import json
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.housing_data_analysis import (
+    HousingDataProcessor, average_by_zip, iter_json_array, oversample_indices, read_listings,
+)
+
+SEARCH_DUMP = pathlib.Path(__file__).parent.parent / "zillow_scraper" / "results_hamza" / "search.json"
+
+
+def test_iter_json_array_small_chunks():
+    listings = json.loads(SEARCH_DUMP.read_text())
+    text = json.dumps(listings, indent=2)
+    for chunk_size in (5, 64, 1 << 16):
+        assert list(iter_json_array(io.StringIO(text), chunk_size)) == listings
+    # numbers cut between two chunks
+    assert list(iter_json_array(io.StringIO("[1, 22, 3.5, {\"a\": 1}]"), 1)) == [1, 22, 3.5, {"a": 1}]
+    assert list(iter_json_array(io.StringIO(" [ ] "), 1)) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO("[1, 2"), 1))
+
+
+def test_convert_json_to_csv_batches(tmp_path):
+    processor = HousingDataProcessor()
+    rows = processor.convert_json_to_columnar(SEARCH_DUMP, tmp_path / "listings.csv", batch_size=10)
+    df = read_listings(tmp_path / "listings.csv")
+
+    assert rows == len(df) == 41
+    assert df["zipcode"].dtype == "string"
+    assert df["price"].dtype == "float64"
+    pd.testing.assert_frame_equal(df, processor.convert_json_to_csv(SEARCH_DUMP, tmp_path / "all.csv"))
+
+
+def test_convert_jsonl_to_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    listings = json.loads(SEARCH_DUMP.read_text())
+    jsonl = tmp_path / "search.jsonl"
+    jsonl.write_text("\n".join(json.dumps(listing) for listing in listings) + "\n")
+
+    processor = HousingDataProcessor()
+    processor.convert_json_to_columnar(jsonl, tmp_path / "listings.parquet", batch_size=7)
+    processor.convert_json_to_columnar(SEARCH_DUMP, tmp_path / "listings.csv")
+    df = read_listings(tmp_path / "listings.parquet")
+
+    assert df[["latitude", "longitude", "livingArea"]].dtypes.eq("float64").all()
+    pd.testing.assert_frame_equal(df, read_listings(tmp_path / "listings.csv"))
+    # the processing stage reads either file and gets the same scores
+    pd.testing.assert_frame_equal(
+        processor.process_housing_data(tmp_path / "listings.parquet", tmp_path / "from_parquet.csv"),
+        processor.process_housing_data(tmp_path / "listings.csv", tmp_path / "from_csv.csv"),
+    )
+
+
+def loop_oversample(df, min_count=50):
+    # The per zip code loop the processor used before
+    parts = []
+    for zc, count in df['zipcode'].value_counts().items():
+        df_zc = df[df['zipcode'] == zc]
+        parts.append(df_zc.sample(n=min_count, replace=True, random_state=42) if count < min_count else df_zc)
+    return pd.concat(parts)
+
+
+@pytest.fixture
+def listings():
+    rng = np.random.default_rng(0)
+    zipcodes = rng.choice([f"606{i:02d}" for i in range(40)], size=900, p=np.linspace(1, 20, 40) / 420)
+    df = pd.DataFrame({
+        "zipcode": zipcodes,
+        "price": rng.uniform(1e5, 1e6, size=900),
+        "livingArea": rng.uniform(500, 3000, size=900),
+    })
+    df.loc[::97, "zipcode"] = None
+    return df
+
+
+def test_oversample_indices_match_loop(listings):
+    positions, groups, zipcodes = oversample_indices(listings["zipcode"])
+    expected = loop_oversample(listings)
+
+    assert listings.index[positions].tolist() == expected.index.tolist()
+    assert zipcodes[groups].tolist() == expected["zipcode"].tolist()
+
+
+def test_average_by_zip_modes(listings):
+    df = average_by_zip(listings)
+    expected = loop_oversample(listings)
+    expected = (expected["price"] / expected["livingArea"]).groupby(expected["zipcode"], sort=False).mean()
+    assert df["zipcode"].tolist() == expected.index.tolist()
+    np.testing.assert_array_equal(df["avg_price_per_sqft"], expected.to_numpy())
+
+    # the expected mean is the plain mean per zip code, close to the sampled one
+    analytic = average_by_zip(listings, mode="expected")
+    assert analytic["zipcode"].tolist() == df["zipcode"].tolist()
+    plain = (listings["price"] / listings["livingArea"]).groupby(listings["zipcode"]).mean()
+    np.testing.assert_allclose(analytic["avg_price_per_sqft"], plain[analytic["zipcode"]].to_numpy())
+    assert np.abs(analytic["avg_price_per_sqft"] / df["avg_price_per_sqft"] - 1).max() < 0.5
@@ -5,6 +5,7 @@ import lxml.html
 import folium
 from pathlib import Path
 from map.mapbuild import *
+from map.mapbuild import _zip_geo_cache
 
 
 @pytest.fixture
@@ -31,3 +32,70 @@ def test_show_unemployed_score(sample_dataframe):
     assert "unemployed_score" in sample_dataframe.columns
     assert isinstance(show_unemployed_score(create_map(),sample_dataframe), folium.Map)
 
+
+SAMPLE_ZIP_XML = """<response><row>
+<row><objectid>1</objectid><the_geom>MULTIPOLYGON (((-87.63 41.88, -87.62 41.88, -87.62 41.89, -87.63 41.88)))</the_geom><zip>60601</zip></row>
+<row><objectid>2</objectid><the_geom>MULTIPOLYGON (((-87.64 41.87, -87.63 41.87, -87.63 41.88, -87.64 41.87)))</the_geom><zip>60602.0</zip></row>
+</row></response>"""
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.content = text.encode()
+
+    def raise_for_status(self):
+        pass
+
+def offline(*args, **kwargs):
+    raise httpx.ConnectError("offline")
+
+def test_load_chicago_zip_geo_fetches_once(tmp_path, monkeypatch):
+    calls = []
+    def fake_get(url):
+        calls.append(url)
+        return FakeResponse(SAMPLE_ZIP_XML)
+    monkeypatch.setattr(httpx, "get", fake_get)
+
+    entry = load_chicago_zip_geo(cache_dir=tmp_path)
+    assert entry["gdf"]["zip"].tolist() == ["60601", "60602"]
+    assert json.loads(entry["geojson"])["type"] == "FeatureCollection"
+    assert (tmp_path / "manifest.json").exists()
+
+    # a warm call is served from memory, without network
+    monkeypatch.setattr(httpx, "get", offline)
+    assert load_chicago_zip_geo(cache_dir=tmp_path) is entry
+    assert len(calls) == 1
+
+def test_load_chicago_zip_geo_offline_cold_start(tmp_path, monkeypatch):
+    monkeypatch.setattr(httpx, "get", lambda url: FakeResponse(SAMPLE_ZIP_XML))
+    geojson = load_chicago_zip_geo(cache_dir=tmp_path)["geojson"]
+
+    # a new process only has the local copy, even an expired one is used when offline
+    monkeypatch.setattr(httpx, "get", offline)
+    _zip_geo_cache.clear()
+    entry = load_chicago_zip_geo(ttl=0, cache_dir=tmp_path)
+    assert entry["geojson"] == geojson
+    assert entry["gdf"]["zip"].tolist() == ["60601", "60602"]
+
+def test_load_chicago_zip_geo_without_copy_raises_offline(tmp_path, monkeypatch):
+    monkeypatch.setattr(httpx, "get", offline)
+    with pytest.raises(httpx.HTTPError):
+        load_chicago_zip_geo(cache_dir=tmp_path)
+
+def test_create_map_single_layer():
+    m = create_map(selected_zip="60601")
+    layers = [child for child in m._children.values() if isinstance(child, folium.GeoJson)]
+    assert len(layers) == 1, "all zip codes should be in one GeoJson layer"
+    features = layers[0].data["features"]
+    assert len(features) == len(get_chicago_zip_geo())
+    fills = {f["properties"]["zip"]: layers[0].style_function(f)["fillColor"] for f in features}
+    assert fills["60601"] == "#2196F3"
+    assert set(fills.values()) == {"#2196F3", "#BBDEFB"}
+
+def test_choropleth_uses_topojson(sample_dataframe):
+    m = show_final_score(create_map(), sample_dataframe)
+    choropleth = [child for child in m._children.values() if isinstance(child, folium.Choropleth)][0]
+    assert isinstance(choropleth.geojson, folium.TopoJson)
+    assert choropleth.geojson.data["type"] == "Topology"
+    # a new TopoJSON dict for every map, folium writes the styles into it
+    assert zip_topojson_layer() is not zip_topojson_layer()
@@ -1,7 +1,9 @@
+import numpy as np
 import pandas as pd
 import pytest
 from pathlib import Path
 from analysis.all_data_normalize import DataNormalizer
+from analysis import final_score_analysis
 from analysis.final_score_analysis import FinalScoreCalculator
 
 
@@ -27,6 +29,23 @@ def test_min_max_normalize_invert():
 
 
 
+def test_process_economic_without_raw_data(tmp_path, monkeypatch):
+    # the raw census table is not in the repository, the cleaned file is used as it is
+    from analysis import economic_infrastructure_analysis
+    monkeypatch.setattr(economic_infrastructure_analysis, "RAW_FILE", tmp_path / "missing.csv")
+    calc = DataNormalizer()
+    committed = pd.read_csv(calc.econ_file)
+    calc.econ_file = tmp_path / calc.econ_file.name
+    committed.to_csv(calc.econ_file, index=False)
+
+    calc.process_econmic()
+    calc.process_econmic()
+    # same values, the zip codes are written as 60601 instead of 60601.0
+    pd.testing.assert_frame_equal(pd.read_csv(calc.econ_file), committed, check_dtype=False)
+
+
+
+
 def test_normalize_zip():
     calculator = FinalScoreCalculator()
     assert calculator.normalize_zip(60614) == "60614"
@@ -48,3 +67,54 @@ def test_impute_by_nearest():
     
     assert df_imputed["avg_price_per_sqft"].isnull().sum() == 0, "missing values"
 
+
+
+
+def impute_in_row_order(df, col, k=4):
+    # The loop impute_all_by_nearest replaced: rows are filled in order and
+    # the values imputed so far are used for the following rows
+    df = df.copy()
+    zips = df["zipcode"].astype(int)
+    for row in df.index[df[col].isnull()]:
+        valid = df[df[col].notnull()]
+        nearest = valid.assign(distance=(zips[valid.index] - zips[row]).abs()).nsmallest(k, "distance")
+        df.loc[row, col] = nearest[col].mean()
+    return df
+
+
+def test_impute_all_by_nearest_matches_row_order_loop():
+    rng = np.random.default_rng(1)
+    zipcodes = rng.choice(np.arange(60000, 61000), size=300, replace=False)
+    df = pd.DataFrame({"zipcode": zipcodes.astype(str)})
+    for col in ["a", "b", "c"]:
+        values = rng.uniform(0, 1, size=300)
+        values[rng.uniform(size=300) < 0.3] = np.nan
+        df[col] = values
+    df.loc[:5, "c"] = np.nan
+    # runs of missing ZIP codes next to each other, filled from each other
+    df.loc[np.argsort(zipcodes)[100:110], "a"] = np.nan
+
+    imputed = FinalScoreCalculator().impute_all_by_nearest(df, ["a", "b", "c"])
+
+    for col in ["a", "b", "c"]:
+        assert imputed[col].notnull().all()
+        pd.testing.assert_series_equal(imputed[col], impute_in_row_order(df, col)[col])
+
+
+@pytest.mark.parametrize("kd_tree", [True, False])
+def test_impute_by_centroid_distance(kd_tree, monkeypatch):
+    if not kd_tree:
+        monkeypatch.setattr(final_score_analysis, "cKDTree", None)
+    df = pd.DataFrame({"zipcode": ["60601", "60602", "60603", "60699"], "score": [1.0, np.nan, 3.0, 7.0]})
+    # 60602 is next to 60699 on the map, far from 60601 and 60603
+    centroids = pd.DataFrame({"x": [0.0, 10.0, 20.0, 10.5], "y": [0.0, 5.0, 0.0, 5.0]},
+                             index=pd.Index(["60601", "60602", "60603", "60699"], name="zipcode"))
+
+    by_zip = FinalScoreCalculator().impute_all_by_nearest(df, ["score"], k=1)
+    by_distance = FinalScoreCalculator().impute_all_by_nearest(df, ["score"], k=1, centroids=centroids)
+    assert by_zip.loc[1, "score"] == 1.0
+    assert by_distance.loc[1, "score"] == 7.0
+
+    # a ZIP code without a centroid uses the ZIP code difference
+    by_distance = FinalScoreCalculator().impute_all_by_nearest(df, ["score"], k=1, centroids=centroids.drop("60602"))
+    assert by_distance.loc[1, "score"] == 1.0
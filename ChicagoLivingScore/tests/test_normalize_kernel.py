@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.normalize import fit, normalize_columns, normalize_series, scale, transform
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "zipcode": [f"606{i:02d}" for i in range(30)],
+        "a": rng.uniform(0, 100, 30),
+        "b": rng.normal(50, 10, 30),
+        "c": rng.integers(0, 5, 30).astype(float),
+    })
+    df.loc[3, "b"] = np.nan
+    return df
+
+
+def test_minmax_matches_column_loop(df):
+    columns = ["a", "b", "c"]
+    scaled, stats = normalize_columns(df, columns, invert=["b"])
+    for column in columns:
+        col = df[column]
+        expected = (col - col.min()) / (col.max() - col.min())
+        if column == "b":
+            expected = 1 - expected
+        np.testing.assert_allclose(scaled[column], expected)
+    assert stats.invert.tolist() == [False, True, False]
+    assert scaled["zipcode"].tolist() == df["zipcode"].tolist()
+    assert np.isnan(scaled.loc[3, "b"])
+
+
+def test_robust_and_zscore(df):
+    values = df[["a", "b"]].to_numpy()
+    robust, _ = scale(values, "robust", percentiles=(10, 90))
+    low, high = np.nanpercentile(values, (10, 90), axis=0)
+    np.testing.assert_allclose(robust, np.clip((values - low) / (high - low), 0, 1))
+
+    zscores, _ = scale(values, "zscore", invert=[False, True])
+    expected = (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0)
+    np.testing.assert_allclose(zscores, expected * [1, -1])
+
+    with pytest.raises(ValueError):
+        fit(values, "rank")
+
+
+def test_stats_apply_to_new_data(df):
+    _, stats = normalize_columns(df, ["a", "c"])
+    new = np.array([[df["a"].max(), df["c"].min()], [df["a"].min(), df["c"].max()]])
+    np.testing.assert_allclose(transform(new, stats), [[1, 0], [0, 1]])
+
+
+def test_constant_column():
+    series = pd.Series([3.0, 3.0, np.nan], index=[5, 6, 7], name="x")
+    assert normalize_series(series).tolist()[:2] == [0.0, 0.0]
+    assert normalize_series(series, invert=True).tolist()[:2] == [1.0, 1.0]
+    scaled = normalize_series(series, constant=1.0)
+    assert scaled.index.tolist() == [5, 6, 7] and scaled.name == "x"
+    assert np.isnan(scaled[7])
@@ -0,0 +1,72 @@
+import functools
+import pytest
+from pathlib import Path
+from analysis.pipeline import Pipeline, Stage, STAGES
+
+# Toy stages: a and b read raw files, c combines their outputs.
+# The paths are bound with functools.partial: the stages are pickled to the workers,
+# which do not share module state with the test under the spawn start method.
+
+def run_a(paths):
+    paths["a_out"].write_text(paths["a_raw"].read_text().upper())
+
+def run_b(paths):
+    paths["b_out"].write_text(paths["b_raw"].read_text()[::-1])
+
+def run_c(paths):
+    paths["c_out"].write_text(paths["a_out"].read_text() + paths["b_out"].read_text())
+
+
+@pytest.fixture
+def paths(tmp_path):
+    paths = {name: tmp_path / f"{name}.txt" for name in ["a_raw", "b_raw", "a_out", "b_out", "c_out"]}
+    paths["a_raw"].write_text("abc")
+    paths["b_raw"].write_text("xyz")
+    return paths
+
+@pytest.fixture
+def pipeline(paths, tmp_path):
+    stages = [
+        Stage("a", functools.partial(run_a, paths), (paths["a_raw"],), (paths["a_out"],)),
+        Stage("b", functools.partial(run_b, paths), (paths["b_raw"],), (paths["b_out"],)),
+        Stage("c", functools.partial(run_c, paths), (paths["a_out"], paths["b_out"]), (paths["c_out"],)),
+    ]
+    return Pipeline(stages, state_file=tmp_path / "state.json", base_dir=tmp_path)
+
+def test_waves(pipeline):
+    assert pipeline.waves() == [["a", "b"], ["c"]]
+    assert pipeline.waves(targets=["a"]) == [["a"]]
+
+def test_only_changed_stages_rerun(pipeline, paths):
+    assert pipeline.run(jobs=1) == ["a", "b", "c"]
+    assert paths["c_out"].read_text() == "ABCzyx"
+    assert pipeline.run(jobs=1) == []
+
+    # a new state object reads the recorded fingerprints back from disk
+    paths["b_raw"].write_text("uvw")
+    reloaded = Pipeline(pipeline.stages.values(), state_file=pipeline.state_file, base_dir=pipeline.base_dir)
+    assert reloaded.run(jobs=1) == ["b", "c"]
+    assert paths["c_out"].read_text() == "ABCwvu"
+
+def test_parallel_run(pipeline, paths):
+    assert pipeline.run(jobs=2) == ["a", "b", "c"]
+    assert paths["c_out"].read_text() == "ABCzyx"
+
+def test_missing_input(pipeline, paths):
+    paths["a_raw"].unlink()
+    with pytest.raises(FileNotFoundError):
+        pipeline.run(jobs=1)
+
+def test_repository_stages_form_a_dag():
+    waves = Pipeline(STAGES, state_file=Path("unused.json")).waves()
+    # every stage normalizes its own output in memory, final only waits for them
+    assert waves == [["crime", "environment", "economic", "education", "housing"], ["final"]]
+
+def test_parallel_run_with_spawn(pipeline, paths, monkeypatch):
+    # workers started from scratch, as on macOS and Windows
+    import multiprocessing
+    from analysis import pipeline as pipeline_module
+    monkeypatch.setattr(pipeline_module, "ProcessPoolExecutor", functools.partial(
+        pipeline_module.ProcessPoolExecutor, mp_context=multiprocessing.get_context("spawn")))
+    assert pipeline.run(jobs=2) == ["a", "b", "c"]
+    assert paths["c_out"].read_text() == "ABCzyx"
@@ -0,0 +1,73 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import pandas as pd
+from map.render_cache import MapRenderCache
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    csv_path = tmp_path / "final_living_score.csv"
+    pd.DataFrame({"zipcode": [60601, 60602], "final_score": [0.8, 0.6]}).to_csv(csv_path, index=False)
+    return csv_path
+
+def test_render_cache_reuses_renders(data_file):
+    calls = []
+    def render(df, indicator, selected_zip):
+        calls.append((indicator, selected_zip))
+        return f"<div>{indicator}-{selected_zip}-{len(df)}</div>"
+
+    cache = MapRenderCache(data_file, render)
+    cache.warm([("crime", None), (None, None)])
+    assert cache.get("crime") == "<div>crime-None-2</div>"
+    assert cache.get(selected_zip="60601") == "<div>None-60601-2</div>"
+    assert calls == [("crime", None), (None, None), (None, "60601")]
+
+def test_render_cache_invalidated_by_data_change(data_file):
+    cache = MapRenderCache(data_file, lambda df, indicator, selected_zip: str(df["final_score"].sum()))
+    assert cache.get("final") == "1.4"
+    version = cache.version
+
+    pd.DataFrame({"zipcode": [60601, 60602], "final_score": [0.5, 0.5]}).to_csv(data_file, index=False)
+    os.utime(data_file, ns=(0, 0))
+    assert cache.get("final") == "1.0"
+    assert cache.version != version
+    assert len(cache) == 1
+
+def test_render_cache_is_bounded(data_file):
+    cache = MapRenderCache(data_file, lambda df, indicator, selected_zip: selected_zip, max_entries=2)
+    for zipcode in ["60601", "60602", "60603"]:
+        cache.get(selected_zip=zipcode)
+    assert len(cache) == 2
+
+def test_derived_entry_replaced_by_new_key(data_file):
+    cache = MapRenderCache(data_file, lambda df, indicator, selected_zip: "")
+    first = cache.derive("tiles", lambda df: ["boundaries a"], key="a")
+    assert cache.derive("tiles", lambda df: pytest.fail("built again"), key="a") is first
+    # new boundaries replace the entry instead of adding one next to it
+    assert cache.derive("tiles", lambda df: ["boundaries b"], key="b") == ["boundaries b"]
+    assert len(cache._derived) == 1
+
+def test_slow_render_does_not_block_other_requests(data_file):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    def render(df, indicator, selected_zip):
+        calls.append(indicator)
+        if indicator == "slow":
+            started.set()
+            release.wait(10)
+        return indicator
+
+    cache = MapRenderCache(data_file, render)
+    with ThreadPoolExecutor(3) as pool:
+        first = pool.submit(cache.get, "slow")
+        started.wait(10)
+        second = pool.submit(cache.get, "slow")
+        # other maps and the data are served while "slow" renders
+        assert pool.submit(cache.get, "fast").result(timeout=5) == "fast"
+        assert len(cache.data()) == 2
+        release.set()
+        assert first.result() == second.result() == "slow"
+    # the second request waited for the first render instead of rendering again
+    assert calls == ["slow", "fast"]
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from zillow_scraper import zillow
+from zillow_scraper.scheduler import Scheduler, TokenBucket
+
+
+TOTAL_PAGES = 4
+
+
+class StubZillow(BaseHTTPRequestHandler):
+    """Serves a search page, the paged backend API and property pages."""
+
+    in_flight = 0
+    max_in_flight = 0
+    failures = {}  # path -> number of 503 answers before succeeding
+    broken_pages = set()  # search pages that always answer 500
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, status=200):
+        with StubZillow.lock:
+            StubZillow.in_flight += 1
+            StubZillow.max_in_flight = max(StubZillow.max_in_flight, StubZillow.in_flight)
+        time.sleep(0.05)
+        with StubZillow.lock:
+            StubZillow.in_flight -= 1
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _next_data(self, props):
+        data = json.dumps({"props": {"pageProps": props}})
+        return f'<html><script id="__NEXT_DATA__" type="application/json">{data}</script></html>'
+
+    def do_GET(self):
+        with StubZillow.lock:
+            remaining = StubZillow.failures.get(self.path, 0)
+            StubZillow.failures[self.path] = remaining - 1
+        if remaining > 0:
+            return self._send("busy", status=503)
+        if self.path.startswith("/homedetails/"):
+            zpid = self.path.rstrip("/").split("/")[-1]
+            cache = {f"Property:{zpid}": {"property": {"zpid": zpid}}}
+            return self._send(self._next_data({"componentProps": {"gdpClientCache": json.dumps(cache)}}))
+        query = {"usersSearchTerm": "Chicago IL"}
+        return self._send(self._next_data({"searchPageState": {"queryState": query}}))
+
+    def do_PUT(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        page = payload["searchQueryState"].get("pagination", {}).get("currentPage", 1)
+        if page in StubZillow.broken_pages:
+            return self._send("error", status=500)
+        results = [{"zpid": f"{page}-{i}"} for i in range(3)]
+        body = {"cat1": {"searchResults": {"listResults": results}, "searchList": {"totalPages": TOTAL_PAGES}}}
+        self._send(json.dumps(body))
+
+
+@pytest.fixture
+def stub_fetch():
+    StubZillow.in_flight = StubZillow.max_in_flight = 0
+    StubZillow.failures = {}
+    StubZillow.broken_pages = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubZillow)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    async def fetch(url, method="GET", headers=None, body=None):
+        url = url.replace("https://www.zillow.com", base_url)
+        async with httpx.AsyncClient() as client:
+            response = await client.request(method, url, headers=headers, content=body)
+        response.raise_for_status()
+        return response.text
+
+    yield fetch
+    server.shutdown()
+    server.server_close()
+
+
+def test_token_bucket_spacing():
+    async def acquire_all():
+        bucket = TokenBucket(rate=20.0, capacity=1)
+        start = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # the first token is available at once, the next 4 come every 1/20 s
+    assert asyncio.run(acquire_all()) >= 0.19
+
+
+def test_scrape_search_all_pages(stub_fetch):
+    scheduler = Scheduler(concurrency=2, rate=None, retries=0)
+    results = asyncio.run(zillow.scrape_search("https://www.zillow.com/chicago-il/", scheduler=scheduler,
+                                               fetch=stub_fetch))
+
+    pages = [result["zpid"].split("-")[0] for result in results]
+    assert pages == [str(page) for page in range(1, TOTAL_PAGES + 1) for _ in range(3)]
+    assert StubZillow.max_in_flight <= 2
+
+
+def test_scrape_search_max_pages(stub_fetch):
+    scheduler = Scheduler(concurrency=4, rate=None, retries=0)
+    results = asyncio.run(zillow.scrape_search("https://www.zillow.com/chicago-il/", max_scrape_pages=2,
+                                               scheduler=scheduler, fetch=stub_fetch))
+    assert len(results) == 6
+
+
+def test_scrape_search_skips_failed_page(stub_fetch):
+    StubZillow.broken_pages = {3}
+    scheduler = Scheduler(concurrency=2, rate=None, retries=1, backoff=0.01)
+    results = asyncio.run(zillow.scrape_search("https://www.zillow.com/chicago-il/", scheduler=scheduler,
+                                               fetch=stub_fetch))
+
+    # page 3 fails after its retry, the pages fetched around it are kept
+    pages = [result["zpid"].split("-")[0] for result in results]
+    assert pages == [str(page) for page in (1, 2, 4) for _ in range(3)]
+
+
+def test_scrape_search_without_query_state():
+    # e.g. a captcha page instead of the search results
+    async def fetch(url, **kwargs):
+        assert not kwargs, "no backend request without a query state"
+        return "<html><body>Please verify you are a human</body></html>"
+
+    messages = []
+    sink = zillow.log.add(messages.append, level="ERROR")
+    try:
+        results = asyncio.run(zillow.scrape_search("https://www.zillow.com/chicago-il/",
+                                                   scheduler=Scheduler(rate=None), fetch=fetch))
+    finally:
+        zillow.log.remove(sink)
+    assert results == []
+    assert "https://www.zillow.com/chicago-il/" in messages[0]
+
+
+def test_scrape_properties_concurrent_with_retry(stub_fetch):
+    urls = [f"https://www.zillow.com/homedetails/{zpid}_zpid/" for zpid in range(6)]
+    StubZillow.failures = {"/homedetails/2_zpid/": 1, "/homedetails/4_zpid/": 5}
+    scheduler = Scheduler(concurrency=3, rate=None, retries=2, backoff=0.01)
+
+    results = asyncio.run(zillow.scrape_properties(urls, scheduler=scheduler, fetch=stub_fetch))
+
+    # 2 succeeds on its second attempt, 4 still fails after 2 retries and is skipped
+    assert [result["zpid"] for result in results] == ["0_zpid", "1_zpid", "2_zpid", "3_zpid", "5_zpid"]
+    # requests overlapped, but never more than the concurrency limit
+    assert 1 < StubZillow.max_in_flight <= 3
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis.scoring import (
+    INDICATORS, ScoringEngine, dirichlet_weights, grid_weights, parse_weights, perturbed_weights, rank_descending,
+    score_frame, weight_vector,
+)
+
+
+@pytest.fixture
+def engine():
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame(rng.uniform(size=(30, len(INDICATORS))), columns=INDICATORS)
+    df.insert(0, "zipcode", np.arange(60601, 60631))
+    return ScoringEngine.from_frame(df), df
+
+
+def test_default_weights_match_formula(engine):
+    engine, df = engine
+    expected = (0.17 * df["unemployed_score"] + 0.17 * df["commute_time_score"] + 0.19 * df["avg_income_score"]
+                + 0.03 * df["private_insurance_score"] + 0.15 * df["education_score"] + 0.17 * df["crime_score"]
+                + 0.12 * df["environment_score"])
+    np.testing.assert_allclose(engine.scores(), expected)
+
+
+def test_weights_are_scaled(engine):
+    engine, df = engine
+    np.testing.assert_allclose(engine.scores({"crime_score": 3}), df["crime_score"])
+    np.testing.assert_allclose(engine.scores([1] * len(INDICATORS)), df[INDICATORS].mean(axis=1))
+    np.testing.assert_allclose(parse_weights("crime_score:1, education_score:3")[[4, 5]], [0.75, 0.25])
+    with pytest.raises(ValueError):
+        weight_vector([1, 2])
+    with pytest.raises(ValueError):
+        parse_weights("crime_score:nan")
+
+
+def test_rank_descending_ties_and_nan():
+    ranks = rank_descending(np.array([[0.5, 0.9, np.nan, 0.5, 0.1], [1.0, 1.0, 1.0, 0.0, 2.0]]))
+    assert ranks.tolist() == [[2, 1, 5, 2, 4], [2, 2, 2, 5, 1]]
+
+
+def test_score_frame(engine):
+    engine, df = engine
+    ranked = score_frame(engine, {"education_score": 1})
+    assert ranked["zipcode"].iloc[0] == str(df.loc[df["education_score"].idxmax(), "zipcode"])
+    assert ranked["rank"].tolist() == list(range(1, 31))
+
+
+def test_scenario_generators():
+    grid = grid_weights(4)
+    assert grid.shape == (210, len(INDICATORS))  # C(4 + 6, 6)
+    np.testing.assert_allclose(grid.sum(axis=1), 1)
+    assert len({tuple(row) for row in grid}) == len(grid)
+    assert perturbed_weights(0.1).shape == (2 * len(INDICATORS), len(INDICATORS))
+    np.testing.assert_array_equal(dirichlet_weights(5, seed=1), dirichlet_weights(5, seed=1))
+
+
+def test_rank_stability_matches_loop(engine):
+    engine, df = engine
+    weights = dirichlet_weights(200, concentration=20)
+    ranks = np.array([engine.ranking(w)[1] for w in weights])
+
+    report = engine.rank_stability(weights, top=5, chunk_size=64).set_index("zipcode")
+    expected = pd.DataFrame({
+        "mean_rank": ranks.mean(axis=0),
+        "rank_var": ranks.var(axis=0),
+        "min_rank": ranks.min(axis=0),
+        "max_rank": ranks.max(axis=0),
+        "p_top": (ranks <= 5).mean(axis=0),
+    }, index=engine.zipcodes).loc[report.index]
+    pd.testing.assert_frame_equal(report, expected, check_names=False, check_dtype=False)
+    assert report["mean_rank"].is_monotonic_increasing
@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+from zillow_scraper import zillow
+from zillow_scraper.cache import Checkpoint, ResponseCache
+from zillow_scraper.scheduler import Scheduler, TokenBucket
+
+
+def property_page(zpid):
+    cache = {f"Property:{zpid}": {"property": {"zpid": zpid}}}
+    data = {"props": {"pageProps": {"componentProps": {"gdpClientCache": json.dumps(cache)}}}}
+    return f'<html><script id="__NEXT_DATA__" type="application/json">{json.dumps(data)}</script></html>'
+
+
+class FakeFetch:
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    async def __call__(self, url, method="GET", headers=None, body=None):
+        self.calls.append(url)
+        zpid = url.rstrip("/").split("/")[-1]
+        if zpid in self.fail:
+            raise ConnectionError(zpid)
+        return property_page(zpid)
+
+
+def test_response_cache_key_ignores_request_id(tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    first = zillow.create_search_payload({"usersSearchTerm": "Chicago IL"}, 2)
+    second = json.dumps(dict(json.loads(first), requestId=-1))
+    cache.put(zillow.BACKEND_URL, "page 2", method="PUT", body=first)
+
+    assert cache.get(zillow.BACKEND_URL, method="PUT", body=second) == "page 2"
+    assert cache.get(zillow.BACKEND_URL, method="PUT", body=zillow.create_search_payload({}, 3)) is None
+    assert cache.get(zillow.BACKEND_URL) is None
+
+
+def test_resume_after_failure(tmp_path):
+    urls = [f"https://www.zillow.com/homedetails/{zpid}/" for zpid in "abcd"]
+    scheduler = Scheduler(rate=None, retries=0)
+
+    # first run: "c" fails, the others are cached and checkpointed
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    fetch = FakeFetch(fail={"c"})
+    checkpoint = Checkpoint(tmp_path / "property.jsonl")
+    results = asyncio.run(zillow.scrape_properties(urls, scheduler, cache.wrap(fetch), checkpoint))
+    assert [r["zpid"] for r in results] == ["a", "b", "d"]
+    cache.close()
+
+    # second run in a new process: only "c" is fetched
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    fetch = FakeFetch()
+    checkpoint = Checkpoint(tmp_path / "property.jsonl")
+    assert len(checkpoint) == 3
+    results = asyncio.run(zillow.scrape_properties(urls, scheduler, cache.wrap(fetch), checkpoint))
+    assert [r["zpid"] for r in results] == ["a", "b", "c", "d"]
+    assert fetch.calls == [urls[2]]
+
+    # without the checkpoint every page is parsed again from the cache, without network
+    fetch = FakeFetch()
+    results = asyncio.run(zillow.scrape_properties(urls, scheduler, cache.wrap(fetch)))
+    assert len(results) == 4
+    assert fetch.calls == []
+    assert cache.hits == 4
+
+
+def test_checkpoint_ignores_truncated_line(tmp_path):
+    path = tmp_path / "property.jsonl"
+    path.write_text(json.dumps({"key": "a", "data": {"zpid": "a"}}) + "\n" + '{"key": "b", "da')
+
+    checkpoint = Checkpoint(path)
+    assert "a" in checkpoint and "b" not in checkpoint
+    checkpoint.add("b", {"zpid": "b"})
+
+    assert Checkpoint(path).records == {"a": {"zpid": "a"}, "b": {"zpid": "b"}}
+
+
+def test_cache_hits_skip_the_rate_limit(tmp_path, monkeypatch):
+    urls = [f"https://www.zillow.com/homedetails/{zpid}/" for zpid in "abcd"]
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    scheduler = Scheduler(rate=1000.0, retries=0)
+    asyncio.run(zillow.scrape_properties(urls, scheduler, cache.wrap(FakeFetch(), scheduler)))
+
+    # a fully cached run never waits for a token
+    acquired = []
+    async def acquire(self):
+        acquired.append(self)
+    monkeypatch.setattr(TokenBucket, "acquire", acquire)
+    fetch = FakeFetch()
+    scheduler = Scheduler(rate=1000.0, retries=0)
+    results = asyncio.run(zillow.scrape_properties(urls, scheduler, cache.wrap(fetch, scheduler)))
+    assert len(results) == 4 and fetch.calls == [] and acquired == []
@@ -0,0 +1,88 @@
+import os
+import pathlib
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="the server forks its workers")
+
+ROOT = pathlib.Path(__file__).parent.parent
+
+
+def get(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return response.status, response.read()
+
+
+@pytest.fixture
+def server():
+    process = subprocess.Popen(
+        [sys.executable, "-m", "website.serve", "--host", "127.0.0.1", "--port", "0",
+         "--workers", "2", "--threads", "2", "--check-interval", "0"],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    port = re.search(r":(\d+) with", line).group(1)
+    yield process, f"http://127.0.0.1:{port}"
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+
+def worker_pids(pid):
+    children = pathlib.Path(f"/proc/{pid}/task/{pid}/children")
+    return set(children.read_text().split()) if children.exists() else None
+
+
+def test_busy_worker_leaves_connections_in_backlog():
+    from website.serve import PooledWSGIServer, QuietRequestHandler, listen
+
+    release = threading.Event()
+
+    def slow_app(environ, start_response):
+        release.wait(10)
+        start_response("200 OK", [("Content-Length", "2")])
+        return [b"ok"]
+
+    sock = listen("127.0.0.1", 0)
+    server = PooledWSGIServer("127.0.0.1", sock.getsockname()[1], slow_app, threads=1,
+                              fd=sock.fileno(), handler=QuietRequestHandler)
+    accepted = []
+    get_request = server.get_request
+    server.get_request = lambda: accepted.append(1) or get_request()
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}/"
+    with ThreadPoolExecutor(2) as pool:
+        responses = [pool.submit(get, url) for _ in range(2)]
+        time.sleep(0.5)
+        # the one thread is busy, the second connection waits in the kernel backlog
+        assert len(accepted) == 1
+        release.set()
+        assert [response.result()[0] for response in responses] == [200, 200]
+    server.shutdown()
+    server.server_close()
+    sock.close()
+
+
+def test_serve_and_reload(server):
+    process, url = server
+    assert get(f"{url}/api/zip/60601")[0] == 200
+    workers = worker_pids(process.pid)
+
+    # a reload starts new workers, the server keeps answering
+    process.send_signal(signal.SIGHUP)
+    assert "reloaded" in process.stdout.readline()
+    assert get(f"{url}/analysis")[0] == 200
+    if workers is not None:
+        time.sleep(1)
+        assert len(worker_pids(process.pid)) == 2 and not workers & worker_pids(process.pid)
+
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=30) == 0
@@ -0,0 +1,122 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from shapely.geometry import box
+
+from map.tiles import ZipTiles, decode_tile, encode_layer, mercator, polygon_commands, remove_old_versions
+from map.topology import Topology
+
+
+def signed_area(ring):
+    ring = np.asarray(ring, dtype=float)
+    return (np.dot(ring[:-1, 0], ring[1:, 1]) - np.dot(ring[1:, 0], ring[:-1, 1])) / 2
+
+
+def test_encode_decode_polygon_with_hole():
+    # exterior and hole both given clockwise on screen, the hole must come out reversed
+    exterior = np.array([[0, 0], [100, 0], [100, 100], [0, 100], [0, 0]])
+    hole = np.array([[20, 20], [60, 20], [60, 60], [20, 60], [20, 20]])
+    commands = polygon_commands([[exterior, hole]])
+    layer = encode_layer("zips", [(1, {"zip": "60601", "score": 0.5, "rank": 3, "missing": np.nan}, commands)])
+
+    feature, = decode_tile(layer)["zips"]
+    assert feature["properties"] == {"zip": "60601", "score": 0.5, "rank": 3}
+    outer, inner = feature["rings"]
+    assert signed_area(outer) > 0 > signed_area(inner)
+    assert abs(signed_area(outer)) == 100 * 100 and abs(signed_area(inner)) == 40 * 40
+
+
+@pytest.fixture
+def zip_frame():
+    # 2 x 2 ZIP codes around the Loop
+    cells = [box(-87.64 + i * 0.01, 41.87 + j * 0.01, -87.63 + i * 0.01, 41.88 + j * 0.01)
+             for i in range(2) for j in range(2)]
+    return gpd.GeoDataFrame({"zip": ["60601", "60602", "60603", "60604"]}, geometry=cells)
+
+
+@pytest.fixture
+def metrics():
+    return pd.DataFrame({"zipcode": [60601, 60602, 60603], "final_score": [0.8, 0.6, np.nan]})
+
+
+def tile_of(lon, lat, z):
+    x, y = mercator(np.array([[lon, lat]]))[0] * 2 ** z
+    return z, int(x), int(y)
+
+
+def test_tile_features(zip_frame, metrics, tmp_path):
+    tiles = ZipTiles(Topology.from_frame(zip_frame), metrics, "v1", cache_dir=tmp_path)
+    features = decode_tile(tiles.tile(*tile_of(-87.63, 41.88, 10)))["zips"]
+    assert sorted(f["properties"]["zip"] for f in features) == ["60601", "60602", "60603", "60604"]
+    by_zip = {f["properties"]["zip"]: f["properties"] for f in features}
+    assert by_zip["60601"]["final_score"] == 0.8
+    assert "final_score" not in by_zip["60603"]  # missing scores are left out
+
+    # far from Chicago
+    assert tiles.tile(10, 0, 0) == b""
+
+
+def test_tiles_meet_at_tile_borders(zip_frame, metrics):
+    tiles = ZipTiles(Topology.from_frame(zip_frame), metrics, "v1", cache_dir=None)
+    # at zoom 16 the ZIP codes span several tiles, every one of them holds a clipped part
+    z, x, y = tile_of(-87.635, 41.875, 16)
+    around = [decode_tile(tiles.build(z, x + dx, y + dy)).get("zips", []) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+    assert all(around)
+    for features in around:
+        for feature in features:
+            for ring in feature["rings"]:
+                xs, ys = zip(*ring)
+                assert min(xs) >= -64 and max(xs) <= 4096 + 64
+                assert min(ys) >= -64 and max(ys) <= 4096 + 64
+
+
+def test_tile_cache(zip_frame, metrics, tmp_path, monkeypatch):
+    topology = Topology.from_frame(zip_frame)
+    key = tile_of(-87.63, 41.88, 12)
+    tiles = ZipTiles(topology, metrics, "v1", cache_dir=tmp_path)
+    data = tiles.tile(*key)
+    assert tiles.tile(*key) is data
+    z, x, y = key
+    assert (tmp_path / "v1" / str(z) / str(x) / f"{y}.mvt").read_bytes() == data
+
+    # a new process with the same version reads the tile from disk
+    again = ZipTiles(topology, metrics, "v1", cache_dir=tmp_path)
+    monkeypatch.setattr(again, "build", lambda *args: pytest.fail("tile built again"))
+    assert again.tile(*key) == data
+
+    # building a new version leaves the old tiles to the processes still serving them,
+    # they are removed once none does
+    ZipTiles(topology, metrics.assign(final_score=0.1), "v2", cache_dir=tmp_path).tile(*key)
+    assert (tmp_path / "v1").exists()
+    remove_old_versions(tmp_path, "v2")
+    assert not (tmp_path / "v1").exists() and (tmp_path / "v2").exists()
+
+
+def test_slow_build_does_not_block_other_tiles(zip_frame, metrics, tmp_path):
+    tiles = ZipTiles(Topology.from_frame(zip_frame), metrics, "v1", cache_dir=tmp_path)
+    cached = tile_of(-87.63, 41.88, 12)
+    data = tiles.tile(*cached)
+    slow = tile_of(-87.63, 41.88, 14)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    build = tiles.build
+    def slow_build(z, x, y):
+        calls.append((z, x, y))
+        started.set()
+        release.wait(10)
+        return build(z, x, y)
+    tiles.build = slow_build
+
+    with ThreadPoolExecutor(3) as pool:
+        first = pool.submit(tiles.tile, *slow)
+        started.wait(10)
+        second = pool.submit(tiles.tile, *slow)
+        # other tiles are served while the slow one builds
+        assert pool.submit(tiles.tile, *cached).result(timeout=5) is data
+        release.set()
+        assert first.result() == second.result() != b""
+    # the second request waited for the first build instead of building again
+    assert calls == [slow]
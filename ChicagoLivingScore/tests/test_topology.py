@@ -0,0 +1,106 @@
+import json
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Polygon
+
+from map.topology import LEVELS, Topology, level_for_zoom
+
+
+def wiggly_edge(start, end, seed, points=200, amplitude=0.004):
+    # A border with many points that bends away from the straight line
+    t = np.linspace(0, 1, points)[:, None]
+    normal = np.array([start[1] - end[1], end[0] - start[0]])
+    bend = amplitude * np.sin(t * np.pi * 7 + seed) * np.sin(t * np.pi)
+    return np.asarray(start) + t * (np.asarray(end) - start) + bend * normal / np.linalg.norm(normal)
+
+
+@pytest.fixture
+def zip_frame():
+    # 3 x 3 ZIP codes with shared wiggly borders, the middle one with a hole filled by a 10th ZIP code
+    n, step = 3, 0.05
+    corner = lambda i, j: (-87.7 + i * step, 41.8 + j * step)
+    edges = {}
+    def edge(a, b):
+        if (b, a) in edges:
+            return edges[(b, a)][::-1]
+        if (a, b) not in edges:
+            outer = all(k in (0, n) for k in (a[0], b[0])) and a[0] == b[0] or \
+                all(k in (0, n) for k in (a[1], b[1])) and a[1] == b[1]
+            line = np.array([corner(*a), corner(*b)]) if outer else \
+                wiggly_edge(corner(*a), corner(*b), seed=len(edges))
+            edges[(a, b)] = line
+        return edges[(a, b)]
+
+    polygons, zips = [], []
+    for i in range(n):
+        for j in range(n):
+            square = [(i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1), (i, j)]
+            ring = np.vstack([edge(a, b)[:-1] for a, b in zip(square[:-1], square[1:])])
+            polygons.append(Polygon(ring))
+            zips.append(f"606{i}{j}")
+    island = polygons[4].centroid.buffer(0.01, quad_segs=32)
+    polygons[4] = polygons[4].difference(island)
+    polygons.append(island)
+    zips.append("60699")
+    return gpd.GeoDataFrame({"zip": zips}, geometry=polygons)
+
+
+def test_shared_borders_are_stored_once(zip_frame):
+    topology = Topology.from_frame(zip_frame)
+    # 12 inner borders, the city outline cut where they meet it (8) and the island ring
+    assert len(topology.arcs) == 21
+    topo = topology.to_topojson("full")
+    refs = [ref for geometry in topo["objects"]["zips"]["geometries"]
+            for rings in ([geometry["arcs"]] if geometry["type"] == "Polygon" else geometry["arcs"])
+            for ring in rings for ref in ring]
+    used = np.bincount([ref if ref >= 0 else ~ref for ref in refs])
+    # inner borders are used by the two ZIP codes on either side
+    assert used.max() == 2 and (used == 2).sum() == 13
+    assert [g["properties"]["zip"] for g in topo["objects"]["zips"]["geometries"]] == zip_frame["zip"].tolist()
+
+
+@pytest.mark.parametrize("level", list(LEVELS))
+def test_levels_have_no_seams(zip_frame, level):
+    topology = Topology.from_frame(zip_frame)
+    shapes = topology.shapes(level)
+    assert all(shape.is_valid for shape in shapes)
+    union = shapely.union_all(shapes)
+    # no overlaps and no gaps between ZIP codes
+    assert sum(shape.area for shape in shapes) == pytest.approx(union.area, rel=1e-9)
+    assert union.geom_type == "Polygon" and len(union.interiors) == 0
+    assert union.area == pytest.approx(zip_frame.union_all().area, rel=1e-3)
+    for shape, original in zip(shapes, zip_frame.geometry):
+        assert shape.symmetric_difference(original).area < 0.15 * original.area
+
+
+def test_levels_shrink_payload(zip_frame):
+    topology = Topology.from_frame(zip_frame)
+    sizes = [len(json.dumps(topology.to_topojson(level))) for level in ["low", "medium", "high", "full"]]
+    assert sizes == sorted(sizes)
+    assert sizes[0] * 10 < len(zip_frame.to_json())
+    points = [sum(len(arc) for arc in topology.level_arcs(level)) for level in ["low", "full"]]
+    assert points[0] * 10 < points[1]
+
+
+def test_topojson_decodes_to_geojson(zip_frame):
+    topology = Topology.from_frame(zip_frame)
+    topo = topology.to_topojson("medium")
+    scale, translate = np.array(topo["transform"]["scale"]), np.array(topo["transform"]["translate"])
+    arcs = [np.cumsum(arc, axis=0) * scale + translate for arc in topo["arcs"]]
+    geometry = topo["objects"]["zips"]["geometries"][0]
+    parts = [arcs[ref] if ref >= 0 else arcs[~ref][::-1] for ref in geometry["arcs"][0]]
+    # every arc starts where the one before ends
+    ring = np.vstack([parts[0]] + [part[1:] for part in parts[1:]])
+    expected = topology.to_geojson("medium")["features"][0]["geometry"]["coordinates"][0]
+    assert shapely.Polygon(ring).equals_exact(shapely.Polygon(expected), 1e-6)
+
+
+def test_level_for_zoom():
+    levels = [level_for_zoom(zoom) for zoom in range(6, 18)]
+    assert levels[0] == "low" and levels[-1] == "full"
+    # finer levels as the map zooms in
+    order = list(LEVELS)
+    assert [order.index(level) for level in levels] == sorted(order.index(level) for level in levels)
@@ -0,0 +1,39 @@
+import pytest
+import pandas as pd
+from website.zip_records import ZipRecordStore, NA_RECORD, frame_lookup
+
+
+@pytest.fixture
+def df_metrics():
+    return pd.DataFrame({
+        "zipcode": [60601, 60602],
+        "avg_price_per_sqft": [441.18, None],
+        "final_score": [0.812, 0.69],
+    })
+
+def test_record_store_matches_frame_lookup(df_metrics):
+    store = ZipRecordStore.from_frame(df_metrics)
+    for zipcode in ["60601", "60602", "60699"]:
+        assert dict(store.get(zipcode)) == dict(frame_lookup(df_metrics, zipcode))
+    assert store.get("60601")["final_score"] == "0.81"
+    assert store.get("60602")["housing_price"] == "N/A"
+
+def test_record_store_missing_zip(df_metrics):
+    store = ZipRecordStore.from_frame(df_metrics)
+    assert store.get("60699") is NA_RECORD
+    assert store.get_values("60699") is None
+    assert store.get_values("60602")["avg_price_per_sqft"] is None
+    assert len(store) == 2 and "60601" in store
+
+def test_record_store_is_read_only(df_metrics):
+    store = ZipRecordStore.from_frame(df_metrics)
+    with pytest.raises(TypeError):
+        store.get("60601")["final_score"] = "1.00"
+
+def test_record_store_leading_zero(df_metrics):
+    # the frame lookup compared int(zipcode), so leading zeros and spaces still match
+    store = ZipRecordStore.from_frame(df_metrics)
+    assert dict(store.get("060601")) == dict(frame_lookup(df_metrics, "060601"))
+    assert store.get("060601")["final_score"] == "0.81"
+    assert store.get_values(" 60601")["final_score"] == 0.812
+    assert "060602" in store
@@ -24,3 +24,54 @@ def test_load_shapefile_with_cache(tmp_path):
 if __name__ == "__main__":
     pytest.main()
 
+
+
+def test_load_chicago_zip_index(tmp_path, monkeypatch):
+    """Test that only Chicago ZCTAs are kept and the index is cached by shapefile hash."""
+    from shapely.geometry import box
+    from analysis.zips import load_chicago_zip_index
+
+    shp_path = tmp_path / "zcta.shp"
+    gpd.GeoDataFrame(
+        {"ZCTA5CE20": ["60601", "60602", "10001", "60699"]},
+        geometry=[box(-87.63, 41.88, -87.62, 41.89), box(-87.62, 41.88, -87.61, 41.89),
+                  box(-74.0, 40.7, -73.9, 40.8), box(-87.70, 41.90, -87.69, 41.91)],
+        crs="EPSG:4269",
+    ).to_file(shp_path)
+    zip_list_file = tmp_path / "chicago_zip.csv"
+    zip_list_file.write_text("zipcode\n60601\n60602\n")
+    cache_dir = tmp_path / "cache"
+
+    gdf, tree = load_chicago_zip_index(shp_path, zip_list_file, cache_dir)
+    assert sorted(gdf["ZCTA5CE20"]) == ["60601", "60602"]
+    assert len(tree) == 2
+    assert len(list(cache_dir.glob("chicago_zcta-*.pkl"))) == 1
+
+    # the second load comes from the cache, without reading the shapefile
+    def fail(*args, **kwargs):
+        raise AssertionError("shapefile read again")
+    monkeypatch.setattr(gpd, "read_file", fail)
+    gdf_cached, _ = load_chicago_zip_index(shp_path, zip_list_file, cache_dir)
+    assert gdf.equals(gdf_cached)
+
+
+def test_unreadable_zip_index_cache_is_rebuilt(tmp_path):
+    """A torn cache file (e.g. from a crash mid-write) is treated as a cache miss."""
+    from shapely.geometry import box
+    from analysis.zips import load_chicago_zip_index
+
+    shp_path = tmp_path / "zcta.shp"
+    gpd.GeoDataFrame({"ZCTA5CE20": ["60601"]}, geometry=[box(-87.63, 41.88, -87.62, 41.89)],
+                     crs="EPSG:4269").to_file(shp_path)
+    zip_list_file = tmp_path / "chicago_zip.csv"
+    zip_list_file.write_text("zipcode\n60601\n")
+    cache_dir = tmp_path / "cache"
+
+    load_chicago_zip_index(shp_path, zip_list_file, cache_dir)
+    cache_path, = cache_dir.glob("chicago_zcta-*.pkl")
+    cache_path.write_bytes(cache_path.read_bytes()[:100])
+
+    gdf, tree = load_chicago_zip_index(shp_path, zip_list_file, cache_dir)
+    assert gdf["ZCTA5CE20"].tolist() == ["60601"] and len(tree) == 1
+    assert joblib.load(cache_path)[0].equals(gdf)
+    assert not list(cache_dir.glob("*.tmp"))
@@ -0,0 +1,63 @@
+import gzip
+import json
+import threading
+
+import altair as alt
+
+from analysis.data_visualization_analysis import chart_dataset, chart_specs
+
+
+# This file keeps the charts of the analysis page ready to send, built once per data version.
+# Each chart is a Vega-Lite spec that loads the dataset from one URL (data_url), so the
+# rows are sent once and cached by the browser instead of being inlined into every chart.
+# Every payload is stored with its gzip encoding and an ETag: a request only picks bytes.
+
+
+# Scripts that draw the specs in the browser, the versions Altair writes its specs for
+VEGA_SCRIPTS = [
+    f"https://cdn.jsdelivr.net/npm/vega@{alt.VEGA_VERSION}",
+    f"https://cdn.jsdelivr.net/npm/vega-lite@{alt.VEGALITE_VERSION}",
+    f"https://cdn.jsdelivr.net/npm/vega-embed@{alt.VEGAEMBED_VERSION}",
+]
+
+
+class Payload:
+    __slots__ = ("body", "gzipped", "mimetype", "etag")
+
+    def __init__(self, body, mimetype, etag):
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        self.mimetype = mimetype
+        self.etag = etag
+
+
+class AnalysisCharts:
+    def __init__(self, version, data, specs):
+        """
+        version: data version the charts were built from
+        data: Payload of the dataset shared by the charts
+        specs: chart name -> Payload of its Vega-Lite spec
+        """
+        self.version = version
+        self.data = data
+        self.specs = specs
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df, version, data_url):
+        tag = version[:16]
+        data = Payload(chart_dataset(df), "application/json", f"{tag}-analysis-data")
+        # the version in the URL keeps browsers from mixing a new spec with old rows
+        specs = {
+            name: Payload(json.dumps(spec, separators=(",", ":")), "application/json", f"{tag}-analysis-{name}")
+            for name, spec in chart_specs(f"{data_url}?v={tag}").items()
+        }
+        return cls(version, data, specs)
+
+    def page(self, key, render):
+        """Payload of a rendered page, render() is called once per key."""
+        with self._lock:
+            if key not in self._pages:
+                self._pages[key] = Payload(render(), "text/html", f"{self.version[:16]}-analysis-page-{key}")
+            return self._pages[key]
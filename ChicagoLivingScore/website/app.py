@@ -1,32 +1,102 @@
-from flask import Flask, render_template, jsonify, request
-import folium
-import geopandas as gpd
-import pandas as pd
-from shapely import wkt
-from shapely.geometry import Point
-import httpx
-import lxml.html
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, render_template, jsonify, redirect, request, url_for
+import argparse
+import hashlib
+import math
 import pathlib
-import webbrowser
 from threading import Timer
 import os
-from map.mapbuild import get_chicago_zip_geo, create_map, show_unemployed_score, show_trafic_score, show_education_score, map_show_avg_price, show_crime_score, show_environment_score, show_final_score
-from analysis.data_visualization_analysis import create_heatmap, combine_charts, creat_bar_chats, create_heatmap_html, create_bar_html
+import json
+from map.render_cache import MapRenderCache
+
 
+# Importing this module stays cheap: folium, geopandas, shapely, altair and even pandas
+# are imported by the functions that need them, and no data is read at import.
+# warm_up() pays those costs up front before serving; see --profile-startup:
+#   python -m website.app --profile-startup
 
 app = Flask(__name__)
 
 # Load local metrics data
 BASE_DIR = pathlib.Path(__file__).parent.parent  
 DATA_FILE = BASE_DIR / "data" / "cleaned_data" / "final_living_score.csv"
-df_metrics = pd.read_csv(DATA_FILE)
 
-# return 2 decimals
-def format_score(val):
-    if pd.isnull(val):
-        return "N/A"
+# Indicator keywords on the service page and the map.mapbuild function adding each one's layer
+INDICATOR_LAYERS = {
+    "education": "show_education_score",
+    "crime": "show_crime_score",
+    "environment": "show_environment_score",
+    "traffic": "show_trafic_score",
+    "housing": "map_show_avg_price",
+    "unemployment": "show_unemployed_score",
+    "final": "show_final_score",
+}
+
+# Column of final_living_score.csv behind each indicator keyword, used by the JSON API
+INDICATOR_COLUMNS = {
+    "education": "education_score",
+    "crime": "crime_score",
+    "environment": "environment_score",
+    "traffic": "commute_time_score",
+    "housing": "avg_price_per_sqft",
+    "unemployment": "unemployed_score",
+    "final": "final_score",
+}
+
+def render_map(df_metrics, indicator=None, selected_zip=None):
+    """
+    Build the map html for the website.
+    indicator: "about" for the main page map, a key of INDICATOR_LAYERS, or None
+    selected_zip: zip code highlighted on the service map
+    """
+    import folium
+    from map import mapbuild
+
+    if indicator == "about":
+        m = folium.Map(location=[41.8781, -87.6298], zoom_start=11, tiles='cartodbpositron')
+        m = mapbuild.show_final_score(m, df_metrics)
     else:
-        return f"{val:.2f}"
+        m = mapbuild.create_map(selected_zip=selected_zip)
+        if indicator is not None:
+            m = getattr(mapbuild, INDICATOR_LAYERS[indicator])(m, df_metrics)
+    return m._repr_html_()
+
+# Rendered maps are reused until final_living_score.csv changes
+map_cache = MapRenderCache(DATA_FILE, render_map)
+
+def warm_map_cache():
+    keys = [("about", None), (None, None)] + [(indicator, None) for indicator in INDICATOR_LAYERS]
+    map_cache.warm(keys)
+
+def zip_records():
+    # Preformatted score cards of every zip code, rebuilt with the data version
+    from website.zip_records import ZipRecordStore
+    return map_cache.derive("zip_records", ZipRecordStore.from_frame)
+
+def scoring_engine():
+    # Indicator matrix of every zip code, rebuilt with the data version
+    from analysis.scoring import ScoringEngine
+    return map_cache.derive("scoring", ScoringEngine.from_frame)
+
+def zip_tiles():
+    # Vector tiles of the zip codes, rebuilt with the data version and the boundaries
+    from map.mapbuild import get_zip_topology, load_chicago_zip_geo
+    from map.tiles import ZipTiles
+
+    digest = load_chicago_zip_geo()["digest"]
+
+    def build(df):
+        return ZipTiles(get_zip_topology(), df, f"{map_cache.version[:8]}{digest[:8]}")
+
+    # one tile set at a time, new boundaries replace it
+    return map_cache.derive("tiles", build, key=digest)
+
+def remove_old_tiles():
+    # Tile folders of other versions, only when no other process may still serve them
+    from map.tiles import TILE_CACHE_DIR, remove_old_versions
+    remove_old_versions(TILE_CACHE_DIR, zip_tiles().version)
 
 
 # Construct the main page (About page)
@@ -38,9 +108,7 @@ def about():
     Left side -> Project Overview
     Right side -> Map
     """
-    m = folium.Map(location=[41.8781, -87.6298], zoom_start=11, tiles='cartodbpositron')
-    m = show_final_score(m, df_metrics)
-    map_html = m._repr_html_()
+    map_html = map_cache.get("about")
 
     return render_template("about.html", map_html=map_html)
 
@@ -56,6 +124,7 @@ def service():
     """
     map_html = None
     zip_data = None
+    zipcode = None
 
     if request.method == "POST":
         user_input = request.form.get("zipcode").strip().lower()
@@ -63,183 +132,334 @@ def service():
         # If the input is numeric, treat it as a ZIP code
         if user_input.isdigit():
             zipcode = user_input
-            m = create_map(selected_zip=zipcode)
             # Extract related scores corresponding to the zip code
-            row = df_metrics.loc[df_metrics["zipcode"] == int(zipcode)]
-            if not row.empty:
-                df_row = row.iloc[0]
-                zip_data = {
-                    "zipcode": zipcode,
-                    "housing_price": format_score(df_row.get("avg_price_per_sqft")),
-                    "unemployed_score": format_score(df_row.get("unemployed_score")),
-                    "commute_time_score": format_score(df_row.get("commute_time_score")),
-                    "avg_income_score": format_score(df_row.get("avg_income_score")),
-                    "private_insurance_score": format_score(df_row.get("private_insurance_score")),
-                    "education_score": format_score(df_row.get("education_score")),
-                    "crime_score": format_score(df_row.get("crime_score")),
-                    "environment_score": format_score(df_row.get("environment_score")),
-                    "final_score": format_score(df_row.get("final_score"))
-                }
-            else:
-                zip_data = {
-                    "zipcode": zipcode,
-                    "housing_price": "N/A",
-                    "unemployed_score": "N/A",
-                    "commute_time_score": "N/A",
-                    "avg_income_score": "N/A",
-                    "private_insurance_score": "N/A",
-                    "education_score": "N/A",
-                    "crime_score": "N/A",
-                    "environment_score": "N/A",
-                    "final_score": "N/A"
-                }
-            # For GET requests, display the default map
-            m = create_map(selected_zip=zipcode)
-            map_html = m._repr_html_()
+            zip_data = zip_records().get(zipcode)
+            map_html = map_cache.get(selected_zip=zipcode)
 
         # Handle keyword inputs to show specific indicators distribution
-        elif user_input == "education":
-            m = create_map()
-            # Call the show_education_score function from mapbuild.py
-            m = show_education_score(m, df_metrics)
-            map_html = m._repr_html_()
-
-        elif user_input == "crime":
-            m = create_map()
-            m = show_crime_score(m, df_metrics)
-            map_html = m._repr_html_()
-
-        elif user_input == "environment":
-            m = create_map()
-            m = show_environment_score(m, df_metrics)
-            map_html = m._repr_html_()
-
-        elif user_input == "traffic":
-            m = create_map()
-            m = show_trafic_score(m, df_metrics)
-            map_html = m._repr_html_()
-
-        elif user_input == "housing":
-            m = create_map()
-            m = map_show_avg_price(m, df_metrics)
-            map_html = m._repr_html_()
-
-        elif user_input == "unemployment":
-            m = create_map()
-            m = show_unemployed_score(m, df_metrics)
-            map_html = m._repr_html_()
-
-        elif user_input == "final":
-            m = create_map()
-            m = show_final_score(m, df_metrics)
-            map_html = m._repr_html_()
+        elif user_input in INDICATOR_LAYERS:
+            map_html = map_cache.get(user_input)
 
         else:
             # For other inputs, just show the default map with placeholder data
-            m = create_map()
-            map_html = m._repr_html_()
-            zip_data = {
-                "zipcode": user_input,
-                "housing_price": "N/A",
-                "unemployed_score": "N/A",
-                "commute_time_score": "N/A",
-                "avg_income_score": "N/A",
-                "private_insurance_score": "N/A",
-                "education_score": "N/A",
-                "crime_score": "N/A",
-                "environment_score": "N/A",
-                "final_score": "N/A"
-            }
+            map_html = map_cache.get()
+            from website.zip_records import NA_RECORD
+            zipcode = user_input
+            zip_data = NA_RECORD
 
     else:
         # GET post, display the deafult map
-        m = create_map()
-        map_html = m._repr_html_()
+        map_html = map_cache.get()
 
     
 
-    return render_template("service.html", map_html=map_html, zip_data=zip_data)
+    return render_template("service.html", map_html=map_html, zip_data=zip_data, zipcode=zipcode)
 
 
 # Construct the Analysis Page for presenting data analysis results directly
+# Text shown for each analysis query, the chart of each query is in website.analysis_charts
+ANALYSIS_RESULTS = {
+    "top 5": (
+        "<strong>Top 5 Zip Codes (Overall Best):</strong><br>"
+        "1) 60606 (Downtown/Loop)<br>"
+        "&bull; Located in Chicago's business district.<br>"
+        "&bull; High-income community with a strong job market.<br>"
+        "&bull; Excellent public transportation and walkability.<br>"
+        "&bull; Low crime rates due to intense commercial activity and security.<br><br>"
+        "2) 60603 (Loop)<br>"
+        "&bull; Business-concentrated area with high employment.<br>"
+        "&bull; High-end housing options and strong economic activity.<br>"
+        "&bull; High walkability score.<br><br>"
+        "3) 60601 (New East Side)<br>"
+        "&bull; High-end high-rises near Millennium Park and the lakefront.<br>"
+        "&bull; Well-educated population with access to premium amenities.<br>"
+        "&bull; Low unemployment and strong economic indicators.<br><br>"
+        "4) 60604 (South Loop)<br>"
+        "&bull; Mix of residential and commercial development.<br>"
+        "&bull; Close to cultural attractions, universities, and office spaces.<br>"
+        "&bull; Urban development with rising property values.<br><br>"
+        "5) 60661 (West Loop)<br>"
+        "&bull; Trendy neighborhood attracting young professionals.<br>"
+        "&bull; Close to top restaurants and tech hubs (e.g., Google’s Chicago office).<br>"
+        "&bull; Growing residential developments with luxury living spaces.<br><br>"
+        "<strong>Worst 5 Zip Codes (Worst Overall):</strong><br>"
+        "1) 60628 (Roseland)<br>"
+        "&bull; Historically disinvested with high unemployment.<br>"
+        "&bull; Crime and safety concerns affecting livability.<br>"
+        "&bull; Limited economic development and infrastructure investment.<br><br>"
+        "2) 60620 (Auburn Gresham)<br>"
+        "&bull; Faces socioeconomic challenges and underfunded public services.<br>"
+        "&bull; Limited public transit access compared to central Chicago.<br><br>"
+        "3) 60624 (Garfield Park)<br>"
+        "&bull; One of Chicago's most disinvested communities.<br>"
+        "&bull; High crime, unemployment, and housing instability.<br><br>"
+        "4) 60619 (Chatham/South Side)<br>"
+        "&bull; Middle-class area facing economic decline and rising crime.<br><br>"
+        "5) 60644 (Austin)<br>"
+        "&bull; Large area with significant challenges including high crime and poverty.<br>"
+    ),
+    "relationship": (
+        "<strong>Best Places to Live (Top Scoring Zip Codes - Yellow/Green):</strong><br>"
+        "For a high quality of life, safety, and access to amenities, the highest-scoring ZIP codes (mostly in yellow and green) are ideal. "
+        "They typically exhibit strong economic activity, good schools, a clean environment, low crime, and excellent walkability. "
+        "Top areas include:<br>"
+        "- Loop (60601, 60602, 60603, 60606)<br>"
+        "- Near North Side (60610, 60611, 60654)<br>"
+        "- Lincoln Park (60614)<br><br>"
+        "<strong>Affordable Yet Livable Areas (Moderate Scoring Zip Codes - Green/Blue):</strong><br>"
+        "For those balancing affordability and quality of life, mid-range ZIP codes in green and blue are worth considering, offering decent safety and "
+        "improving economic conditions. Examples include:<br>"
+        "- Logan Square (60647)<br>"
+        "- West Loop (60607)<br>"
+        "- Uptown (60640)"
+    ),
+}
+ANALYSIS_CHARTS = {"top 5": "top5", "relationship": "relationship"}
+ANALYSIS_DATA_URL = "/analysis/data.json"
+
+def analysis_charts():
+    # Chart specs and their dataset, rebuilt with the data version
+    from website.analysis_charts import AnalysisCharts
+    return map_cache.derive("analysis_charts",
+                            lambda df: AnalysisCharts.from_frame(df, map_cache.version, ANALYSIS_DATA_URL))
+
 @app.route("/analysis", methods=["GET", "POST"])
 def analysis():
     """
     Analysis page:
     For advanced queries, like input a zip code or some keywords (like 'school') to display data analysis
+    The page of each query is rendered once per data version, its chart is loaded from /analysis/chart/<name>.json
     """
-    results = None
-    chart_html = None
-    if request.method == "POST":
-        query = request.form.get("query", "").strip().lower()
-        # check whether the query is numeric or a keyword
-        if query == "top 5":
-            from analysis.data_visualization_analysis import create_bar_html
-            chart_html = create_bar_html(df_metrics)
-            results = (
-                "<strong>Top 5 Zip Codes (Overall Best):</strong><br>"
-                "1) 60606 (Downtown/Loop)<br>"
-                "&bull; Located in Chicago's business district.<br>"
-                "&bull; High-income community with a strong job market.<br>"
-                "&bull; Excellent public transportation and walkability.<br>"
-                "&bull; Low crime rates due to intense commercial activity and security.<br><br>"
-                "2) 60603 (Loop)<br>"
-                "&bull; Business-concentrated area with high employment.<br>"
-                "&bull; High-end housing options and strong economic activity.<br>"
-                "&bull; High walkability score.<br><br>"
-                "3) 60601 (New East Side)<br>"
-                "&bull; High-end high-rises near Millennium Park and the lakefront.<br>"
-                "&bull; Well-educated population with access to premium amenities.<br>"
-                "&bull; Low unemployment and strong economic indicators.<br><br>"
-                "4) 60604 (South Loop)<br>"
-                "&bull; Mix of residential and commercial development.<br>"
-                "&bull; Close to cultural attractions, universities, and office spaces.<br>"
-                "&bull; Urban development with rising property values.<br><br>"
-                "5) 60661 (West Loop)<br>"
-                "&bull; Trendy neighborhood attracting young professionals.<br>"
-                "&bull; Close to top restaurants and tech hubs (e.g., Google’s Chicago office).<br>"
-                "&bull; Growing residential developments with luxury living spaces.<br><br>"
-                "<strong>Worst 5 Zip Codes (Worst Overall):</strong><br>"
-                "1) 60628 (Roseland)<br>"
-                "&bull; Historically disinvested with high unemployment.<br>"
-                "&bull; Crime and safety concerns affecting livability.<br>"
-                "&bull; Limited economic development and infrastructure investment.<br><br>"
-                "2) 60620 (Auburn Gresham)<br>"
-                "&bull; Faces socioeconomic challenges and underfunded public services.<br>"
-                "&bull; Limited public transit access compared to central Chicago.<br><br>"
-                "3) 60624 (Garfield Park)<br>"
-                "&bull; One of Chicago's most disinvested communities.<br>"
-                "&bull; High crime, unemployment, and housing instability.<br><br>"
-                "4) 60619 (Chatham/South Side)<br>"
-                "&bull; Middle-class area facing economic decline and rising crime.<br><br>"
-                "5) 60644 (Austin)<br>"
-                "&bull; Large area with significant challenges including high crime and poverty.<br>"
-            )
-        elif query == "relationship":
-            from analysis.data_visualization_analysis import create_heatmap_html
-            chart_html = create_heatmap_html(df_metrics)
-            results = (
-                "<strong>Best Places to Live (Top Scoring Zip Codes - Yellow/Green):</strong><br>"
-                "For a high quality of life, safety, and access to amenities, the highest-scoring ZIP codes (mostly in yellow and green) are ideal. "
-                "They typically exhibit strong economic activity, good schools, a clean environment, low crime, and excellent walkability. "
-                "Top areas include:<br>"
-                "- Loop (60601, 60602, 60603, 60606)<br>"
-                "- Near North Side (60610, 60611, 60654)<br>"
-                "- Lincoln Park (60614)<br><br>"
-                "<strong>Affordable Yet Livable Areas (Moderate Scoring Zip Codes - Green/Blue):</strong><br>"
-                "For those balancing affordability and quality of life, mid-range ZIP codes in green and blue are worth considering, offering decent safety and "
-                "improving economic conditions. Examples include:<br>"
-                "- Logan Square (60647)<br>"
-                "- West Loop (60607)<br>"
-                "- Uptown (60640)"
-            )
-        else:
-            results = "Analysis is not implemented yet."
+    query = request.form.get("query", "").strip().lower() if request.method == "POST" else None
+    charts = analysis_charts()
+    if query is None:
+        key = "index"
+    else:
+        key = ANALYSIS_CHARTS.get(query, "other")
+
+    def render():
+        if query is None:
+            return render_template("analysis.html", results=None, chart_url=None)
+        if query not in ANALYSIS_RESULTS:
+            return render_template("analysis.html", results="Analysis is not implemented yet.", chart_url=None)
+        from website.analysis_charts import VEGA_SCRIPTS
+        chart_url = url_for("analysis_chart", name=key, v=charts.version[:16])
+        return render_template("analysis.html", results=ANALYSIS_RESULTS[query], chart_url=chart_url,
+                               vega_scripts=VEGA_SCRIPTS)
+
+    return send_payload(charts.page(key, render))
 
 
-    return render_template("analysis.html", results=results, chart_html=chart_html)
+@app.route("/analysis/chart/<name>.json")
+def analysis_chart(name):
+    spec = analysis_charts().specs.get(name)
+    if spec is None:
+        return jsonify({"error": f"unknown chart {name}"}), 404
+    return send_payload(spec)
 
 
+@app.route(ANALYSIS_DATA_URL)
+def analysis_data():
+    return send_payload(analysis_charts().data)
+
+
+
+# JSON API: the explore page loads the geometry once and restyles it in the browser.
+# Responses carry an ETag of the data version, so repeated requests turn into 304s.
+API_MAX_AGE = 300  # seconds
+
+def json_value(val):
+    # NaN is not valid JSON
+    return None if val is None or (isinstance(val, float) and math.isnan(val)) else val
+
+def cached_json(etag, build_body):
+    """
+    Return a JSON response with ETag/Cache-Control headers.
+    The body is only built when the client does not already have this version.
+    """
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(build_body(), mimetype="application/json")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = API_MAX_AGE
+    return response
+
+def send_payload(payload, max_age=API_MAX_AGE):
+    """Response for a prebuilt payload: 304 when the client has it, gzip when the client takes it."""
+    if payload.etag in request.if_none_match:
+        response = app.response_class(status=304)
+    elif "gzip" in request.accept_encodings:
+        response = app.response_class(payload.gzipped, mimetype=payload.mimetype)
+        response.content_encoding = "gzip"
+    else:
+        response = app.response_class(payload.body, mimetype=payload.mimetype)
+    response.set_etag(payload.etag)
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
+def compact_json(payload):
+    return json.dumps(payload, separators=(",", ":"))
+
+
+@app.route("/api/zip/<zipcode>")
+def api_zip(zipcode):
+    from website.zip_records import lookup_key
+    values = zip_records().get_values(zipcode)
+    if values is None:
+        return jsonify({"error": f"unknown zip code {zipcode}"}), 404
+    zipcode = lookup_key(zipcode)
+    record = dict(values, zipcode=zipcode)
+    return cached_json(f"{map_cache.version[:16]}-zip-{zipcode}", lambda: compact_json(record))
+
+
+@app.route("/api/indicator/<name>")
+def api_indicator(name):
+    if name not in INDICATOR_COLUMNS:
+        return jsonify({"error": f"unknown indicator {name}"}), 404
+    df_metrics = map_cache.data()
+    col = INDICATOR_COLUMNS[name]
+
+    def build_body():
+        values = {str(z): json_value(v) for z, v in zip(df_metrics["zipcode"], df_metrics[col])}
+        return compact_json({"indicator": name, "column": col, "values": values})
+
+    return cached_json(f"{map_cache.version[:16]}-indicator-{name}", build_body)
+
+
+@app.route("/api/score")
+def api_score():
+    """
+    Final score and rank of every zip code for custom weights, e.g.
+    /api/score?weights=0.2,0.1,0.2,0.05,0.15,0.2,0.1 (in the order of analysis.scoring.WEIGHTS)
+    or /api/score?weights=crime_score:2,education_score:1. Without weights the default ones are used.
+    """
+    import numpy as np
+    from analysis.scoring import WEIGHTS, parse_weights, weight_vector
+
+    try:
+        vector = parse_weights(request.args["weights"]) if "weights" in request.args else weight_vector()
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    weights = dict(zip(WEIGHTS, vector.tolist()))
+
+    def build_body():
+        engine = scoring_engine()
+        scores, ranks = engine.ranking(vector)
+        order = np.lexsort((engine.zipcodes, ranks))  # best first
+        return compact_json({
+            "weights": weights,
+            "scores": {z: json_value(v) for z, v in zip(engine.zipcodes.tolist(), scores.tolist())},
+            "ranking": engine.zipcodes[order].tolist(),
+        })
+
+    # the exact weights: vectors that only differ after a few digits get their own body
+    key = hashlib.sha256(vector.tobytes()).hexdigest()[:16]
+    return cached_json(f"{map_cache.version[:16]}-score-{key}", build_body)
+
+
+def geometry_level():
+    """Simplification level from ?level= or ?zoom= (the zoom of the folium maps by default)."""
+    from map.mapbuild import MAP_ZOOM
+    from map.topology import LEVELS, level_for_zoom
+
+    if "level" in request.args:
+        level = request.args["level"]
+        if level not in LEVELS:
+            raise ValueError(f"unknown level {level}, expected one of {', '.join(LEVELS)}")
+        return level
+    return level_for_zoom(request.args.get("zoom", MAP_ZOOM, type=int))
+
+
+@app.route("/api/geometry")
+def api_geometry():
+    """GeoJSON of the ZIP boundaries simplified for a zoom, e.g. /api/geometry?zoom=13"""
+    try:
+        level = geometry_level()
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    from map.mapbuild import get_zip_geojson_level, load_chicago_zip_geo
+    digest = load_chicago_zip_geo()["digest"]
+    return cached_json(f"{digest[:16]}-geometry-{level}", lambda: get_zip_geojson_level(level))
+
+
+@app.route("/api/topology")
+def api_topology():
+    """TopoJSON of the ZIP boundaries simplified for a zoom, shared borders are sent once."""
+    try:
+        level = geometry_level()
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    from map.mapbuild import get_zip_topojson, load_chicago_zip_geo
+    digest = load_chicago_zip_geo()["digest"]
+    return cached_json(f"{digest[:16]}-topology-{level}", lambda: get_zip_topojson(level))
+
+
+# Vector tiles: the tile URLs carry the data version, so a tile never changes and
+# browsers may keep it for a year. /tiles/zips.json points at the current version.
+TILE_MAX_AGE = 365 * 24 * 60 * 60  # seconds
+
+@app.route("/tiles/zips.json")
+def tilejson():
+    from map.tiles import LAYER_NAME, MAX_ZOOM
+    tiles = zip_tiles()
+    template = request.host_url.rstrip("/") + f"/tiles/{tiles.version}/{{z}}/{{x}}/{{y}}.mvt"
+    fields = {column: "Number" for column in map_cache.data().columns if column != "zipcode"}
+
+    def build_body():
+        return compact_json({
+            "tilejson": "3.0.0",
+            "tiles": [template],
+            "minzoom": 0,
+            "maxzoom": MAX_ZOOM,
+            "vector_layers": [{"id": LAYER_NAME, "fields": dict(fields, zip="String")}],
+        })
+
+    return cached_json(f"{tiles.version}-tilejson-{request.host}", build_body)
+
+
+@app.route("/tiles/<version>/<int:z>/<int:x>/<int:y>.mvt")
+def tile(version, z, x, y):
+    from map.tiles import valid_tile
+    if not valid_tile(z, x, y):
+        return jsonify({"error": f"no tile {z}/{x}/{y}"}), 404
+    tiles = zip_tiles()
+    if version != tiles.version:
+        # an old version: send the client to the current tile, without caching the redirect
+        response = redirect(f"/tiles/{tiles.version}/{z}/{x}/{y}.mvt")
+        response.cache_control.no_cache = True
+        return response
+    etag = f"{version}-{z}-{x}-{y}"
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(tiles.tile(z, x, y), mimetype="application/vnd.mapbox-vector-tile")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = TILE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route("/explore")
+def explore():
+    """
+    Explore page: one map loaded from /api/geometry (at the level of its zoom), restyled in the browser
+    with /api/indicator and /api/zip when the user picks an indicator or a zip code,
+    and with /api/score when the user sets custom weights.
+    /explore?source=tiles draws the zip codes from the vector tiles instead.
+    """
+    from analysis.scoring import WEIGHTS
+    from map.topology import level_for_zoom
+
+    zoom_levels = {zoom: level_for_zoom(zoom) for zoom in range(19)}
+    use_tiles = request.args.get("source") == "tiles"
+    return render_template("explore.html", indicators=list(INDICATOR_COLUMNS), weights=WEIGHTS,
+                           zoom_levels=zoom_levels, use_tiles=use_tiles)
+
 
 @app.route("/github")
 def github():
@@ -248,10 +468,83 @@ def github():
 
 
 def open_browser():
+    import webbrowser
     if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
         webbrowser.open_new("http://127.0.0.1:5001/")
 
 
+def warm_up():
+    """
+    Do the work that importing this module leaves out, before the first request:
+    the heavy imports, the metrics, the zip boundaries, the common map renders and the analysis charts.
+    Returns [(phase, seconds)].
+    """
+    def import_libraries():
+        import folium, geopandas, shapely, altair
+        from map import mapbuild, tiles, topology
+        from analysis import scoring, data_visualization_analysis
+
+    def render_analysis():
+        # the analysis page of every query and the chart specs behind them
+        for query in [None, *ANALYSIS_RESULTS]:
+            form = {} if query is None else {"query": query}
+            with app.test_request_context("/analysis", method="POST" if form else "GET", data=form):
+                analysis()
+
+    def load_boundaries():
+        from map.mapbuild import get_zip_topology
+        get_zip_topology()
+
+    phases = [
+        ("import libraries", import_libraries),
+        ("load metrics", map_cache.data),
+        ("load zip boundaries", load_boundaries),
+        ("zip records and scoring", lambda: (zip_records(), scoring_engine())),
+        ("render maps", warm_map_cache),
+        ("render analysis charts", render_analysis),
+    ]
+    timings = []
+    for name, phase in phases:
+        start = time.perf_counter()
+        phase()
+        timings.append((name, time.perf_counter() - start))
+    return timings
+
+
+def profile_startup(top=15):
+    """Print how long the import of this module and each warm-up phase take, then the slowest calls."""
+    import cProfile
+    import pstats
+
+    print(f"{'import website.app':<28}{IMPORT_SECONDS * 1e3:9.1f} ms")
+    profiler = cProfile.Profile()
+    profiler.enable()
+    timings = warm_up()
+    profiler.disable()
+    for name, seconds in timings:
+        print(f"{name:<28}{seconds * 1e3:9.1f} ms")
+    print(f"{'total':<28}{(IMPORT_SECONDS + sum(s for _, s in timings)) * 1e3:9.1f} ms\n")
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
+
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+
 if __name__ == "__main__":
-    Timer(1, open_browser).start()
-    app.run(host="0.0.0.0", port=5001, debug=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the Chicago Living Score website")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="time the import and the warm-up phases, then exit")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--no-debug", action="store_true", help="run without the debugger and reloader")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        profile_startup()
+    else:
+        debug = not args.no_debug
+        # with the reloader on, this process only watches files: the serving child warms up
+        if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            warm_up()
+            remove_old_tiles()
+        Timer(1, open_browser).start()
+        app.run(host="0.0.0.0", port=args.port, debug=debug)
@@ -0,0 +1,260 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from website.app import app, map_cache, remove_old_tiles, warm_up
+
+
+# This file serves the website in production: the parent process warms up once
+# (metrics, zip boundaries, rendered maps, analysis charts), then forks worker
+# processes that inherit all of it. The pages of memory are shared copy-on-write,
+# gc.freeze() after a collection keeps the garbage collector from touching (and so
+# copying) them.
+# Every worker accepts on the same listening socket and answers requests on a
+# bounded pool of threads.
+#
+# Graceful reload: on SIGHUP, or when final_living_score.csv changes, the parent
+# warms up the new data, forks a new set of workers and asks the old ones to stop.
+# A stopping worker closes its listener and finishes the requests it has accepted.
+# Once all of them are gone, the tile folders of the old versions are removed.
+# SIGTERM / SIGINT stop the workers the same way, then the parent.
+# Code changes need a restart. Needs os.fork, so Unix only.
+#
+#   python -m website.serve --workers 4 --threads 8 --port 5001
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, code="-", size="-"):
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server answering requests on a fixed pool of threads."""
+
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, host, port, app, threads, fd=None, handler=None):
+        self.pool = None
+        super().__init__(host, port, app, handler=handler, fd=fd)
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="request")
+        # a thread is taken before accepting, so the pool's queue never holds connections
+        self.slots = threading.BoundedSemaphore(threads)
+        # several workers wait on the same socket, the ones that lose the race must not block in accept
+        self.socket.setblocking(False)
+
+    def _handle_request_noblock(self):
+        # a busy worker leaves new connections in the listen backlog, for a worker with free threads
+        if not self.slots.acquire(timeout=0.1):
+            return
+        try:
+            request, client_address = self.get_request()
+        except OSError:
+            self.slots.release()
+            return
+        try:
+            self.pool.submit(self._process, request, client_address)
+        except Exception:
+            self.shutdown_request(request)
+            self.slots.release()
+            raise
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        # let the accepted requests finish (the base class also closes while taking over fd)
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+
+
+def listen(host, port, backlog=1024):
+    """The listening socket shared by all workers."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    return socket.create_server((host, port), family=family, backlog=backlog)
+
+
+def run_worker(sock, threads, access_log=False):
+    """Serve on the inherited socket until SIGTERM or SIGINT, then finish the accepted requests."""
+    host, port = sock.getsockname()[:2]
+    handler = WSGIRequestHandler if access_log else QuietRequestHandler
+    server = PooledWSGIServer(host, port, app, threads, fd=sock.fileno(), handler=handler)
+    sock.close()
+
+    parent = os.getppid()
+
+    def stop(signum=None, frame=None):
+        # shutdown() waits for serve_forever to return, so it cannot run on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    def watch_parent():
+        # a parent killed without a chance to stop its workers takes them down too
+        while os.getppid() == parent:
+            time.sleep(1)
+        stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    threading.Thread(target=watch_parent, daemon=True).start()
+    server.serve_forever()
+    server.server_close()
+
+
+class Master:
+    def __init__(self, sock, workers, threads, check_interval=5.0, access_log=False):
+        """
+        sock: listening socket
+        workers: number of worker processes
+        threads: request threads per worker
+        check_interval: seconds between checks of the data version (0 to only reload on SIGHUP)
+        """
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.check_interval = check_interval
+        self.access_log = access_log
+        self.pids = {}  # pid -> start time
+        self.retiring = set()  # workers of older generations, finishing their requests
+        self._reload = False
+        self._stop = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.sock, self.threads, self.access_log)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                # skip the parent's atexit handlers and buffered output
+                os._exit(code)
+        self.pids[pid] = time.monotonic()
+        return pid
+
+    def warm(self):
+        # the previous generation's data becomes collectable again once it is replaced
+        gc.unfreeze()
+        timings = warm_up()
+        # drop the garbage of the warm-up (discarded folium and Altair objects), then keep the
+        # collector away from what is left, so its pages stay shared with the workers
+        gc.collect()
+        gc.freeze()
+        return sum(seconds for _, seconds in timings)
+
+    def start_generation(self):
+        old, self.pids = self.pids, {}
+        for _ in range(self.workers):
+            self.spawn()
+        for pid in old:
+            self._signal(pid, signal.SIGTERM)
+        self.retiring.update(old)
+        if not self.retiring:
+            remove_old_tiles()
+        return old
+
+    def _signal(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self):
+        # collect stopped workers, replace the ones of the current generation
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                if not self.retiring:
+                    # no process serves the old data anymore, its tiles can go
+                    remove_old_tiles()
+            elif pid in self.pids:
+                started = self.pids.pop(pid)
+                if not self._stop:
+                    print(f"worker {pid} exited with status {status}, starting another", flush=True)
+                    if time.monotonic() - started < 1:
+                        time.sleep(1)  # a worker that fails at start should not be restarted in a loop
+                    self.spawn()
+
+    def _data_changed(self):
+        version = map_cache.version
+        map_cache.data()
+        return map_cache.version != version
+
+    def run(self):
+        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, "_reload", True))
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, "_stop", True))
+        signal.signal(signal.SIGINT, lambda signum, frame: setattr(self, "_stop", True))
+
+        seconds = self.warm()
+        self.start_generation()
+        host, port = self.sock.getsockname()[:2]
+        print(f"serving on http://{host}:{port} with {self.workers} workers x {self.threads} threads "
+              f"(warm-up {seconds:.2f} s)", flush=True)
+
+        last_check = time.monotonic()
+        while not self._stop:
+            time.sleep(0.2)
+            self._reap()
+            if self.check_interval and time.monotonic() - last_check >= self.check_interval:
+                last_check = time.monotonic()
+                self._reload = self._reload or self._data_changed()
+            if self._reload and not self._stop:
+                self._reload = False
+                seconds = self.warm()
+                self.start_generation()
+                print(f"reloaded data version {map_cache.version[:12]} (warm-up {seconds:.2f} s)", flush=True)
+
+        for pid in self.pids:
+            self._signal(pid, signal.SIGTERM)
+        # wait for every worker, old generations that are still finishing requests included
+        while True:
+            try:
+                os.wait()
+            except ChildProcessError:
+                break
+        self.pids = {}
+        self.sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Chicago Living Score website with several worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--threads", type=int, default=8, help="request threads per worker")
+    parser.add_argument("--check-interval", type=float, default=5.0,
+                        help="seconds between checks for new data, 0 to reload only on SIGHUP")
+    parser.add_argument("--access-log", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    master = Master(listen(args.host, args.port), args.workers, args.threads,
+                    check_interval=args.check_interval, access_log=args.access_log)
+    master.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from types import MappingProxyType
+import pathlib
+import timeit
+import pandas as pd
+
+from analysis.datastore import zip_key
+
+
+# This file precomputes the score card of every zip code shown on the service page.
+# The records are built once per data version, so a request is a dict lookup
+# instead of a boolean mask over df_metrics and a format_score call per field.
+
+
+# Field shown on the service page -> column of final_living_score.csv
+DISPLAY_FIELDS = {
+    "housing_price": "avg_price_per_sqft",
+    "unemployed_score": "unemployed_score",
+    "commute_time_score": "commute_time_score",
+    "avg_income_score": "avg_income_score",
+    "private_insurance_score": "private_insurance_score",
+    "education_score": "education_score",
+    "crime_score": "crime_score",
+    "environment_score": "environment_score",
+    "final_score": "final_score",
+}
+
+# Shared record for zip codes (or other inputs) that have no data
+NA_RECORD = MappingProxyType({field: "N/A" for field in DISPLAY_FIELDS})
+
+
+# return 2 decimals
+def format_score(val):
+    if pd.isnull(val):
+        return "N/A"
+    else:
+        return f"{val:.2f}"
+
+
+def lookup_key(zipcode):
+    # Same key as zip_key builds for the store, "060601" finds 60601 like int(zipcode) did
+    text = str(zipcode).strip()
+    return str(int(text)) if text.isdigit() else text
+
+
+class ZipRecordStore:
+    def __init__(self, display, values):
+        """
+        display: {zipcode: {field: formatted value}}
+        values: {zipcode: {column: raw value, None for missing}}
+        Both are wrapped read-only, as the store is shared by all requests.
+        """
+        self._display = MappingProxyType({z: MappingProxyType(r) for z, r in display.items()})
+        self._values = MappingProxyType({z: MappingProxyType(r) for z, r in values.items()})
+
+    @classmethod
+    def from_frame(cls, df_metrics):
+        zipcodes = zip_key(df_metrics["zipcode"]).tolist()
+        display = {}
+        values = {}
+        columns = [col for col in df_metrics.columns if col != "zipcode"]
+        # One pass over plain Python lists, no per-row pandas access
+        rows = zip(zipcodes, *(df_metrics[col].tolist() for col in columns))
+        for zipcode, *row in rows:
+            raw = {col: (None if pd.isnull(val) else val) for col, val in zip(columns, row)}
+            display[zipcode] = {field: format_score(raw.get(col)) for field, col in DISPLAY_FIELDS.items()}
+            values[zipcode] = raw
+        return cls(display, values)
+
+    def get(self, zipcode):
+        """Formatted score card of a zip code, NA_RECORD when there is none."""
+        return self._display.get(lookup_key(zipcode), NA_RECORD)
+
+    def get_values(self, zipcode):
+        """Raw scores of a zip code, None when there is none."""
+        return self._values.get(lookup_key(zipcode))
+
+    def __contains__(self, zipcode):
+        return lookup_key(zipcode) in self._display
+
+    def __len__(self):
+        return len(self._display)
+
+
+def frame_lookup(df_metrics, zipcode):
+    # The lookup the service route used before the store, kept for the benchmark
+    row = df_metrics.loc[df_metrics["zipcode"] == int(zipcode)]
+    if row.empty:
+        return NA_RECORD
+    df_row = row.iloc[0]
+    return {field: format_score(df_row.get(col)) for field, col in DISPLAY_FIELDS.items()}
+
+
+if __name__ == "__main__":
+    # Compare the DataFrame lookup with the record store on final_living_score.csv
+    data_file = pathlib.Path(__file__).parent.parent / "data" / "cleaned_data" / "final_living_score.csv"
+    df_metrics = pd.read_csv(data_file)
+    store = ZipRecordStore.from_frame(df_metrics)
+    number = 2000
+    for name, lookup in [("dataframe", lambda: frame_lookup(df_metrics, "60614")),
+                         ("record store", lambda: store.get("60614"))]:
+        seconds = min(timeit.repeat(lookup, number=number, repeat=3))
+        print(f"{name}: {seconds / number * 1e6:.2f} us per lookup")
+    build = min(timeit.repeat(lambda: ZipRecordStore.from_frame(df_metrics), number=10, repeat=3)) / 10
+    print(f"building the store: {build * 1e3:.2f} ms")
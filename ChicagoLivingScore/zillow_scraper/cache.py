@@ -0,0 +1,136 @@
+"""
+Local response cache and result checkpoint for the Zillow scraper.
+
+ResponseCache keeps every fetched page in a SQLite file, compressed and keyed by
+the request (method, URL and payload), so a re-run never pays for the same page twice.
+Checkpoint appends each scraped result to a JSONL file as soon as it is parsed;
+the keys already in the file are the resume cursor of the next run.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+
+from loguru import logger as log
+
+# Payload fields that change on every request without changing the answer
+VOLATILE_FIELDS = ("requestId",)
+
+
+class ResponseCache:
+    def __init__(self, path, volatile_fields=VOLATILE_FIELDS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.volatile_fields = volatile_fields
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(self.path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, method TEXT, url TEXT, content BLOB, fetched_at REAL)"
+        )
+        self._db.commit()
+
+    def key(self, url: str, method: str = "GET", body: str = None) -> str:
+        """sha256 of the request, JSON payloads are compared without their volatile fields."""
+        if body:
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                pass
+            else:
+                if isinstance(payload, dict):
+                    payload = {k: v for k, v in payload.items() if k not in self.volatile_fields}
+                body = json.dumps(payload, sort_keys=True)
+        request = json.dumps([method.upper(), url, body or ""])
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def get(self, url: str, method: str = "GET", body: str = None):
+        row = self._db.execute(
+            "SELECT content FROM responses WHERE key = ?", (self.key(url, method, body),)
+        ).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, url: str, content: str, method: str = "GET", body: str = None):
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (self.key(url, method, body), method.upper(), url,
+             zlib.compress(content.encode("utf-8")), time.time()),
+        )
+        self._db.commit()
+
+    def wrap(self, fetch, scheduler=None):
+        """
+        Return a fetch coroutine that answers from the cache and only calls
+        fetch for requests that were never seen. Failed requests are not cached.
+        scheduler: misses are fetched through scheduler.run, hits are answered at
+                   once without waiting for the concurrency and rate limits.
+        """
+        async def cached_fetch(url, method="GET", headers=None, body=None):
+            content = self.get(url, method, body)
+            if content is not None:
+                self.hits += 1
+                return content
+            self.misses += 1
+            if scheduler is None:
+                content = await fetch(url, method=method, headers=headers, body=body)
+            else:
+                content = await scheduler.run(fetch, url, method=method, headers=headers, body=body)
+            self.put(url, content, method, body)
+            return content
+
+        # tells the scraper not to schedule this fetch again
+        cached_fetch.scheduler = scheduler
+        return cached_fetch
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+class Checkpoint:
+    """
+    Results appended to a JSONL file, one {"key": ..., "data": ...} line each.
+    Lines are flushed as they are written, so after a crash the file holds every
+    finished result; a truncated last line is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.records = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        log.warning(f"Skipping a truncated line in {self.path}")
+                        continue
+                    self.records[record["key"]] = record["data"]
+            # a crash in the middle of a line, start the next record on its own line
+            with open(self.path, "rb+") as file:
+                if file.seek(0, 2) > 0:
+                    file.seek(-1, 2)
+                    if file.read(1) != b"\n":
+                        file.write(b"\n")
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, key):
+        return self.records.get(key)
+
+    def add(self, key, data):
+        self.records[key] = data
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps({"key": key, "data": data}, ensure_ascii=False) + "\n")
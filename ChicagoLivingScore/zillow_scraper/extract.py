@@ -0,0 +1,107 @@
+"""
+Fast extraction of the __NEXT_DATA__ JSON embedded in Zillow pages.
+
+Zillow renders with Next.js, every page carries its data in one
+<script id="__NEXT_DATA__" type="application/json"> block. Instead of building a
+BeautifulSoup tree of the whole page, the block is found with a string scan and
+only its JSON is decoded (with orjson when it is installed). The property data is
+itself a JSON string inside that JSON (gdpClientCache), it is decoded on its own
+only when a property is asked for.
+
+Benchmark on pages rebuilt from the saved results:
+$ python extract.py [path/to/property.json]
+"""
+import json
+import re
+import sys
+import timeit
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+loads = orjson.loads if orjson is not None else json.loads
+
+# the id attribute itself: \b would also match the "id" of data-id
+_SCRIPT_OPEN = re.compile(r"""<script\b[^>]*(?<![\w-])id\s*=\s*["']?__NEXT_DATA__["']?[^>]*>""", re.IGNORECASE)
+_MARKER = "__NEXT_DATA__"
+
+
+def next_data_text(html: str):
+    """Raw text of the __NEXT_DATA__ script, None if the page has none."""
+    position = html.find(_MARKER)
+    while position != -1:
+        # the tag that holds the marker starts at the closest "<" before it
+        start = html.rfind("<", 0, position)
+        match = _SCRIPT_OPEN.match(html, start) if start != -1 else None
+        if match:
+            end = html.find("</script", match.end())
+            if end == -1:
+                return None
+            return html[match.end():end]
+        position = html.find(_MARKER, position + len(_MARKER))
+    return None
+
+
+def next_data(html: str):
+    """Decoded __NEXT_DATA__ of a page, None if the page has none."""
+    text = next_data_text(html)
+    if text is None:
+        return None
+    return loads(text)
+
+
+def search_query_state(html: str):
+    """queryState of a search page, used to build the backend payloads."""
+    data = next_data(html)
+    if data is None:
+        return None
+    return data["props"]["pageProps"]["searchPageState"]["queryState"]
+
+
+def property_data(html: str):
+    """Property of a property page, None if the page has no __NEXT_DATA__."""
+    data = next_data(html)
+    if data is None:
+        return None
+    # only this subtree of the page is a nested JSON document
+    cache = loads(data["props"]["pageProps"]["componentProps"]["gdpClientCache"])
+    return next(iter(cache.values()))["property"]
+
+
+def soup_property_data(html: str):
+    # The BeautifulSoup parsing used before, kept for the benchmark
+    # (imported here, so the extraction path does not load bs4)
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    script = soup.find("script", id="__NEXT_DATA__")
+    if script is None:
+        return None
+    data = json.loads(script.text)
+    cache = json.loads(data["props"]["pageProps"]["componentProps"]["gdpClientCache"])
+    return cache[list(cache)[0]]["property"]
+
+
+def page_from_property(property: dict, filler: int = 2000) -> str:
+    """A property page like Zillow's: markup around the __NEXT_DATA__ script."""
+    cache = json.dumps({f"ForSaleShopperPlatformFullRenderQuery{{\"zpid\":{property.get('zpid')}}}":
+                        {"property": property}})
+    data = json.dumps({"props": {"pageProps": {"componentProps": {"gdpClientCache": cache}}}})
+    markup = "".join(f'<div class="ds-row c{i}"><span>item {i}</span><a href="/b/{i}">link</a></div>'
+                     for i in range(filler))
+    return (f"<!DOCTYPE html><html><head><title>Zillow</title></head><body>{markup}"
+            f'<script id="__NEXT_DATA__" type="application/json">{data}</script></body></html>')
+
+
+if __name__ == "__main__":
+    saved = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent / "results_hamza" / "property.json"
+    html = page_from_property(json.loads(saved.read_text()))
+    assert property_data(html) == soup_property_data(html)
+    print(f"page: {len(html) / 1e3:.0f} kB, orjson: {'yes' if orjson else 'no'}")
+    number = 20
+    for name, parse in [("BeautifulSoup", soup_property_data), ("targeted scan", property_data)]:
+        seconds = min(timeit.repeat(lambda: parse(html), number=number, repeat=3)) / number
+        print(f"{name}: {seconds * 1e3:.2f} ms per page")
@@ -4,11 +4,17 @@ It scrapes hotel data and saves it to ./results/
 
 To run this script set the env variable $SCRAPFLY_KEY with your scrapfly API key:
 $ export $SCRAPFLY_KEY="your key from https://scrapfly.io/dashboard"
+
+Fetched pages are kept in ./results/responses.sqlite and scraped properties are appended
+to ./results/property.jsonl as they arrive. A run that stops partway resumes where it
+stopped, and deleting property.jsonl re-parses every page from the local cache without
+fetching it again (e.g. after changing the parsing code).
 """
 import asyncio
 import json
 from pathlib import Path
 import zillow
+from cache import Checkpoint, ResponseCache
 
 output = Path(__file__).parent / "results"
 output.mkdir(exist_ok=True)
@@ -19,14 +25,21 @@ async def run():
     zillow.BASE_CONFIG["cache"] = True
 
     print("running Zillow scrape and saving results to ./results directory")
+    cache = ResponseCache(output / "responses.sqlite")
+    # cached pages are answered at once, only the misses wait for the rate limit
+    scheduler = zillow.default_scheduler()
+    fetch = cache.wrap(zillow.scrapfly_fetch, scheduler)
 
     url = "https://www.zillow.com/chicago-il/3_p/?searchQueryState=%7B%22pagination%22%3A%7B%22currentPage%22%3A3%7D%2C%22isMapVisible%22%3Atrue%2C%22mapBounds%22%3A%7B%22west%22%3A-88.8470543046875%2C%22east%22%3A-86.6168296953125%2C%22south%22%3A41.215077112846544%2C%22north%22%3A42.44701957473035%7D%2C%22regionSelection%22%3A%5B%7B%22regionId%22%3A17426%2C%22regionType%22%3A6%7D%5D%2C%22filterState%22%3A%7B%22sort%22%3A%7B%22value%22%3A%22days%22%7D%7D%2C%22isListVisible%22%3Atrue%2C%22mapZoom%22%3A9%2C%22usersSearchTerm%22%3A%22Chicago%20IL%22%7D"
-    result_location = await zillow.scrape_search(url=url, max_scrape_pages=1)
+    result_location = await zillow.scrape_search(url=url, max_scrape_pages=1, scheduler=scheduler, fetch=fetch)
     output.joinpath("search.json").write_text(json.dumps(result_location, indent=2, ensure_ascii=False))
 
     url = "https://www.zillow.com/homedetails/800-N-Michigan-Ave-APT-3203-Chicago-IL-60611/60202083_zpid/"
-    result_property = await zillow.scrape_properties([url,])
+    checkpoint = Checkpoint(output / "property.jsonl")
+    result_property = await zillow.scrape_properties([url,], scheduler, fetch, checkpoint)
     output.joinpath("property.json").write_text(json.dumps(result_property[0], indent=2, ensure_ascii=False))
+    print(f"{cache.hits} pages from the local cache, {cache.misses} fetched")
+    cache.close()
 
 
 if __name__ == "__main__":
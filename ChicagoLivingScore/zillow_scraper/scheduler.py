@@ -0,0 +1,90 @@
+"""
+Bounded-concurrency request scheduler for the Zillow scraper.
+
+Requests run concurrently, but at most `concurrency` at a time and no faster than
+`rate` per second (token bucket), so the scraper stays polite to Zillow/Scrapfly.
+Failed requests are retried with jittered exponential backoff.
+"""
+import asyncio
+import random
+import time
+
+from loguru import logger as log
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Scheduler:
+    """
+    Run coroutine functions with a concurrency limit, a rate limit and retries.
+
+    concurrency: requests in flight at the same time
+    rate: requests started per second (None for no rate limit)
+    burst: requests that may start at once before the rate applies
+    retries: extra attempts after a failure
+    backoff: base delay in seconds, attempt n waits uniform(0, min(max_backoff, backoff * 2**n))
+    """
+
+    def __init__(self, concurrency: int = 8, rate: float = 5.0, burst: int = 1, retries: int = 3,
+                 backoff: float = 1.0, max_backoff: float = 30.0, retry_on: tuple = (Exception,)):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_on = retry_on
+        # asyncio primitives are created in the running loop
+        self._semaphore = None
+        self._bucket = None
+
+    def _limits(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._bucket = TokenBucket(self.rate, self.burst) if self.rate else None
+        return self._semaphore, self._bucket
+
+    def delay(self, attempt: int) -> float:
+        """Full jitter backoff before retry number `attempt` (starting at 0)."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def run(self, func, *args, **kwargs):
+        """Await func(*args, **kwargs) within the limits, retrying on failure."""
+        semaphore, bucket = self._limits()
+        for attempt in range(self.retries + 1):
+            async with semaphore:
+                if bucket is not None:
+                    await bucket.acquire()
+                try:
+                    return await func(*args, **kwargs)
+                except self.retry_on as error:
+                    if attempt == self.retries:
+                        raise
+                    log.warning(f"attempt {attempt + 1} failed ({error!r}), retrying")
+            # the slot is released while waiting, so other requests keep going
+            await asyncio.sleep(self.delay(attempt))
+
+    async def map(self, func, items, return_exceptions: bool = False):
+        """Run func(item) for every item, results are in the order of items."""
+        tasks = [self.run(func, item) for item in items]
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
@@ -1,6 +1,7 @@
 """
 Main source: https://scrapfly.io/blog/how-to-scrape-zillow/
 """
+import asyncio
 import json
 import os
 import random
@@ -8,18 +9,67 @@ import re
 from typing import List
 from urllib.parse import quote, urlencode
 import requests
-from bs4 import BeautifulSoup
 import json
 from loguru import logger as log
-from scrapfly import ScrapeConfig, ScrapflyClient
+
+try:
+    from .cache import Checkpoint
+    from .extract import loads, property_data as parse_property_page, search_query_state
+    from .scheduler import Scheduler
+except ImportError:  # run as a script from this directory
+    from cache import Checkpoint
+    from extract import loads, property_data as parse_property_page, search_query_state
+    from scheduler import Scheduler
+
+try:
+    from scrapfly import ScrapeConfig, ScrapflyClient
+except ImportError:  # only needed to scrape through Scrapfly, not with a custom fetch
+    ScrapeConfig = ScrapflyClient = None
 
 # Support from ScrapFly website
-SCRAPFLY = ScrapflyClient(key=os.environ["SCRAPFLY_KEY"])
+SCRAPFLY = None  # client is created on first use
 BASE_CONFIG = {
     # Zillow.com requires Anti Scraping Protection bypass feature:
     "asp": True,
     "country": "US",
 }
+BACKEND_URL = "https://www.zillow.com/async-create-search-page-state"
+
+# Default politeness settings, see scheduler.py
+CONCURRENCY = 8  # requests in flight
+RATE = 5.0  # requests started per second
+RETRIES = 3
+
+
+def default_scheduler():
+    return Scheduler(concurrency=CONCURRENCY, rate=RATE, retries=RETRIES)
+
+
+async def scrapfly_fetch(url: str, **kwargs) -> str:
+    """
+    Fetch a page through Scrapfly and return its content.
+    kwargs (method, headers, body) are passed to ScrapeConfig.
+    Any coroutine with this signature can replace it, e.g. a client for a local stub server.
+    """
+    global SCRAPFLY
+    if SCRAPFLY is None:
+        SCRAPFLY = ScrapflyClient(key=os.environ["SCRAPFLY_KEY"])
+    response = await SCRAPFLY.async_scrape(ScrapeConfig(url, **BASE_CONFIG, **kwargs))
+    return response.content
+
+
+def scheduled(fetch, scheduler: Scheduler):
+    """
+    fetch run within the scheduler limits. A fetch that schedules its own requests
+    (ResponseCache.wrap with a scheduler) is returned as is, so cache hits are not rate limited.
+    """
+    if getattr(fetch, "scheduler", None) is not None:
+        return fetch
+
+    async def scheduled_fetch(url, **kwargs):
+        return await scheduler.run(fetch, url, **kwargs)
+
+    return scheduled_fetch
 
 
 def create_search_payload(query_data: dict, page_number: int = None):
@@ -29,6 +79,7 @@ def create_search_payload(query_data: dict, page_number: int = None):
     # To scrape data, we simulate this process.
     # Analyzing the Fetch/XHR code of the site, we found that the payload mainly consists of the following three elements.
 
+    query_data = dict(query_data)  # pages are built concurrently from the same query
     payload = {
         "searchQueryState": query_data,   # The main search query and criteria set by the user
         "wants": {"cat1": ["listResults", "mapResults"], "cat2": ["total"]}, # Data types to be returned; mapResults is needed for geographic information
@@ -46,61 +97,92 @@ def create_search_payload(query_data: dict, page_number: int = None):
 
 # PART 1: Scrape the main search page and extract query_data
 # Using asynchronous functions to improve efficiency
-async def scrape_search(url: str, max_scrape_pages: int = None) -> List[dict]:
+async def scrape_search(url: str, max_scrape_pages: int = None, scheduler: Scheduler = None,
+                        fetch=scrapfly_fetch) -> List[dict]:
 
-    # Initialize list to restore the information
-    search_results = []
+    scheduler = scheduler or default_scheduler()
+    request = scheduled(fetch, scheduler)
 
     # 1. Scrape the search page HTML to extract query data.
     # Call Scrapfly's function to send a request based on the main search page URL
-    response = await SCRAPFLY.async_scrape(ScrapeConfig(url, **BASE_CONFIG))
-    soup = BeautifulSoup(response.content, "html.parser")
-    # Extract the key data used for page rendering based on the HTML structure
-    house_data = soup.find("script", id="__NEXT_DATA__").text
-    # Parse the JSON data from __NEXT_DATA__ to extract the valid data structure (following the hierarchy)
-    query_data = json.loads(house_data)["props"]["pageProps"]["searchPageState"]["queryState"]
-    
+    content = await request(url)
+    # Extract the key data used for page rendering (__NEXT_DATA__) and follow its hierarchy to the query
+    query_data = search_query_state(content)
+    if query_data is None:
+        log.error(f"Search query state not found for URL: {url}")
+        return []
 
     # 2. Use the extracted query_data to simulate the payload and obtain data from the backend.
     # Scrape Zillow's backend API for property listings
-    backend_url = "https://www.zillow.com/async-create-search-page-state"
     headers = {"content-type": "application/json"} # Sending data in JSON format
-    payload = create_search_payload(query_data) # Simulate the process of constructing the payload
-    
-    # Send the request and obtain the response
-    backend_response = await SCRAPFLY.async_scrape(
-        ScrapeConfig(backend_url, **BASE_CONFIG, headers=headers, body=payload, method="PUT")
-    )
-    data = json.loads(backend_response.content)
 
+    async def scrape_page(page_number):
+        payload = create_search_payload(query_data, page_number) # Simulate the process of constructing the payload
+        # Send the request and obtain the response
+        backend_content = await request(BACKEND_URL, headers=headers, body=payload, method="PUT")
+        return loads(backend_content)
+
+    data = await scrape_page(None)
 
     # Add the scraped property list data to the list
-    search_results.extend(data["cat1"]["searchResults"]["listResults"])
+    search_results = list(data["cat1"]["searchResults"]["listResults"])
     # Get the total number of pages in the search results
     total_pages = data["cat1"]["searchList"]["totalPages"]
-
-    # To reduce the impact on Zillow, we set it to scrape only one page at a time
-    if total_pages == 1 or max_scrape_pages == 1:
-        log.success(f"Scraped {len(house_data)} properties from search pages")
-        return search_results
+    if max_scrape_pages:
+        total_pages = min(total_pages, max_scrape_pages)
+
+    # 3. The remaining pages are independent, fetch them concurrently within the scheduler limits
+    # A page that still fails after the retries is skipped, the others are kept
+    page_numbers = range(2, total_pages + 1)
+    pages = await asyncio.gather(*(scrape_page(page_number) for page_number in page_numbers),
+                                 return_exceptions=True)
+    for page_number, page in zip(page_numbers, pages):
+        if isinstance(page, Exception):
+            log.error(f"Failed to scrape search page {page_number}: {page!r}")
+            continue
+        search_results.extend(page["cat1"]["searchResults"]["listResults"])
+
+    log.success(f"Scraped {len(search_results)} properties from {total_pages} search pages")
+    return search_results
     
 # PART 2: Scrape detailed property information for each property in the search results
-async def scrape_properties(urls: List[str]) -> List[dict]:
-    property_results = []
+async def scrape_properties(urls: List[str], scheduler: Scheduler = None, fetch=scrapfly_fetch,
+                            checkpoint: Checkpoint = None) -> List[dict]:
+    """
+    checkpoint: each property is added to it as soon as it is scraped, and the
+                urls it already holds are not fetched again (resume after a crash).
+    """
+    scheduler = scheduler or default_scheduler()
+    request = scheduled(fetch, scheduler)
+
+    def parse_property(url, content):
+        # Extract the key data used for page rendering (__NEXT_DATA__) and follow its hierarchy to the property
+        property_data = parse_property_page(content)
+        if property_data is None:
+            log.error(f"__NEXT_DATA__ not found for URL: {url}")
+        return property_data
 
-    # Loop through all the property detail page URLs provided
+    async def scrape_property(url):
+        content = await request(url)
+        property_data = parse_property(url, content)
+        if checkpoint is not None and property_data is not None:
+            checkpoint.add(url, property_data)
+        return property_data
+
+    todo = [url for url in urls if checkpoint is None or url not in checkpoint]
+    if checkpoint is not None and len(todo) < len(urls):
+        log.info(f"Resuming: {len(urls) - len(todo)} properties already in {checkpoint.path}")
+
+    # All property pages are fetched concurrently within the scheduler limits
+    scraped = await asyncio.gather(*(scrape_property(url) for url in todo), return_exceptions=True)
+    scraped = dict(zip(todo, scraped))
+
+    property_results = []
     for url in urls:
-        response = await SCRAPFLY.async_scrape(ScrapeConfig(url, **BASE_CONFIG))
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        # Extract the key data used for page rendering from the HTML structure
-        property = soup.find("script", id="__NEXT_DATA__")
-        if property:
-            data = json.loads(property.text)
-            # Parse the JSON data from __NEXT_DATA__ to extract the valid data structure (following the hierarchy)
-            property_data = json.loads(data["props"]["pageProps"]["componentProps"]["gdpClientCache"])
-            property_data = property_data[list(property_data)[0]]['property']
+        property_data = scraped[url] if url in scraped else checkpoint.get(url)
+        if isinstance(property_data, Exception):
+            log.error(f"Failed to scrape {url}: {property_data!r}")
+            continue
+        if property_data is not None:
             property_results.append(property_data)
-        else:
-            log.error(f"__NEXT_DATA__ not found for URL: {url}")
     return property_results